@@ -0,0 +1,214 @@
+"""
+End-to-end proof benchmark against local stand-ins for every external service.
+
+    python -m benchmarks.bench_end_to_end --tokens 200 --history-files 50 --tokens-per-file 40 \\
+        --api-latency-ms 50 --file-latency-ms 80 --rpc-latency-ms 30 --redis-latency-ms 1
+
+A synthetic wallet history is zipped, GPG-encrypted and served over HTTP next to
+a validator API and a JSON-RPC balanceOf endpoint; Redis is an in-memory
+stand-in. Each stage is then timed on its own and as part of a full proof:
+
+    uniqueness_details   file mappings, history download/decrypt, uniqueness
+    final_scores         scoring of the unique tokens
+    ownership            balanceOf lookups for the scored tokens
+    proof                Proof.generate end to end
+
+and reported as throughput (tokens/s), latency percentiles and peak memory.
+Peak memory is the tracemalloc peak of one extra run, so it counts Python
+allocations in this process only (not the gpg subprocesses).
+
+History is only cached between runs with --write-back (Redis submission cache)
+or --blob-cache (on-disk encrypted blobs); --cold clears both before every run.
+The proof result cache is off unless --result-cache is given, since every run
+after the first would otherwise be a cache hit.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.standins import Latency, StandInRedis, StandInServices, encrypt, zip_documents
+from benchmarks.synthetic import make_history, make_submission, with_overlap
+from my_proof import metrics
+from my_proof.input_loader import load_input
+from my_proof.proof import Proof
+from my_proof.proof_of_ownership import refresh_rpc_urls, resolve_ownership
+from my_proof.proof_of_quality_n_authenticity import final_scores
+from my_proof.proof_of_uniqueness import uniqueness_details
+
+
+def percentile(sorted_values, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(fraction * len(sorted_values) + 0.5))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def measure(fn, iterations: int, warmup: int, before=None):
+    """Latencies of `iterations` timed calls after `warmup` untimed ones, then the peak memory of one more."""
+    for _ in range(warmup):
+        if before:
+            before()
+        fn()
+    latencies = []
+    for _ in range(iterations):
+        if before:
+            before()
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+
+    if before:
+        before()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return sorted(latencies), peak
+
+
+def summarize(name: str, latencies, peak: int, tokens: int):
+    mean = sum(latencies) / len(latencies)
+    return {
+        "stage": name,
+        "runs": len(latencies),
+        "tokens": tokens,
+        "tokens_per_s": round(tokens / mean, 1) if mean else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "peak_mib": round(peak / 1024 / 1024, 2),
+    }
+
+
+def publish_history(services: StandInServices, wallet_address: str, history, documents_per_file: int, passphrase: str):
+    for start in range(0, len(history), documents_per_file):
+        services.publish(wallet_address, encrypt(zip_documents(history[start:start + documents_per_file]), passphrase))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=200, help="tokens in the scored submission")
+    parser.add_argument("--history-files", type=int, default=50, help="encrypted files in the wallet's history")
+    parser.add_argument("--documents-per-file", type=int, default=1, help="submissions zipped into each history file")
+    parser.add_argument("--tokens-per-file", type=int, default=40, help="tokens per historical submission")
+    parser.add_argument("--analysis-chars", type=int, default=2400, help="length of each token's on_chain_analysis")
+    parser.add_argument("--overlap", type=float, default=0.2, help="share of submitted tokens already in history")
+    parser.add_argument("--api-latency-ms", type=float, default=0.0)
+    parser.add_argument("--file-latency-ms", type=float, default=0.0)
+    parser.add_argument("--rpc-latency-ms", type=float, default=0.0)
+    parser.add_argument("--redis-latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform latency, as a fraction of each latency")
+    parser.add_argument("--no-redis", action="store_true", help="run without the Redis stand-in")
+    parser.add_argument("--write-back", action="store_true", help="write downloaded history back to the Redis stand-in")
+    parser.add_argument("--blob-cache", action="store_true", help="cache encrypted downloads on disk")
+    parser.add_argument("--result-cache", action="store_true", help="let Proof.generate reuse stored proof results")
+    parser.add_argument("--cold", action="store_true", help="clear the history caches before every run")
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    rng = random.Random(args.seed)
+    wallet_address = "0x%040x" % rng.getrandbits(160)
+    history = make_history(rng, args.history_files * args.documents_per_file, args.tokens_per_file,
+                           wallet_address, args.analysis_chars)
+    submission = with_overlap(rng, make_submission(rng, args.tokens, wallet_address, args.analysis_chars), history, args.overlap)
+
+    def latency(ms):
+        return Latency(ms / 1000, ms / 1000 * args.jitter, seed=args.seed)
+
+    workdir = tempfile.TemporaryDirectory(prefix="bench-e2e-")
+    input_dir = os.path.join(workdir.name, "input")
+    os.makedirs(input_dir)
+    with open(os.path.join(input_dir, "submission.json"), "w", encoding="utf-8") as file:
+        json.dump(submission, file)
+
+    services = StandInServices(latency(args.api_latency_ms), latency(args.file_latency_ms), latency(args.rpc_latency_ms))
+    with services, workdir:
+        os.environ["GNUPGHOME"] = os.path.join(workdir.name, "gnupg")
+        os.makedirs(os.environ["GNUPGHOME"], mode=0o700)
+        os.environ["SIGNATURE"] = "bench-signature"
+        os.environ["JWT_SECRET_KEY"] = "bench-secret"
+        os.environ["SUBMISSION_CACHE_WRITE_BACK"] = "true" if args.write_back else "false"
+        os.environ["PROOF_RESULT_CACHE"] = "true" if args.result_cache else "false"
+        blob_cache_dir = os.path.join(workdir.name, "blob_cache")
+        if args.blob_cache:
+            os.environ["BLOB_CACHE_DIR"] = blob_cache_dir
+        else:
+            os.environ.pop("BLOB_CACHE_DIR", None)
+        services.configure_environment()
+        redis_client = None
+        if not args.no_redis:
+            redis_client = StandInRedis(latency(args.redis_latency_ms))
+            redis_client.install()
+
+        refresh_rpc_urls()
+        publish_history(services, wallet_address, history, args.documents_per_file, os.environ["SIGNATURE"])
+        del history
+        submissions = load_input(input_dir)
+
+        def clear_caches():
+            if redis_client:
+                redis_client.flushall()
+            shutil.rmtree(blob_cache_dir, ignore_errors=True)
+
+        before = clear_caches if args.cold else None
+
+        details = uniqueness_details(wallet_address, input_dir)
+        unique_tokens = details["unique_json_data"]
+        _, _, _, scored = final_scores(unique_tokens, details["history_index"])
+        owned_tokens = [(item["chain"], item["token_submitted"]) for item in scored]
+
+        def generate():
+            Proof({"dlp_id": 1, "input_dir": input_dir}).generate(submissions)
+
+        stages = [
+            ("uniqueness_details", lambda: uniqueness_details(wallet_address, input_dir), args.tokens, before),
+            ("final_scores", lambda: final_scores(unique_tokens, details["history_index"]), len(unique_tokens), None),
+            ("ownership", lambda: resolve_ownership(owned_tokens, wallet_address), len(owned_tokens), None),
+        ]
+        report = []
+        for name, fn, tokens, reset in stages:
+            latencies, peak = measure(fn, args.iterations, args.warmup, reset)
+            report.append(summarize(name, latencies, peak, tokens))
+
+        metrics.reset()
+        latencies, peak = measure(generate, args.iterations, args.warmup, before)
+        report.append(summarize("proof", latencies, peak, args.tokens))
+        spans = metrics.get_metrics().snapshot()["spans"]
+
+    print(f"submission: {args.tokens} tokens ({len(unique_tokens)} unique, {len(owned_tokens)} scored); "
+          f"history: {args.history_files} files x {args.documents_per_file} x {args.tokens_per_file} tokens")
+    print(f"{'stage':20} {'runs':>4} {'tokens/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9} {'peak MiB':>9}")
+    for row in report:
+        print(f"{row['stage']:20} {row['runs']:4} {row['tokens_per_s'] or 0:10.1f} {row['p50_ms']:9.2f} "
+              f"{row['p90_ms']:9.2f} {row['p99_ms']:9.2f} {row['max_ms']:9.2f} {row['peak_mib']:9.2f}")
+
+    print("\nproof sub-stages (all proof runs, from the metrics registry):")
+    for entry in spans:
+        labels = ",".join(f"{key}={value}" for key, value in entry["labels"].items())
+        name = f"{entry['name']}{{{labels}}}" if labels else entry["name"]
+        print(f"  {name:40} n={entry['count']:<5} mean={entry['total_ms'] / entry['count']:9.2f} ms  max={entry['max_ms']:9.2f} ms")
+    print(f"\nstand-in requests: {services.requests}"
+          + (f", redis round trips: {redis_client.round_trips}" if redis_client else ""))
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump({"arguments": vars(args), "stages": report, "spans": spans,
+                       "requests": services.requests}, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
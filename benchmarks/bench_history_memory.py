@@ -0,0 +1,134 @@
+"""
+Peak RSS of the buffered vs streaming history pipeline on large archives.
+
+    python -m benchmarks.bench_history_memory --size-mb 300
+
+Each mode runs in its own subprocess so ru_maxrss is not shared. With --gpg the
+archive is symmetrically encrypted with the gpg binary and served over a local
+HTTP server, so the full download -> decrypt -> unzip path is measured.
+
+With --max-peak-mb it is a regression check: the run exits with status 1 when
+the streaming pipeline's peak RSS goes over the bound. CI runs
+
+    python -m benchmarks.bench_history_memory --gpg --size-mb 200 --members 40 \\
+        --modes streaming --max-peak-mb 150
+
+Streaming memory grows with the largest member, not with the archive, so the
+bound only holds for the member size it was set for.
+"""
+import argparse
+import functools
+import http.server
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+
+from benchmarks.synthetic import make_submission
+
+PASSPHRASE = "bench-passphrase"
+
+
+def build_archive(path, size_mb, members):
+    """Write a zip of `members` JSON submissions totalling roughly `size_mb` MB."""
+    rng = random.Random(11)
+    per_member = size_mb * 1024 * 1024 // members
+    tokens_per_member = max(1, per_member // 4096)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as zip_ref:
+        for i in range(members):
+            document = make_submission(rng, tokens_per_member, analysis_chars=3500)
+            zip_ref.writestr(f"submission_{i}.json", json.dumps(document))
+    return os.path.getsize(path)
+
+
+def encrypt(path):
+    encrypted = path + ".gpg"
+    subprocess.run(
+        ["gpg", "--batch", "--yes", "--pinentry-mode", "loopback", "--passphrase", PASSPHRASE,
+         "--symmetric", "--cipher-algo", "AES256", "--compress-algo", "none", "--output", encrypted, path],
+        check=True,
+    )
+    return encrypted
+
+
+class _QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(directory):
+    handler = functools.partial(_QuietHandler, directory=directory)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def child(mode, target):
+    os.environ["HISTORY_STREAMING"] = "true" if mode == "streaming" else "false"
+    from my_proof import history_fetch
+
+    keys = 0
+    if target.startswith("http"):
+        documents = history_fetch.fetch_history_file({"fileUrl": target}, PASSPHRASE) or []
+    elif mode == "streaming":
+        documents = history_fetch.iter_json_documents(target)
+    else:
+        with open(target, "rb") as file:
+            documents = history_fetch.extract_files_from_zip(file.read())
+    for document in documents:
+        keys += len(document.get("tokens", []))
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(json.dumps({"mode": mode, "tokens": keys, "peak_rss_mb": round(peak_kb / 1024, 1)}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=300)
+    parser.add_argument("--members", type=int, default=20)
+    parser.add_argument("--gpg", action="store_true", help="encrypt and serve over HTTP")
+    parser.add_argument("--modes", nargs="+", choices=("buffered", "streaming"), default=["buffered", "streaming"])
+    parser.add_argument("--max-peak-mb", type=float, help="fail when the streaming peak RSS exceeds this")
+    parser.add_argument("--child", nargs=2, metavar=("MODE", "TARGET"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return child(*args.child)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        archive = os.path.join(workdir, "history.zip")
+        size = build_archive(archive, args.size_mb, args.members)
+        target = archive
+        server = None
+        if args.gpg:
+            encrypted = encrypt(archive)
+            server = serve(workdir)
+            target = f"http://127.0.0.1:{server.server_address[1]}/{os.path.basename(encrypted)}"
+
+        print(f"archive: {size / 1024 / 1024:.1f} MB in {args.members} members")
+        results = {}
+        for mode in args.modes:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_history_memory", "--child", mode, target],
+                check=True, capture_output=True, text=True,
+            ).stdout.strip().splitlines()[-1]
+            result = results[mode] = json.loads(output)
+            print(f"{mode:10s} peak RSS {result['peak_rss_mb']:8.1f} MB  ({result['tokens']} tokens)")
+        if server:
+            server.shutdown()
+
+    streaming = results.get("streaming")
+    if args.max_peak_mb is not None and streaming is not None:
+        if not streaming["tokens"]:
+            raise SystemExit("streaming run read no tokens")
+        if streaming["peak_rss_mb"] > args.max_peak_mb:
+            raise SystemExit(f"streaming peak RSS {streaming['peak_rss_mb']} MB is over the {args.max_peak_mb} MB budget")
+        print(f"streaming peak RSS within the {args.max_peak_mb} MB budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Memory held by the wallet history after loading: documents plus a tuple-key set
+(the previous form) vs the compact bytes-record TokenKeyIndex alone.
+
+    python -m benchmarks.bench_history_records --files 500 --tokens-per-file 40
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+
+from benchmarks.synthetic import make_history
+from my_proof.key_extractor import key_document
+from my_proof.token_index import TokenKeyIndex, token_key
+
+
+def retained(build, payloads):
+    """Bytes still allocated by what `build` returns, measured after a collection."""
+    gc.collect()
+    tracemalloc.start()
+    result = build(payloads)
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size, result
+
+
+def legacy_full(payloads):
+    documents = [json.loads(payload) for payload in payloads]
+    return documents, {token_key(token) for document in documents for token in document["tokens"]}
+
+
+def legacy_keys_only(payloads):
+    documents = [key_document(payload) for payload in payloads]
+    return documents, {token_key(token) for document in documents for token in document["tokens"]}
+
+
+def compact(payloads):
+    history_index = TokenKeyIndex()
+    for payload in payloads:
+        history_index.add_documents([key_document(payload)])
+    return history_index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--files", type=int, default=500)
+    parser.add_argument("--tokens-per-file", type=int, default=40)
+    parser.add_argument("--analysis-chars", type=int, default=800)
+    parser.add_argument("--seed", type=int, default=5)
+    args = parser.parse_args()
+
+    history = make_history(random.Random(args.seed), args.files, args.tokens_per_file, analysis_chars=args.analysis_chars)
+    payloads = [json.dumps(document).encode("utf-8") for document in history]
+    del history
+    tokens = args.files * args.tokens_per_file
+    print(f"history: {args.files} files, {tokens} tokens, {sum(map(len, payloads)) / 1024 / 1024:.1f} MB of JSON")
+
+    full_size, (_, full_keys) = retained(legacy_full, payloads)
+    keys_size, (_, keys_keys) = retained(legacy_keys_only, payloads)
+    compact_size, history_index = retained(compact, payloads)
+    assert history_index.keys() == full_keys == keys_keys, "compact index disagrees with the tuple keys"
+
+    for label, size in (
+        ("full documents + tuple keys", full_size),
+        ("key documents + tuple keys", keys_size),
+        ("compact TokenKeyIndex", compact_size),
+    ):
+        print(f"{label:28}: {size / 1024 / 1024:8.2f} MB  {size / tokens:7.1f} B/token")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+CPU time and allocated memory of the key-only extractor vs a full json.loads.
+
+    python -m benchmarks.bench_key_extractor --tokens 20000 --analysis-chars 4000
+"""
+import argparse
+import json
+import random
+import time
+import tracemalloc
+
+from benchmarks.synthetic import make_submission
+from my_proof.key_extractor import iter_token_keys
+
+
+def full_parse(data):
+    document = json.loads(data)
+    return [(t["token_metadata"]["chain"], t["token_metadata"]["contract"]) for t in document.get("tokens", [])]
+
+
+def key_only(data):
+    return list(iter_token_keys(data))
+
+
+def measure(fn, data, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.process_time()
+        result = fn(data)
+        best = min(best, time.process_time() - start)
+    tracemalloc.start()
+    fn(data)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=20000)
+    parser.add_argument("--analysis-chars", type=int, default=4000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    document = make_submission(random.Random(args.seed), args.tokens, analysis_chars=args.analysis_chars)
+    data = json.dumps(document, indent=4).encode("utf-8")
+    del document
+    print(f"document: {len(data) / 1024 / 1024:.1f} MB, {args.tokens} tokens")
+
+    full_time, full_peak, full_keys = measure(full_parse, data, args.repeat)
+    key_time, key_peak, keys = measure(key_only, data, args.repeat)
+    assert keys == full_keys, "key-only extractor disagrees with json.loads"
+
+    print(f"json.loads : {full_time * 1000:9.1f} ms CPU  {full_peak / 1024 / 1024:8.1f} MB allocated")
+    print(f"key-only   : {key_time * 1000:9.1f} ms CPU  {key_peak / 1024 / 1024:8.1f} MB allocated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Compare the columnar (NumPy) scoring path against the per-token path.
+
+    python -m benchmarks.bench_scoring --tokens 10000
+
+Both paths run on the same synthetic submission; the script checks that their
+results and averages are identical before reporting timings.
+"""
+import argparse
+import os
+import random
+import time
+
+from benchmarks.synthetic import make_history, make_submission, with_overlap
+from my_proof.proof_of_quality_n_authenticity import final_scores
+from my_proof.token_index import TokenKeyIndex
+
+
+def timed(fn, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def scores_with(engine, tokens, history_index):
+    os.environ["SCORING_ENGINE"] = engine
+    return final_scores(tokens, history_index)
+
+
+def same_scores(a, b) -> bool:
+    """Value- and type-exact comparison, so 0 and 0.0 count as different."""
+    def typed(value):
+        if isinstance(value, dict):
+            return {key: typed(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [typed(item) for item in value]
+        return type(value).__name__, value
+    return typed(a) == typed(b)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tokens", type=int, default=10_000, help="tokens in the scored submission")
+    parser.add_argument("--history", type=int, default=200, help="historical files")
+    parser.add_argument("--overlap", type=float, default=0.2, help="share of tokens already in history")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    history = make_history(rng, args.history, 20, analysis_chars=0)
+    submission = with_overlap(rng, make_submission(rng, args.tokens, analysis_chars=0), history, args.overlap)
+    # Exercise the non-scoring branches too
+    for token in rng.sample(submission["tokens"], args.tokens // 20):
+        token["suggestionAttributes"] = token["recommendationAttributes"] = []
+    for token in rng.sample(submission["tokens"], args.tokens // 50):
+        token["tokenCategory"] = "Unknown"
+    history_index = TokenKeyIndex.from_documents(history)
+
+    scores_with("columnar", submission["tokens"][:10], history_index)  # import NumPy outside the timing
+    python_time, python_scores = timed(scores_with, "python", submission["tokens"], history_index)
+    columnar_time, columnar_scores = timed(scores_with, "columnar", submission["tokens"], history_index)
+    if not same_scores(python_scores, columnar_scores):
+        raise SystemExit("columnar scores differ from the per-token path")
+
+    print(f"tokens scored:  {len(python_scores[3])} of {args.tokens}")
+    print(f"per-token:      {python_time * 1000:8.1f} ms")
+    print(f"columnar:       {columnar_time * 1000:8.1f} ms  ({python_time / columnar_time:.1f}x)")
+    print("results identical")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Compare the hash-indexed uniqueness lookup against the previous nested any() scan.
+
+    python -m benchmarks.bench_token_index --history 5000 --current 200
+"""
+import argparse
+import random
+import time
+
+from benchmarks.synthetic import make_history, make_submission, with_overlap
+from my_proof.token_index import TokenKeyIndex
+
+
+def legacy_unique_tokens(curr_file_tokens, history_documents):
+    combined_tokens = [token for entry in history_documents for token in entry.get("tokens", [])]
+    return [
+        token for token in curr_file_tokens
+        if not any(
+            token["token_metadata"]["chain"] == existing_token["token_metadata"]["chain"] and
+            token["token_metadata"]["contract"] == existing_token["token_metadata"]["contract"]
+            for existing_token in combined_tokens
+        )
+    ]
+
+
+def indexed_unique_tokens(curr_file_tokens, history_documents):
+    history_index = TokenKeyIndex.from_documents(history_documents)
+    return [token for token in curr_file_tokens if token not in history_index]
+
+
+def timed(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--history", type=int, default=5000, help="historical tokens")
+    parser.add_argument("--files", type=int, default=50, help="historical files")
+    parser.add_argument("--current", type=int, default=200, help="tokens in the current submission")
+    parser.add_argument("--overlap", type=float, default=0.3, help="share of current tokens already in history")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    history = make_history(rng, args.files, max(1, args.history // args.files), analysis_chars=0)
+    current = with_overlap(rng, make_submission(rng, args.current, analysis_chars=0), history, args.overlap)["tokens"]
+
+    legacy_time, legacy_result = timed(legacy_unique_tokens, current, history)
+    indexed_time, indexed_result = timed(indexed_unique_tokens, current, history)
+    assert [id(t) for t in legacy_result] == [id(t) for t in indexed_result], "indexed lookup changed the result"
+
+    print(f"history={args.files * max(1, args.history // args.files)} current={len(current)} unique={len(indexed_result)}")
+    print(f"any() scan : {legacy_time * 1000:10.2f} ms")
+    print(f"hash index : {indexed_time * 1000:10.2f} ms  ({legacy_time / indexed_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
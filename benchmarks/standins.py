@@ -0,0 +1,378 @@
+"""
+Local stand-ins for the services a proof talks to, with injectable latency.
+
+    StandInServices   one HTTP server for the validator API (/api/userinfo, paginated
+                      when the request has a limit), the encrypted file hosting
+                      (/files/<fileId>) and a JSON-RPC endpoint (/rpc)
+                      answering balanceOf eth_calls
+    StandInRedis      in-memory client with the subset of the redis-py API the
+                      caches and the near-duplicate index use
+
+Latencies are seconds per request (per round trip for Redis), optionally with a
+uniform jitter, so network-bound stages can be measured without live services.
+"""
+import hashlib
+import io
+import json
+import os
+import random
+import threading
+import time
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from my_proof.proof_of_ownership import BALANCE_OF_SELECTOR, RPC_URL_ENV
+
+
+class Latency:
+    """A fixed delay plus up to `jitter` seconds of uniform noise."""
+
+    def __init__(self, seconds: float = 0.0, jitter: float = 0.0, seed: int = 0):
+        self.seconds = seconds
+        self.jitter = jitter
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def wait(self) -> None:
+        with self._lock:
+            delay = self.seconds + (self._rng.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+
+def owns_token(token_address: str, wallet_address: str, owned_share: float = 0.8) -> bool:
+    """Deterministic stand-in balance: the wallet holds about `owned_share` of all tokens."""
+    digest = hashlib.sha256(f"{token_address.lower()}:{wallet_address.lower()}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:4], "big") < owned_share * 2 ** 32
+
+
+def zip_documents(documents) -> bytes:
+    """A history upload: a zip archive with one JSON file per document."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for i, document in enumerate(documents):
+            archive.writestr(f"submission_{i}.json", json.dumps(document))
+    return buffer.getvalue()
+
+
+def encrypt(data: bytes, passphrase: str, gpg=None) -> bytes:
+    """Symmetrically encrypt `data` the way contributors' uploads are encrypted."""
+    import gnupg
+
+    encrypted = (gpg or gnupg.GPG()).encrypt(data, recipients=None, symmetric="AES256", passphrase=passphrase, armor=False)
+    if not encrypted.ok:
+        raise RuntimeError(f"gpg encryption failed: {encrypted.status}")
+    return encrypted.data
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes = b"", content_type: str = "application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def do_GET(self):
+        services = self.server.services
+        if not self.path.startswith("/files/"):
+            return self._send(404)
+        services.count("files")
+        services.latency["files"].wait()
+        data = services.files.get(self.path[len("/files/"):])
+        if data is None:
+            return self._send(404)
+        etag = '"%s"' % hashlib.sha256(data).hexdigest()[:32]
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, headers={"ETag": etag})
+        self._send(200, data, "application/octet-stream", {"ETag": etag})
+
+    def do_POST(self):
+        services = self.server.services
+        if self.path == "/api/userinfo":
+            services.count("api")
+            services.latency["api"].wait()
+            if not self.headers.get("Authorization", "").startswith("Bearer "):
+                return self._send(401)
+            request = self._read_json() or {}
+            if services.take_api_failure():
+                return self._send(503)
+            wallet_address = request.get("walletAddress", "")
+            if "limit" not in request:
+                return self._send(200, json.dumps(services.file_mappings(wallet_address)).encode("utf-8"))
+            page = services.file_mappings_page(wallet_address, request["limit"], request.get("cursor"), request.get("after"))
+            return self._send(200, json.dumps(page).encode("utf-8"))
+        if self.path == "/rpc":
+            services.count("rpc")
+            services.latency["rpc"].wait()
+            request = self._read_json()
+            if isinstance(request, list):
+                reply = [services.rpc_reply(call) for call in request]
+            else:
+                reply = services.rpc_reply(request)
+            return self._send(200, json.dumps(reply).encode("utf-8"))
+        self._send(404)
+
+
+class StandInServices:
+    """Validator API, file hosting and JSON-RPC stand-ins on one local HTTP server."""
+
+    def __init__(self, api_latency: Latency = None, file_latency: Latency = None, rpc_latency: Latency = None,
+                 owned_share: float = 0.8):
+        self.latency = {
+            "api": api_latency or Latency(),
+            "files": file_latency or Latency(),
+            "rpc": rpc_latency or Latency(),
+        }
+        self.owned_share = owned_share
+        self.files = {}
+        self.uploads = {}
+        self.requests = {"api": 0, "files": 0, "rpc": 0}
+        self._lock = threading.Lock()
+        self._server = None
+        self._next_file_id = 1_000_000
+        self.api_failures = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StandInServices":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.services = self
+        threading.Thread(target=self._server.serve_forever, name="standin-http", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, route: str) -> None:
+        with self._lock:
+            self.requests[route] += 1
+
+    def publish(self, wallet_address: str, encrypted: bytes) -> int:
+        """Host an encrypted upload and list it in the wallet's file mappings. Returns its fileId."""
+        with self._lock:
+            file_id = self._next_file_id
+            self._next_file_id += 1
+            self.files[str(file_id)] = encrypted
+            self.uploads.setdefault(wallet_address.lower(), []).append(file_id)
+        return file_id
+
+    def file_mappings(self, wallet_address: str):
+        """The /api/userinfo response for a wallet."""
+        return [
+            {"fileId": file_id, "fileUrl": f"{self.base_url}/files/{file_id}"}
+            for file_id in self.uploads.get(wallet_address.lower(), [])
+        ]
+
+    def file_mappings_page(self, wallet_address: str, limit: int, cursor=None, after=None):
+        """A paginated /api/userinfo response: mappings above `after`, continuing after `cursor`."""
+        start = max(int(cursor or 0), int(after if after is not None else 0))
+        newer = [file_info for file_info in self.file_mappings(wallet_address) if file_info["fileId"] > start]
+        page = newer[:limit]
+        next_cursor = str(page[-1]["fileId"]) if len(newer) > limit else None
+        return {"fileMappings": page, "nextCursor": next_cursor}
+
+    def fail_api(self, count: int) -> None:
+        """Answer the next `count` validator API requests with 503."""
+        with self._lock:
+            self.api_failures = count
+
+    def take_api_failure(self) -> bool:
+        with self._lock:
+            if self.api_failures <= 0:
+                return False
+            self.api_failures -= 1
+            return True
+
+    def rpc_reply(self, call):
+        method = call.get("method")
+        params = call.get("params") or []
+        reply = {"jsonrpc": "2.0", "id": call.get("id")}
+        if method == "eth_call":
+            data = params[0].get("data") or params[0].get("input") or "0x"
+            selector = "0x" + BALANCE_OF_SELECTOR.hex()
+            if not data.startswith(selector):
+                reply["error"] = {"code": -32000, "message": "execution reverted"}
+                return reply
+            wallet_address = "0x" + data[len(selector):][-40:]
+            balance = 10 ** 18 if owns_token(params[0]["to"], wallet_address, self.owned_share) else 0
+            reply["result"] = "0x" + balance.to_bytes(32, "big").hex()
+        elif method == "eth_getCode":
+            # No Multicall3 here, so ownership goes through JSON-RPC batches
+            reply["result"] = "0x"
+        elif method == "eth_blockNumber":
+            reply["result"] = hex(int(time.time()))
+        elif method == "eth_chainId":
+            reply["result"] = "0x1"
+        elif method in ("web3_clientVersion", "net_version"):
+            reply["result"] = "standin/1.0" if method == "web3_clientVersion" else "1"
+        else:
+            reply["error"] = {"code": -32601, "message": f"method {method} not supported"}
+        return reply
+
+    def configure_environment(self, environ=None) -> None:
+        """Point the validator API and every chain's RPC URL at this server."""
+        environ = os.environ if environ is None else environ
+        environ["VALIDATOR_BASE_API_URL"] = self.base_url
+        for env_var in RPC_URL_ENV.values():
+            environ[env_var] = f"{self.base_url}/rpc"
+
+
+class _Pipeline:
+    def __init__(self, client: "StandInRedis"):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        command = getattr(self._client, "_" + name)
+        return lambda *args, **kwargs: self._commands.append((command, args, kwargs))
+
+    def execute(self):
+        commands, self._commands = self._commands, []
+        return self._client._round_trip(lambda: [command(*args, **kwargs) for command, args, kwargs in commands])
+
+
+class StandInRedis:
+    """In-memory stand-in for a redis-py client created with decode_responses=True."""
+
+    def __init__(self, latency: Latency = None):
+        self.latency = latency or Latency()
+        self.values = {}
+        self.hashes = {}
+        self.sets = {}
+        self.set_expiry = {}
+        self.round_trips = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _decode(value):
+        return value.decode("utf-8") if isinstance(value, bytes) else str(value)
+
+    def _get(self, key):
+        with self._lock:
+            entry = self.values.get(str(key))
+        if entry is None or (entry[1] is not None and entry[1] < time.time()):
+            return None
+        return entry[0]
+
+    def _set(self, key, value, ex=None):
+        with self._lock:
+            self.values[str(key)] = (self._decode(value), time.time() + ex if ex else None)
+        return True
+
+    def _hget(self, name, field):
+        with self._lock:
+            return self.hashes.get(str(name), {}).get(field)
+
+    def _mget(self, keys):
+        return [self._get(key) for key in keys]
+
+    def _sadd(self, key, *members):
+        with self._lock:
+            members_set = self.sets.setdefault(str(key), set())
+            added = len(set(map(self._decode, members)) - members_set)
+            members_set.update(map(self._decode, members))
+        return added
+
+    def _smembers(self, key):
+        with self._lock:
+            expiry = self.set_expiry.get(str(key))
+            if expiry is not None and expiry < time.time():
+                return set()
+            return set(self.sets.get(str(key), ()))
+
+    def _expire(self, key, seconds):
+        with self._lock:
+            if str(key) not in self.sets:
+                return False
+            self.set_expiry[str(key)] = time.time() + seconds
+        return True
+
+    def _round_trip(self, command, *args, **kwargs):
+        self.latency.wait()
+        with self._lock:
+            self.round_trips += 1
+        return command(*args, **kwargs)
+
+    def ping(self):
+        return self._round_trip(lambda: True)
+
+    def get(self, key):
+        return self._round_trip(self._get, key)
+
+    def set(self, key, value, ex=None):
+        return self._round_trip(self._set, key, value, ex)
+
+    def hget(self, name, field):
+        return self._round_trip(self._hget, name, field)
+
+    def mget(self, keys):
+        return self._round_trip(self._mget, keys)
+
+    def sadd(self, key, *members):
+        return self._round_trip(self._sadd, key, *members)
+
+    def smembers(self, key):
+        return self._round_trip(self._smembers, key)
+
+    def expire(self, key, seconds):
+        return self._round_trip(self._expire, key, seconds)
+
+    def pipeline(self, transaction=True):
+        return _Pipeline(self)
+
+    def delete(self, *keys):
+        with self._lock:
+            return sum(self.values.pop(str(key), None) is not None for key in keys)
+
+    def scan_iter(self, match="*", count=None):
+        import fnmatch
+
+        with self._lock:
+            keys = list(self.values)
+        return iter([key for key in keys if fnmatch.fnmatchcase(key, match)])
+
+    def flushall(self):
+        with self._lock:
+            self.values.clear()
+            self.hashes.clear()
+            self.sets.clear()
+        return True
+
+    def install(self, environ=None) -> None:
+        """Make get_redis_client() return this client for the current REDIS_* settings."""
+        from my_proof import proof_of_uniqueness
+
+        environ = os.environ if environ is None else environ
+        environ.setdefault("REDIS_HOST", "standin")
+        client_key = (
+            environ.get('REDIS_HOST', 'localhost'),
+            int(environ.get('REDIS_PORT', 6379)),
+            environ.get('REDIS_USERNAME', ''),
+            environ.get('REDIS_PWD', 'password'),
+        )
+        proof_of_uniqueness._redis_clients[client_key] = self
@@ -0,0 +1,63 @@
+"""Synthetic submissions following the demo/input/tokenInput.json schema."""
+import random
+from typing import Any, Dict, List
+
+CHAINS = [
+    "ethereum", "binance-smart-chain", "polygon-pos", "base", "arbitrum-one",
+    "optimistic-ethereum", "avalanche", "linea", "scroll", "solana",
+]
+
+
+def make_token(rng: random.Random, chain: str = None, analysis_chars: int = 2400) -> Dict[str, Any]:
+    chain = chain or rng.choice(CHAINS)
+    if chain == "solana":
+        contract = "".join(rng.choice("123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz") for _ in range(44))
+    else:
+        contract = "0x%040x" % rng.getrandbits(160)
+    price = round(rng.uniform(0.0001, 5000), 6)
+    supply = round(rng.uniform(1e3, 1e10), 2)
+    return {
+        "token_metadata": {
+            "contract": contract,
+            "chain": chain,
+            "metrics": {
+                "name": f"Token {contract[-6:]}",
+                "symbol": contract[-4:].lower(),
+                "price": price,
+                "marketCap": round(price * supply * rng.uniform(0.97, 1.03)),
+                "priceChange24h": round(rng.uniform(-20, 20), 4),
+                "volume24h": rng.randint(1_000, 100_000_000),
+                "circulatingSupply": supply,
+                "volatility24h": round(rng.uniform(0, 120), 2),
+                "riskScore": rng.randint(0, 10),
+                "securityStatus": rng.choice(["Low Risk", "Medium Risk", "High Risk"]),
+            },
+        },
+        "reason_recommend": "r" * rng.randint(8, 200),
+        "recommendationAttributes": ["momentum-surge", "backed-by-major-investors"],
+        "recommendation_time": "2025-02-28T05:11:33.718Z",
+        "suggestion": "s" * rng.randint(8, 200),
+        "suggestionAttributes": ["momentum-surge", "disruptive-tech"],
+        "on_chain_analysis": "a" * analysis_chars,
+        "tokenCategory": rng.choice(["Meme Coins", "Layer 1", "Decentralized Finance", "AI Agent"]),
+    }
+
+
+def make_submission(rng: random.Random, token_count: int, user_address: str = None, analysis_chars: int = 2400) -> Dict[str, Any]:
+    return {
+        "tokens": [make_token(rng, analysis_chars=analysis_chars) for _ in range(token_count)],
+        "userAddress": user_address or "0x%040x" % rng.getrandbits(160),
+    }
+
+
+def make_history(rng: random.Random, file_count: int, tokens_per_file: int, user_address: str = None, analysis_chars: int = 2400) -> List[Dict[str, Any]]:
+    return [make_submission(rng, tokens_per_file, user_address, analysis_chars) for _ in range(file_count)]
+
+
+def with_overlap(rng: random.Random, submission: Dict[str, Any], history: List[Dict[str, Any]], ratio: float) -> Dict[str, Any]:
+    """Replace a `ratio` share of the submission's tokens with tokens taken from `history`."""
+    history_tokens = [token for document in history for token in document["tokens"]]
+    tokens = list(submission["tokens"])
+    for i in rng.sample(range(len(tokens)), int(len(tokens) * ratio)) if history_tokens else []:
+        tokens[i] = rng.choice(history_tokens)
+    return {**submission, "tokens": tokens}
@@ -0,0 +1,6 @@
+import os
+
+if os.environ.get("PROOF_IMPORT_REPORT"):
+    from my_proof.import_report import install
+
+    install(os.environ["PROOF_IMPORT_REPORT"])
@@ -3,8 +3,9 @@ import logging
 import os
 import sys
 import traceback
-import zipfile
 from typing import Dict, Any
+from my_proof import metrics
+from my_proof.input_loader import load_input
 from my_proof.proof import Proof
 
 # Default to 'production' if NODE_ENV is not set
@@ -17,11 +18,13 @@ SEALED_DIR = './demo/sealed' if environment == 'development' else '/sealed'
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
 
-def load_config() -> Dict[str, Any]:
+def load_config(input_dir: str = INPUT_DIR, sealed_dir: str = SEALED_DIR) -> Dict[str, Any]:
     """Load proof configuration from environment variables."""
     config = {
-        'input_dir': INPUT_DIR,
-        'use_sealing': os.path.isdir(SEALED_DIR),
+        'input_dir': input_dir,
+        'use_sealing': os.path.isdir(sealed_dir),
+        'sealed_dir': sealed_dir,
+        'batch_mode': os.environ.get('BATCH_MODE', 'false').lower() in ('1', 'true', 'yes'),
         'dlp_id': os.environ.get("DLP_ID", 31),  # DLP ID defaults to 31
         'jwt_expiration_time': int(os.environ.get('JWT_EXPIRATION_TIME', 600)),
         'validator_base_api_url': os.environ.get('VALIDATOR_BASE_API_URL', None),
@@ -65,35 +68,51 @@ def load_config() -> Dict[str, Any]:
     return config
 
 
-def run() -> None:
-    """Generate proofs for all input files."""
-    config = load_config()
-    input_files_exist = os.path.isdir(INPUT_DIR) and bool(os.listdir(INPUT_DIR))
+def run(input_dir: str = INPUT_DIR, output_dir: str = OUTPUT_DIR) -> str:
+    """Generate proofs for all input files. Returns the path of the results file."""
+    metrics.reset()
+    try:
+        with metrics.span("total"):
+            with metrics.span("config_load"):
+                config = load_config(input_dir)
+            input_files_exist = os.path.isdir(input_dir) and bool(os.listdir(input_dir))
+
+            if not input_files_exist:
+                raise FileNotFoundError(f"No input files found in {input_dir}")
+            if config['batch_mode']:
+                # Batch mode loads the inputs itself, so one bad file does not stop the others
+                return run_batch(config, output_dir)
 
-    if not input_files_exist:
-        raise FileNotFoundError(f"No input files found in {INPUT_DIR}")
-    extract_input()
+            with metrics.span("input_load"):
+                submissions = load_input(input_dir)
+            metrics.incr("submissions", len(submissions))
 
-    proof = Proof(config)
-    proof_response = proof.generate()
+            proof = Proof(config)
+            proof_response = proof.generate(submissions)
 
-    output_path = os.path.join(OUTPUT_DIR, "results.json")
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(proof_response.model_dump(), f, indent=2)
-    logging.info(f"Proof generation complete: {proof_response}")
+            output_path = os.path.join(output_dir, "results.json")
+            with open(output_path, 'w', encoding='utf-8') as f:
+                json.dump(proof_response.model_dump(), f, indent=2)
+            logging.info(f"Proof generation complete: {proof_response}")
+            return output_path
+    finally:
+        metrics.write_metrics(output_dir)
 
 
-def extract_input() -> None:
-    """
-    If the input directory contains any zip files, extract them
-    :return:
-    """
-    for input_filename in os.listdir(INPUT_DIR):
-        input_file = os.path.join(INPUT_DIR, input_filename)
+def run_batch(config: Dict[str, Any], output_dir: str, submissions=None) -> str:
+    """Score each input file as its own submission, writing results/<source>.json per input."""
+    from my_proof.batch import generate_batch
 
-        if zipfile.is_zipfile(input_file):
-            with zipfile.ZipFile(input_file, 'r') as zip_ref:
-                zip_ref.extractall(INPUT_DIR)
+    results_dir = os.path.join(output_dir, "results")
+    os.makedirs(results_dir, exist_ok=True)
+    for source, proof_response in generate_batch(config, submissions).items():
+        file_name = source.replace("/", "__")
+        if not file_name.endswith('.json'):
+            file_name += '.json'
+        with open(os.path.join(results_dir, file_name), 'w', encoding='utf-8') as f:
+            json.dump(proof_response.model_dump(), f, indent=2)
+    logging.info(f"Batch proof generation complete: {results_dir}")
+    return results_dir
 
 
 if __name__ == "__main__":
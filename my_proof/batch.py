@@ -0,0 +1,106 @@
+"""
+Batch scoring: every JSON file (or zip member) in the input directory is its own submission.
+
+Submissions are grouped by `userAddress`, so each wallet's history is fetched
+once, and scored in parallel on a process pool with one ProofResponse per file.
+Used for backfills and re-scoring historical data.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from my_proof import metrics
+from my_proof.input_loader import load_input
+from my_proof.models.proof_response import ProofResponse
+from my_proof.models.submission import Submission
+from my_proof.proof import Proof
+from my_proof.proof_of_uniqueness import failed_history, submission_uniqueness_details, wallet_history
+
+
+def get_batch_workers() -> int:
+    """Process pool size for batch scoring (BATCH_WORKERS, default: CPU count)."""
+    return max(1, int(os.environ.get("BATCH_WORKERS", os.cpu_count() or 1)))
+
+
+def group_by_wallet(submissions: List[Submission]):
+    """Group submissions by wallet address, keeping input order within each wallet."""
+    by_wallet = {}
+    for submission in submissions:
+        by_wallet.setdefault(submission.user_address, []).append(submission)
+    return by_wallet
+
+
+def score_submission(config: Dict[str, Any], wallet_address: str, submission, history_index, cache_stats,
+                     history_status=None, degraded_stages=None):
+    """
+    Score one submission against its wallet's prefetched history. Runs in a pool worker.
+
+    :param degraded_stages: Stages that already degraded for this wallet, reported in the proof.
+    :return: (ProofResponse as a dict, metrics snapshot of this submission)
+    """
+    metrics.reset()
+    proof = Proof(config)
+    proof.wallet_address = wallet_address
+    if degraded_stages:
+        proof.proof_response.attributes['degraded_stages'] = dict(degraded_stages)
+    details = submission_uniqueness_details([submission], history_index, cache_stats, history_status)
+    response = proof.build_response(details).model_dump()
+    return response, metrics.get_metrics().snapshot()
+
+
+def generate_batch(config: Dict[str, Any], submissions: Optional[List[Submission]] = None,
+                   max_workers: int = None) -> Dict[str, ProofResponse]:
+    """
+    Score every submission in config['input_dir'] (or the given, already loaded submissions).
+
+    Each wallet's history is fetched in this process while earlier wallets'
+    submissions are already being scored on the pool. A wallet whose history
+    cannot be loaded is scored against an empty, "failed" history like a single
+    proof, so its submissions come out invalid and the other wallets are unaffected.
+
+    An input that cannot be read or parsed gets an invalid ProofResponse with the
+    error in its attributes, and the other submissions are still scored.
+
+    :return: Dict mapping each submission's source to its ProofResponse.
+    """
+    load_errors = {}
+    if submissions is None:
+        with metrics.span("input_load"):
+            submissions = load_input(config['input_dir'], load_errors)
+        metrics.incr("submissions", len(submissions))
+        metrics.incr("submissions_invalid", len(load_errors))
+    by_wallet = group_by_wallet(submissions)
+    futures = {}
+    # spawn, not fork: the parent holds live sockets and fetch threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=max_workers or get_batch_workers(), mp_context=context) as executor:
+        for wallet_address, wallet_submissions in by_wallet.items():
+            degraded_stages = {}
+            try:
+                history = wallet_history(wallet_address, Proof(config).get_sealed_dir())
+            except Exception as e:
+                logging.error(f"Loading the history of {wallet_address} failed: {e}")
+                metrics.incr("stages_degraded")
+                history, degraded_stages["history"] = failed_history(), "error"
+            logging.info(f"Scoring {len(wallet_submissions)} submissions for {wallet_address}")
+            for submission in wallet_submissions:
+                futures[submission.source] = executor.submit(
+                    score_submission, config, wallet_address, submission.document,
+                    history["history_index"], history["cache_stats"], history["status"], degraded_stages
+                )
+
+    responses = {
+        file_name: ProofResponse(dlp_id=config['dlp_id'], attributes={"error": error})
+        for file_name, error in load_errors.items()
+    }
+    for file_name, future in sorted(futures.items()):
+        try:
+            response, snapshot = future.result()
+            metrics.get_metrics().merge(snapshot)
+            responses[file_name] = ProofResponse(**response)
+        except Exception as e:
+            logging.error(f"Scoring {file_name} failed: {e}")
+            responses[file_name] = ProofResponse(dlp_id=config['dlp_id'], attributes={"error": str(e)})
+    return responses
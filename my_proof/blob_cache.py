@@ -0,0 +1,228 @@
+"""
+On-disk cache of encrypted history downloads.
+
+Encrypted bodies are stored content-addressed under blobs/<sha256>, and each
+(fileId, fileUrl) pair has a small entry under entries/ with the blob's hash and
+the ETag / Last-Modified validators of the response that produced it. A cached
+file is revalidated with a conditional GET and reused on 304; the blob is
+re-hashed on every read and discarded if it no longer matches. Blobs are evicted
+least-recently-used first once the cache grows past BLOB_CACHE_MAX_BYTES.
+
+The cache needs only a local directory: BLOB_CACHE_DIR, or blob_cache/ in the
+sealed directory. BLOB_CACHE=false turns it off.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+
+from my_proof import metrics
+
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+CHUNK_SIZE = 1024 * 1024
+BLOB_CACHE_DIRNAME = "blob_cache"
+
+
+def get_cache_settings():
+    """Blob cache settings from environment variables."""
+    return {
+        'enabled': os.environ.get('BLOB_CACHE', 'true').lower() in ('1', 'true', 'yes'),
+        'dir': os.environ.get('BLOB_CACHE_DIR'),
+        'max_bytes': int(os.environ.get('BLOB_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES)),
+    }
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BlobCache:
+    """Content-addressed store of encrypted bodies with conditional revalidation and an LRU size cap."""
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._blobs_dir = os.path.join(cache_dir, "blobs")
+        self._entries_dir = os.path.join(cache_dir, "entries")
+        os.makedirs(self._blobs_dir, exist_ok=True)
+        os.makedirs(self._entries_dir, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _entry_path(self, file_url: str, file_id) -> str:
+        name = hashlib.sha256(f"{file_id}\n{file_url}".encode("utf-8")).hexdigest()
+        return os.path.join(self._entries_dir, f"{name}.json")
+
+    def _blob_path(self, sha256: str) -> str:
+        return os.path.join(self._blobs_dir, sha256)
+
+    def lookup(self, file_url: str, file_id):
+        """
+        The cached entry for a file, after checking its blob's hash.
+
+        :return: (entry, blob_path), or (None, None) when nothing valid is cached.
+        """
+        entry_path = self._entry_path(file_url, file_id)
+        try:
+            with open(entry_path, "r", encoding="utf-8") as file:
+                entry = json.load(file)
+            blob_path = self._blob_path(entry["sha256"])
+            if _file_sha256(blob_path) == entry["sha256"]:
+                return entry, blob_path
+            logging.warning(f"Blob cache: hash mismatch for fileId {file_id}, discarding")
+            self._remove(blob_path)
+        except FileNotFoundError:
+            return None, None
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Blob cache: unreadable entry for fileId {file_id}: {e}")
+        self._remove(entry_path)
+        return None, None
+
+    def fetch(self, session, file_url: str, file_id, timeout: float = None):
+        """
+        Return the path of the file's encrypted body, downloading or revalidating as needed.
+
+        :param session: requests.Session (or the requests module) to download with.
+        :param timeout: Connect/read timeout of the GET, in seconds.
+        :return: Path inside the cache, or None when the file is neither downloadable nor cached.
+        """
+        import requests
+
+        entry, blob_path = self.lookup(file_url, file_id)
+        headers = {}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        try:
+            with session.get(file_url, headers=headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 304 and entry:
+                    metrics.incr("blob_cache_revalidated")
+                    self._touch(blob_path)
+                    return blob_path
+                if response.status_code != 200:
+                    logging.error(f"Failed to download file: {response.status_code}")
+                    return self._stale(entry, blob_path, file_id)
+                return self._store(response, file_url, file_id)
+        except requests.RequestException as e:
+            logging.error(f"Failed to download file: {e}")
+            return self._stale(entry, blob_path, file_id)
+
+    def _stale(self, entry, blob_path, file_id):
+        # Uploaded blobs are immutable, so a verified copy is still good when the origin is not
+        if entry:
+            logging.warning(f"Blob cache: using the cached copy of fileId {file_id}")
+            metrics.incr("blob_cache_stale_hits")
+            self._touch(blob_path)
+            return blob_path
+        return None
+
+    def _store(self, response, file_url: str, file_id) -> str:
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(prefix=".blob-", dir=self._blobs_dir)
+        try:
+            with os.fdopen(fd, "wb") as file:
+                for chunk in response.iter_content(CHUNK_SIZE):
+                    digest.update(chunk)
+                    file.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            blob_path = self._blob_path(sha256)
+            os.replace(tmp_path, blob_path)
+        except BaseException:
+            self._remove(tmp_path)
+            raise
+        metrics.incr("bytes_downloaded", size)
+        metrics.incr("blob_cache_stored")
+
+        entry = {
+            "file_id": file_id,
+            "url": file_url,
+            "sha256": sha256,
+            "size": size,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        entry_path = self._entry_path(file_url, file_id)
+        fd, tmp_entry = tempfile.mkstemp(prefix=".entry-", dir=self._entries_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump(entry, file)
+        os.replace(tmp_entry, entry_path)
+        self.evict(keep=blob_path)
+        return blob_path
+
+    def _touch(self, blob_path: str) -> None:
+        # The blob's mtime is its last use, which orders LRU eviction
+        try:
+            os.utime(blob_path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self, keep: str = None) -> int:
+        """
+        Remove least-recently-used blobs until the cache fits in max_bytes.
+
+        Entries whose blob is gone are dropped on their next lookup.
+
+        :return: Number of blobs removed.
+        """
+        with self._lock:
+            blobs = []
+            total = 0
+            for name in os.listdir(self._blobs_dir):
+                if name.startswith("."):
+                    continue
+                path = os.path.join(self._blobs_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                blobs.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            removed = 0
+            for _, size, path in sorted(blobs):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                self._remove(path)
+                total -= size
+                removed += 1
+        if removed:
+            metrics.incr("blob_cache_evicted", removed)
+        return removed
+
+
+def get_blob_cache(sealed_dir: str = None):
+    """
+    The blob cache for this run: BLOB_CACHE_DIR, else blob_cache/ in the sealed directory.
+
+    Returns None when the cache is disabled or has no directory to live in.
+    """
+    settings = get_cache_settings()
+    if not settings['enabled']:
+        return None
+    cache_dir = settings['dir'] or (os.path.join(sealed_dir, BLOB_CACHE_DIRNAME) if sealed_dir else None)
+    if not cache_dir:
+        return None
+    try:
+        return BlobCache(cache_dir, settings['max_bytes'])
+    except OSError as e:
+        logging.warning(f"Blob cache unavailable: {e}")
+        return None
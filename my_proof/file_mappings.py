@@ -0,0 +1,238 @@
+"""
+Paginated client for a wallet's file mappings on the validator API (/api/userinfo).
+
+A wallet's history is listed page by page:
+
+    POST /api/userinfo {"walletAddress", "limit", "cursor"?, "after"?}
+      -> {"fileMappings": [...], "nextCursor": "..." | null}
+
+`after` is a watermark, the highest fileId already folded into the wallet's
+digest, so a run only lists newer uploads; `cursor` continues a listing where an
+earlier page (or a failed attempt) stopped. An API that still answers with the
+plain list of every mapping is treated as a single, final page and filtered by
+the watermark here.
+
+Every page request has its own timeout and is retried with exponential backoff
+on connection errors, timeouts, 429 and 5xx. A listing that still fails raises
+FileMappingsError, so an unreachable API is never mistaken for an empty history.
+
+Proofs only overlap page requests with history downloads when the result cache
+is off (the default without Redis; see my_proof.result_cache): its key needs
+every fileId, so with the cache on the listing completes first.
+"""
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from my_proof import metrics
+
+DEFAULT_PAGE_SIZE = 500
+DEFAULT_TIMEOUT = 10  # seconds per page request
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 0.5  # seconds before the first retry, doubled for each further one
+MAX_BACKOFF = 8
+RETRY_STATUSES = (408, 425, 429, 500, 502, 503, 504)
+
+
+class FileMappingsError(Exception):
+    """The validator API could not list a wallet's file mappings."""
+
+    def __init__(self, message: str, cursor=None):
+        super().__init__(message)
+        # Where a later listing can resume; None to start over
+        self.cursor = cursor
+
+
+def get_settings():
+    """File mappings client settings from environment variables."""
+    return {
+        'page_size': max(1, int(os.environ.get('FILE_MAPPINGS_PAGE_SIZE', DEFAULT_PAGE_SIZE))),
+        'timeout': float(os.environ.get('FILE_MAPPINGS_TIMEOUT', DEFAULT_TIMEOUT)),
+        'retries': max(0, int(os.environ.get('FILE_MAPPINGS_RETRIES', DEFAULT_RETRIES))),
+        'backoff': float(os.environ.get('FILE_MAPPINGS_BACKOFF', DEFAULT_BACKOFF)),
+    }
+
+
+def generate_jwt_token(wallet_address: str, secret_key: str, expiration_time: int) -> str:
+    """Generate a JWT token for a given wallet address."""
+    from jwt import encode as jwt_encode
+
+    exp = datetime.now(timezone.utc) + timedelta(seconds=expiration_time)
+
+    payload = {
+        'exp': exp,
+        'walletAddress': wallet_address  # Send wallet address in the payload
+    }
+
+    # Encode the JWT
+    token = jwt_encode(payload, secret_key, algorithm='HS256')
+    return token
+
+
+def numeric_file_id(file_id):
+    """A fileId as an integer for watermark comparisons, or None when it is not numeric."""
+    try:
+        return int(file_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def newer_than(file_mappings, after):
+    """The mappings above the watermark `after`; mappings with non-numeric fileIds are kept."""
+    if after is None:
+        return list(file_mappings)
+    newer = []
+    for file_info in file_mappings:
+        file_id = numeric_file_id(file_info.get("fileId"))
+        if file_id is None or file_id > after:
+            newer.append(file_info)
+    return newer
+
+
+def _retry_delay(attempt: int, backoff: float, response=None) -> float:
+    """Exponential backoff with jitter, or the server's Retry-After when it sends one."""
+    retry_after = response.headers.get("Retry-After") if response is not None else None
+    if retry_after:
+        try:
+            return min(MAX_BACKOFF, max(0.0, float(retry_after)))
+        except ValueError:
+            pass
+    delay = min(MAX_BACKOFF, backoff * 2 ** attempt)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _post_page(url: str, payload, headers, settings):
+    """
+    POST one page request, retrying transient failures.
+
+    :return: The decoded JSON body.
+    :raises FileMappingsError: on a non-retryable status, or once the retries are used up
+    """
+    import requests
+
+    from my_proof.history_fetch import get_http_session
+
+    session = get_http_session()
+    for attempt in range(settings['retries'] + 1):
+        response = None
+        try:
+            response = session.post(url, json=payload, headers=headers, timeout=settings['timeout'])
+        except (requests.ConnectionError, requests.Timeout) as e:
+            problem = str(e)
+        else:
+            if response.status_code == 200:
+                try:
+                    return response.json()
+                except ValueError as e:
+                    raise FileMappingsError(f"Invalid file mappings response: {e}", payload.get("cursor")) from e
+            problem = f"HTTP {response.status_code}"
+            if response.status_code not in RETRY_STATUSES:
+                raise FileMappingsError(f"File mappings request failed: {problem}", payload.get("cursor"))
+
+        if attempt == settings['retries']:
+            break
+        delay = _retry_delay(attempt, settings['backoff'], response)
+        logging.warning(f"File mappings request failed ({problem}), retrying in {delay:.2f}s")
+        metrics.incr("file_mappings_retries")
+        time.sleep(delay)
+    raise FileMappingsError(
+        f"File mappings request failed after {settings['retries'] + 1} attempts: {problem}", payload.get("cursor")
+    )
+
+
+def iter_file_mapping_pages(wallet_address: str, after=None, cursor=None):
+    """
+    Yield a wallet's file mappings one page at a time, as each page arrives.
+
+    :param after: Watermark; only mappings with a larger fileId are listed.
+    :param cursor: Resume a listing from an earlier page's nextCursor (or a FileMappingsError's cursor).
+    :raises FileMappingsError: if a page cannot be fetched; pages already yielded stay valid
+    """
+    validator_base_api_url = os.environ.get('VALIDATOR_BASE_API_URL')
+    secret_key = os.environ.get('JWT_SECRET_KEY')  # Retrieve the secret key from environment variables
+    expiration_time = int(os.environ.get('JWT_EXPIRATION_TIME', 600))  # JWT expiration time in seconds (10 minutes)
+
+    if not validator_base_api_url or not secret_key:
+        raise ValueError("VALIDATOR_BASE_API_URL and JWT_SECRET_KEY must be set in environment variables.")
+
+    settings = get_settings()
+    url = f"{validator_base_api_url.rstrip('/')}/api/userinfo"
+    headers = {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {generate_jwt_token(wallet_address, secret_key, expiration_time)}"  # Attach JWT token
+    }
+
+    while True:
+        payload = {"walletAddress": wallet_address, "limit": settings['page_size']}
+        if cursor:
+            payload["cursor"] = cursor
+        if after is not None:
+            payload["after"] = after
+        with metrics.span("file_mappings_page"):
+            body = _post_page(url, payload, headers, settings)
+
+        if isinstance(body, list):
+            # Unpaginated API: the whole history in one response
+            file_mappings, next_cursor = body, None
+        elif isinstance(body, dict):
+            file_mappings, next_cursor = body.get("fileMappings") or [], body.get("nextCursor")
+        else:
+            raise FileMappingsError(f"Unexpected file mappings response: {type(body).__name__}", cursor)
+
+        file_mappings = newer_than(file_mappings, after)
+        metrics.incr("file_mapping_pages")
+        metrics.incr("history_files", len(file_mappings))
+        if file_mappings:
+            yield file_mappings
+        if not next_cursor or next_cursor == cursor:
+            return
+        cursor = next_cursor
+
+
+def fetch_file_mappings(wallet_address: str, after=None):
+    """
+    Every file mapping above the watermark `after`, across all pages.
+
+    :raises FileMappingsError: if the validator API cannot list them
+    """
+    file_mappings = []
+    try:
+        with metrics.span("file_mappings"):
+            for page in iter_file_mapping_pages(wallet_address, after):
+                file_mappings.extend(page)
+    except FileMappingsError:
+        metrics.incr("file_mappings_errors")
+        raise
+    return file_mappings
+
+
+def prefetched(pages, depth: int = 2):
+    """
+    Iterate `pages` while a background thread already requests the next ones,
+    so work on one page overlaps the API round trips for the following pages.
+
+    Errors raised by `pages` are re-raised here, after the pages before them.
+    """
+    buffer = queue.Queue(maxsize=max(1, depth))
+
+    def produce():
+        try:
+            for page in pages:
+                buffer.put(("page", page))
+        except BaseException as e:
+            buffer.put(("error", e))
+        else:
+            buffer.put(("done", None))
+
+    threading.Thread(target=produce, name="file-mappings", daemon=True).start()
+    while True:
+        kind, value = buffer.get()
+        if kind == "done":
+            return
+        if kind == "error":
+            raise value
+        yield value
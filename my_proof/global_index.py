@@ -0,0 +1,224 @@
+"""
+DLP-wide uniqueness index.
+
+A file of the sorted 64-bit hashes of every (chain, contract) key submitted to
+the DLP, optionally preceded by a Bloom filter. Proofs open it read-only with
+mmap and look keys up by binary search directly over the mapped pages, so the
+index is never loaded into memory. It is built offline:
+
+    python -m my_proof.global_index build --output global_index.bin /data/decrypted/
+    python -m my_proof.global_index build --output global_index.bin --merge global_index.bin /data/new/
+
+Inputs are decrypted submission files (.json or .zip) or directories of them.
+The output is replaced atomically, so running proofs keep reading the old file
+until they reopen it. Proofs find the file through GLOBAL_INDEX_PATH.
+"""
+import argparse
+import bisect
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+
+from my_proof.token_index import normalize_token_key
+
+MAGIC = b"POCGIDX1"
+# magic, key count, Bloom filter size in bits, Bloom hash count
+_HEADER = struct.Struct("<8sQQI4x")
+DEFAULT_BLOOM_BITS_PER_KEY = 10
+DEFAULT_BLOOM_HASHES = 7
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def key_hash(chain: str, contract: str) -> int:
+    """Stable 64-bit hash of a normalized (chain, contract) key."""
+    chain, contract = normalize_token_key(chain, contract)
+    digest = hashlib.blake2b(f"{chain}\x00{contract}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+def _bloom_positions(key_hash_value: int, bits: int, hashes: int):
+    # Double hashing over the two 32-bit halves of the key hash
+    low = key_hash_value & 0xFFFFFFFF
+    high = key_hash_value >> 32
+    return [(low + i * high) % bits for i in range(hashes)]
+
+
+class GlobalUniquenessIndex:
+    """Read-only view of an index file; lookups read the mapped pages in place."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(file.fileno())
+        # Identifies this build of the index, e.g. in proof result cache keys
+        self.version = (stat.st_mtime_ns, stat.st_size)
+        magic, self.count, self.bloom_bits, self.bloom_hashes = _HEADER.unpack_from(self._mmap)
+        if magic != MAGIC:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a global uniqueness index")
+        bloom_bytes = (self.bloom_bits + 7) // 8
+        hashes_offset = _HEADER.size + bloom_bytes
+        hashes_offset += -hashes_offset % 8
+        view = memoryview(self._mmap)
+        self._bloom = view[_HEADER.size:_HEADER.size + bloom_bytes]
+        self._hashes = view[hashes_offset:hashes_offset + 8 * self.count].cast("Q")
+
+    def _maybe_contains(self, key_hash_value: int) -> bool:
+        if not self.bloom_bits:
+            return True
+        bloom = self._bloom
+        return all(
+            bloom[position >> 3] & (1 << (position & 7))
+            for position in _bloom_positions(key_hash_value, self.bloom_bits, self.bloom_hashes)
+        )
+
+    def contains_hash(self, key_hash_value: int) -> bool:
+        if not self._maybe_contains(key_hash_value):
+            return False
+        position = bisect.bisect_left(self._hashes, key_hash_value)
+        return position < self.count and self._hashes[position] == key_hash_value
+
+    def contains(self, chain: str, contract: str) -> bool:
+        return self.contains_hash(key_hash(chain, contract))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        self._hashes.release()
+        self._bloom.release()
+        self._mmap.close()
+
+
+def get_global_index(path: str = None):
+    """
+    The index at `path` (default GLOBAL_INDEX_PATH), opened once per file version.
+
+    A rebuilt file has a new inode, so long-lived workers pick it up on their next
+    job. Returns None when no index is configured or the file cannot be read.
+    """
+    path = path or os.environ.get("GLOBAL_INDEX_PATH")
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        logging.warning(f"Global uniqueness index unavailable: {e}")
+        return None
+    version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _indexes.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        try:
+            index = GlobalUniquenessIndex(path)
+        except (OSError, ValueError) as e:
+            logging.warning(f"Global uniqueness index unavailable: {e}")
+            return None
+        _indexes[path] = (version, index)
+        return index
+
+
+def write_index(path: str, hashes, bloom_bits_per_key: int = DEFAULT_BLOOM_BITS_PER_KEY,
+                bloom_hashes: int = DEFAULT_BLOOM_HASHES) -> int:
+    """
+    Write the index file for `hashes` (an array("Q") or any iterable of 64-bit ints), atomically.
+
+    :return: Number of distinct keys written.
+    """
+    import numpy as np
+
+    if sys.byteorder != "little":
+        raise RuntimeError("The index file layout assumes a little-endian host")
+    if not isinstance(hashes, array):
+        hashes = array("Q", hashes)
+    sorted_hashes = np.unique(np.frombuffer(hashes, dtype=np.uint64))
+    count = len(sorted_hashes)
+    bloom_bits = count * bloom_bits_per_key if count and bloom_bits_per_key > 0 else 0
+    if bloom_bits:
+        bits = np.zeros(bloom_bits, dtype=bool)
+        low = sorted_hashes & np.uint64(0xFFFFFFFF)
+        high = sorted_hashes >> np.uint64(32)
+        for i in range(bloom_hashes):
+            bits[(low + np.uint64(i) * high) % np.uint64(bloom_bits)] = True
+        bloom = np.packbits(bits, bitorder="little").tobytes()
+    else:
+        bloom = b""
+
+    header = _HEADER.pack(MAGIC, count, bloom_bits, bloom_hashes if bloom_bits else 0)
+    padding = b"\0" * (-(len(header) + len(bloom)) % 8)
+    fd, tmp_path = tempfile.mkstemp(prefix=".global-index-", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(header)
+            file.write(bloom)
+            file.write(padding)
+            file.write(sorted_hashes.astype("<u8").tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return count
+
+
+def iter_source_hashes(source: str):
+    """Key hashes of every token in a decrypted submission file, or in every file under a directory."""
+    from my_proof.history_fetch import iter_json_documents
+
+    if os.path.isdir(source):
+        for root, _, file_names in os.walk(source):
+            for file_name in sorted(file_names):
+                yield from iter_source_hashes(os.path.join(root, file_name))
+        return
+    try:
+        for document in iter_json_documents(source, keys_only=True):
+            for token in document["tokens"]:
+                token_metadata = token["token_metadata"]
+                yield key_hash(token_metadata["chain"], token_metadata["contract"])
+    except ValueError as e:
+        logging.warning(f"Skipping {source}: {e}")
+
+
+def build(output: str, sources, merge: str = None, bloom_bits_per_key: int = DEFAULT_BLOOM_BITS_PER_KEY) -> int:
+    """Build (or, with `merge`, refresh) the index at `output` from submission files."""
+    hashes = array("Q")
+    if merge:
+        existing = GlobalUniquenessIndex(merge)
+        try:
+            hashes.extend(existing._hashes)
+        finally:
+            existing.close()
+    for source in sources:
+        hashes.extend(iter_source_hashes(source))
+    return write_index(output, hashes, bloom_bits_per_key)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Build the DLP-wide uniqueness index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="build or refresh an index file")
+    build_parser.add_argument("sources", nargs="*", help="decrypted submission files or directories")
+    build_parser.add_argument("--output", required=True)
+    build_parser.add_argument("--merge", help="existing index whose keys are kept")
+    build_parser.add_argument("--bloom-bits-per-key", type=int, default=DEFAULT_BLOOM_BITS_PER_KEY,
+                              help="Bloom filter size; 0 disables the filter")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    count = build(args.output, args.sources, args.merge, args.bloom_bits_per_key)
+    print(f"{args.output}: {count} keys")
+
+
+if __name__ == "__main__":
+    main()
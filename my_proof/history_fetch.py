@@ -0,0 +1,287 @@
+import io
+import json
+import logging
+import mmap
+import os
+import tempfile
+import threading
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from my_proof import metrics
+from my_proof.key_extractor import key_document
+
+DEFAULT_FETCH_WORKERS = 8
+DEFAULT_DOWNLOAD_TIMEOUT = 60
+
+_session = None
+_gpg = None
+_lock = threading.Lock()
+
+
+def get_fetch_workers() -> int:
+    """Parallelism limit for the history fetch stage (HISTORY_FETCH_WORKERS)."""
+    return max(1, int(os.environ.get("HISTORY_FETCH_WORKERS", DEFAULT_FETCH_WORKERS)))
+
+
+def get_download_timeout() -> float:
+    """Seconds to wait on a history download before giving up (HISTORY_DOWNLOAD_TIMEOUT)."""
+    return float(os.environ.get("HISTORY_DOWNLOAD_TIMEOUT", DEFAULT_DOWNLOAD_TIMEOUT))
+
+
+def use_streaming() -> bool:
+    """Whether historical files go through the bounded-memory streaming path (HISTORY_STREAMING)."""
+    return os.environ.get("HISTORY_STREAMING", "true").lower() in ("1", "true", "yes")
+
+
+def use_keys_only() -> bool:
+    """
+    Whether historical files are reduced to their token keys while parsing (HISTORY_KEYS_ONLY).
+
+    History is only used for (chain, contract) uniqueness, so by default the full
+    documents are never materialized.
+    """
+    return os.environ.get("HISTORY_KEYS_ONLY", "true").lower() in ("1", "true", "yes")
+
+
+def get_http_session():
+    """Shared keep-alive requests.Session, with a connection pool sized for the fetch workers."""
+    global _session
+    import requests
+    from requests.adapters import HTTPAdapter
+
+    with _lock:
+        if _session is None:
+            pool_size = get_fetch_workers()
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+        return _session
+
+
+def get_gpg():
+    """Shared gnupg.GPG handle; each decrypt still runs in its own gpg process."""
+    global _gpg
+    import gnupg
+
+    with _lock:
+        if _gpg is None:
+            _gpg = gnupg.GPG()
+        return _gpg
+
+
+# Download and decrypt file
+def download_and_decrypt(file_url, gpg_signature, session=None, gpg=None):
+    import gnupg
+    import requests
+
+    response = (session or requests).get(file_url, timeout=get_download_timeout())
+    if response.status_code == 200:
+        metrics.incr("bytes_downloaded", len(response.content))
+        gpg = gpg or gnupg.GPG()
+        decrypted_data = gpg.decrypt(response.content, passphrase=gpg_signature)
+        if decrypted_data.ok:
+            return decrypted_data.data
+        else:
+            logging.error("Decryption failed.")
+            return None
+    else:
+        logging.error(f"Failed to download file: {response.status_code}")
+        return None
+
+
+# Extract files from ZIP data
+def extract_files_from_zip(zip_data, keys_only=False):
+    json_data_list = []
+    parse = key_document if keys_only else json.loads
+
+    # Check if the data is a zip file by inspecting the header
+    if zip_data[:2] == b'PK':  # Check for the "PK" header of ZIP files
+        with zipfile.ZipFile(io.BytesIO(zip_data), 'r') as zip_ref:
+            for file_name in zip_ref.namelist():
+                if not file_name.endswith('.json'):
+                    continue
+                with zip_ref.open(file_name) as file:
+                    json_data_list.append(parse(file.read()))
+    else:
+        # If it's not a ZIP, assume it's a JSON file directly
+        json_data_list.append(parse(zip_data))
+
+    return json_data_list
+
+
+def download_and_decrypt_to_file(file_url, gpg_signature, session=None, gpg=None):
+    """
+    Stream an encrypted file from `file_url` through gpg into a temporary file.
+
+    The HTTP body is fed to gpg's stdin as it arrives and gpg writes the plaintext
+    straight to disk, so neither the encrypted nor the decrypted body is held in
+    memory. Temporary files go to HISTORY_SPOOL_DIR (default: the system temp dir).
+
+    :return: Path of the decrypted file, which the caller must remove, or None on failure.
+    """
+    import gnupg
+    import requests
+
+    with (session or requests).get(file_url, stream=True, timeout=get_download_timeout()) as response:
+        if response.status_code != 200:
+            logging.error(f"Failed to download file: {response.status_code}")
+            return None
+        response.raw.decode_content = True
+        path = decrypt_to_file(response.raw, gpg_signature, gpg or gnupg.GPG())
+        metrics.incr("bytes_downloaded", response.raw.tell())
+    return path
+
+
+def decrypt_to_file(encrypted, gpg_signature, gpg):
+    """
+    Decrypt a binary stream with gpg into a temporary file in HISTORY_SPOOL_DIR.
+
+    :return: Path of the decrypted file, which the caller must remove, or None on failure.
+    """
+    fd, path = tempfile.mkstemp(prefix="history-", suffix=".dec", dir=os.environ.get("HISTORY_SPOOL_DIR"))
+    os.close(fd)
+    decrypted_data = gpg.decrypt_file(encrypted, passphrase=gpg_signature, output=path)
+    if not decrypted_data.ok:
+        logging.error("Decryption failed.")
+        os.remove(path)
+        return None
+    return path
+
+
+def decrypt_blob(blob_path, gpg_signature, gpg=None, to_file=True):
+    """
+    Decrypt an encrypted body held in the blob cache.
+
+    :return: Path of a decrypted temporary file when `to_file`, else the decrypted bytes; None on failure.
+    """
+    import gnupg
+
+    gpg = gpg or gnupg.GPG()
+    with open(blob_path, 'rb') as encrypted:
+        if to_file:
+            return decrypt_to_file(encrypted, gpg_signature, gpg)
+        decrypted_data = gpg.decrypt_file(encrypted, passphrase=gpg_signature)
+    if not decrypted_data.ok:
+        logging.error("Decryption failed.")
+        return None
+    return decrypted_data.data
+
+
+def iter_json_documents(path, keys_only=False):
+    """
+    Yield the JSON documents of a decrypted file one at a time.
+
+    Zip archives are read member by member from disk, so only one parsed member is
+    alive at a time; anything else is treated as a single JSON document. With
+    `keys_only`, each document is reduced to its token keys by the event-based
+    extractor instead of being fully parsed.
+    """
+    with open(path, 'rb') as file:
+        is_zip = file.read(2) == b'PK'
+
+    if is_zip:
+        with zipfile.ZipFile(path, 'r') as zip_ref:
+            for member in zip_ref.infolist():
+                if not member.filename.endswith('.json'):
+                    continue
+                with zip_ref.open(member) as file:
+                    yield key_document(file.read()) if keys_only else json.load(file)
+    elif keys_only:
+        with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield key_document(data)
+    else:
+        with open(path, 'rb') as file:
+            yield json.load(file)
+
+
+def fetch_history_file(file_info, gpg_signature, session=None, gpg=None, blob_cache=None):
+    """
+    Download, decrypt and unpack one historical file. Returns its JSON documents, or None on failure.
+
+    With a BlobCache, the encrypted body comes from the cache (revalidated with a
+    conditional GET) and is decrypted from disk. Timeouts and connection errors
+    count as failures, like a non-200 response, and so does a file that cannot be
+    decrypted or parsed (corrupt zip, truncated or malformed JSON), so one bad file
+    does not abort the proof.
+    """
+    import requests
+
+    try:
+        return _fetch_history_file(file_info, gpg_signature, session, gpg, blob_cache)
+    except requests.RequestException as e:
+        logging.error(f"Failed to download file {file_info.get('fileId')}: {e}")
+        metrics.incr("history_fetch_failures")
+        return None
+    except (ValueError, EOFError, OSError, zipfile.BadZipFile, zlib.error) as e:
+        logging.error(f"Failed to read file {file_info.get('fileId')}: {e}")
+        metrics.incr("history_fetch_failures")
+        metrics.incr("history_parse_failures")
+        return None
+
+
+def _fetch_history_file(file_info, gpg_signature, session, gpg, blob_cache):
+    blob_path = None
+    if blob_cache is not None:
+        import requests
+
+        with metrics.span("blob_fetch"):
+            blob_path = blob_cache.fetch(session or requests, file_info.get("fileUrl"), file_info.get("fileId"),
+                                         get_download_timeout())
+        if not blob_path:
+            metrics.incr("history_fetch_failures")
+            return None
+
+    if not use_streaming():
+        with metrics.span("download_decrypt"):
+            if blob_path:
+                decrypted_data = decrypt_blob(blob_path, gpg_signature, gpg, to_file=False)
+            else:
+                decrypted_data = download_and_decrypt(file_info.get("fileUrl"), gpg_signature, session, gpg)
+        if not decrypted_data:
+            metrics.incr("history_fetch_failures")
+            return None
+        with metrics.span("zip_extract"):
+            return extract_files_from_zip(decrypted_data, use_keys_only())
+
+    with metrics.span("download_decrypt"):
+        if blob_path:
+            path = decrypt_blob(blob_path, gpg_signature, gpg)
+        else:
+            path = download_and_decrypt_to_file(file_info.get("fileUrl"), gpg_signature, session, gpg)
+    if not path:
+        metrics.incr("history_fetch_failures")
+        return None
+    try:
+        with metrics.span("zip_extract"):
+            return list(iter_json_documents(path, use_keys_only()))
+    finally:
+        os.remove(path)
+
+
+def fetch_history_files(file_infos, gpg_signature, max_workers=None, blob_cache=None):
+    """
+    Fetch historical files concurrently over a shared session, through `blob_cache` if given.
+
+    GPG decryption runs in a subprocess per file, so the worker threads also
+    parallelize decryption. Results are returned in the order of `file_infos`.
+    """
+    file_infos = list(file_infos)
+    if not file_infos:
+        return []
+
+    session = get_http_session()
+    gpg = get_gpg()
+    max_workers = min(max_workers or get_fetch_workers(), len(file_infos))
+
+    def fetch(file_info):
+        return fetch_history_file(file_info, gpg_signature, session, gpg, blob_cache)
+
+    if max_workers == 1:
+        return [fetch(file_info) for file_info in file_infos]
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="history-fetch") as executor:
+        return list(executor.map(fetch, file_infos))
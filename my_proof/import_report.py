@@ -0,0 +1,103 @@
+"""
+Import-time reporting for cold starts.
+
+Set PROOF_IMPORT_REPORT=stderr (or a file path) and every first-time import made
+after the my_proof package loads is timed; a per-module report is written at exit.
+
+    python -m my_proof.import_report --budget-ms 500
+
+measures a cold `import my_proof.__main__` in fresh interpreters and exits with
+status 1 when the median goes over the budget, so it can gate CI. The budget
+leaves headroom over the ~350 ms measured locally, since CI runners are noisy.
+Importing pydantic (for the input models) is about 140 ms of that.
+"""
+import argparse
+import atexit
+import builtins
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+DEFAULT_BUDGET_MS = 500
+DEFAULT_RUNS = 5
+COLD_START_MODULE = "my_proof.__main__"
+
+_records = []
+_installed = False
+
+
+def install(destination: str = "stderr") -> None:
+    """Time every first-time import from now on and write a report to `destination` at exit."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    original_import = builtins.__import__
+    child_time = []
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return original_import(name, globals, locals, fromlist, level)
+        child_time.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = child_time.pop()
+            if child_time:
+                child_time[-1] += elapsed
+            _records.append({
+                "module": name,
+                "cumulative_ms": round(elapsed * 1000, 3),
+                "self_ms": round((elapsed - nested) * 1000, 3),
+                "depth": len(child_time),
+            })
+
+    builtins.__import__ = timed_import
+    atexit.register(write_report, destination)
+
+
+def write_report(destination: str = "stderr") -> None:
+    """Write the recorded imports, slowest first, as JSON lines."""
+    lines = [json.dumps(record) for record in sorted(_records, key=lambda r: r["cumulative_ms"], reverse=True)]
+    if destination in ("1", "true", "stderr"):
+        sys.stderr.write("\n".join(lines) + "\n")
+    else:
+        with open(destination, "w", encoding="utf-8") as file:
+            file.write("\n".join(lines) + "\n")
+
+
+def measure_cold_start(module: str = COLD_START_MODULE, runs: int = DEFAULT_RUNS) -> float:
+    """Median over `runs` fresh interpreters of the wall time in milliseconds to import `module`."""
+    code = f"import time; s = time.perf_counter(); import {module}; print((time.perf_counter() - s) * 1000)"
+    env = {**os.environ, "PROOF_IMPORT_REPORT": ""}
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-c", code], check=True, capture_output=True, text=True, env=env
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check the cold-start import time of the proof.")
+    parser.add_argument("--budget-ms", type=float, default=float(os.environ.get("PROOF_IMPORT_BUDGET_MS", DEFAULT_BUDGET_MS)))
+    parser.add_argument("--module", default=COLD_START_MODULE)
+    parser.add_argument("--runs", type=int, default=DEFAULT_RUNS)
+    args = parser.parse_args()
+
+    elapsed = measure_cold_start(args.module, args.runs)
+    status = "ok" if elapsed <= args.budget_ms else "over budget"
+    print(f"import {args.module}: {elapsed:.1f} ms (budget {args.budget_ms:.0f} ms) {status}")
+    if elapsed > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
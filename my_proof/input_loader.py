@@ -0,0 +1,70 @@
+import json
+import logging
+import os
+import zipfile
+from typing import Dict, List, Optional
+
+from pydantic import ValidationError
+
+from my_proof.models.submission import Submission
+
+
+def parse_submission(source: str, data) -> Submission:
+    """
+    Parse and validate one submission document.
+
+    :raises ValueError: if the document is not valid JSON or not a valid submission
+    """
+    try:
+        document = json.loads(data)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"{source} is not valid JSON: {e}") from e
+    if not isinstance(document, dict):
+        raise ValueError(f"{source} is not a JSON object")
+    try:
+        return Submission(source=source, user_address=document.get("userAddress") or "", document=document)
+    except ValidationError as e:
+        raise ValueError(f"{source} is not a valid submission: {e}") from e
+
+
+def load_input(input_dir: str, errors: Optional[Dict[str, str]] = None) -> List[Submission]:
+    """
+    Read every submission in the input directory exactly once.
+
+    Loose .json files are parsed directly; .json members of zip archives are
+    read in memory, so nothing is extracted or written back to the input
+    directory. Sources are visited in sorted order.
+
+    :param errors: When given, a source that cannot be read or parsed is recorded here
+                   (source -> message) and skipped, instead of failing the whole load.
+    :raises ValueError: on the first invalid source, unless `errors` is given
+    """
+    submissions = []
+
+    def add(source, read):
+        try:
+            submissions.append(parse_submission(source, read()))
+        except (OSError, ValueError) as e:
+            if errors is None:
+                raise
+            logging.error(f"Skipping {source}: {e}")
+            errors[source] = str(e)
+
+    for input_filename in sorted(os.listdir(input_dir)):
+        input_file = os.path.join(input_dir, input_filename)
+        if not os.path.isfile(input_file):
+            continue
+
+        if input_filename.endswith('.json'):
+            with open(input_file, 'rb') as file:
+                add(input_filename, file.read)
+        elif zipfile.is_zipfile(input_file):
+            with zipfile.ZipFile(input_file, 'r') as zip_ref:
+                for member in zip_ref.infolist():
+                    if member.is_dir() or not member.filename.endswith('.json'):
+                        continue
+                    with zip_ref.open(member) as file:
+                        add(f"{input_filename}/{member.filename}", file.read)
+
+    logging.info(f"Loaded {len(submissions)} submissions from {input_dir}")
+    return submissions
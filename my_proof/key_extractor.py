@@ -0,0 +1,183 @@
+import json
+import re
+
+_WS = rb'[ \t\n\r]*'
+_STR = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+# JSON numbers and literals, plus the NaN / Infinity that json.loads also accepts
+_SCALAR_PATTERN = (
+    rb'(?:-?(?:0|[1-9][0-9]*)(?:\.[0-9]+)?(?:[eE][+-]?[0-9]+)?|true|false|null|NaN|-?Infinity)'
+    rb'(?![^,:\[\]{}" \t\n\r])'
+)
+_VALUE = rb'(?:' + _STR + rb'|' + _SCALAR_PATTERN + rb')'
+
+_WHITESPACE = re.compile(_WS)
+_SCALAR = re.compile(_SCALAR_PATTERN)
+# An object key and its colon, matched in one step (keys are short)
+_KEY = re.compile(rb'(' + _STR + rb')' + _WS + rb':' + _WS, re.DOTALL)
+# An array or object holding only short strings and scalars, skipped in one step
+_FLAT_CONTAINER = re.compile(
+    rb'\[' + _WS + rb'(?:' + _VALUE + rb'(?:' + _WS + rb',' + _WS + _VALUE + rb')*)?' + _WS + rb'\]'
+    + rb'|\{' + _WS + rb'(?:' + _STR + _WS + rb':' + _WS + _VALUE
+    + rb'(?:' + _WS + rb',' + _WS + _STR + _WS + rb':' + _WS + _VALUE + rb')*)?' + _WS + rb'\}',
+    re.DOTALL,
+)
+_FLAT_LIMIT = 4096  # longer containers go through the event loop, where strings are skipped with find()
+
+_WHITESPACE_BYTES = frozenset(b' \t\n\r')
+_OBJECT, _ARRAY = 0, 1
+# What the scanner saw last, to reject input that is not a single JSON value
+_START, _OPEN, _COMMA, _KEY_DONE, _VALUE_DONE = range(5)
+_KEY_FIELDS = (b'"chain"', b'"contract"')
+
+
+def _string_end(data, pos) -> int:
+    """Offset just past the string starting at `pos`, found with bytes.find (no copy)."""
+    i = pos + 1
+    while True:
+        quote = data.find(b'"', i)
+        if quote < 0:
+            raise ValueError(f"Unterminated string at offset {pos}")
+        backslash = quote - 1
+        while data[backslash] == 0x5c:
+            backslash -= 1
+        if (quote - 1 - backslash) % 2 == 0:
+            return quote + 1
+        i = quote + 1
+
+
+def iter_token_keys(data):
+    """
+    Yield (chain, contract) for every `tokens[*].token_metadata` of a JSON document.
+
+    This is an event-based scan over the raw bytes: only object keys and the
+    chain/contract values are decoded. Every other value, including the long
+    `on_chain_analysis`, `suggestion` and `reason_recommend` strings, is skipped
+    by searching for its closing quote and never turned into a Python object.
+
+    :param data: bytes, bytearray or mmap of a UTF-8 JSON document.
+    :raises ValueError: if the document is not well-formed JSON.
+    """
+    pos = 0
+    end = len(data)
+    # Each frame is [kind, raw key bytes of the current member]
+    stack = []
+    expect_key = False
+    last = _START
+    chain = contract = None
+
+    while True:
+        if pos >= end:
+            break
+        char = data[pos]
+        if char in _WHITESPACE_BYTES:
+            pos = _WHITESPACE.match(data, pos).end()
+            if pos >= end:
+                break
+            char = data[pos]
+
+        if expect_key:
+            if char == 0x22:
+                match = _KEY.match(data, pos)
+                if match is None:
+                    raise ValueError(f"Expected object key at offset {pos}")
+                stack[-1][1] = match.group(1)
+                expect_key = False
+                last = _KEY_DONE
+                pos = match.end()
+                continue
+            if char != 0x7d or last != _OPEN:
+                raise ValueError(f"Expected object key at offset {pos}")
+        elif last == _VALUE_DONE and char not in (0x2c, 0x5d, 0x7d):
+            raise ValueError(f"Expected ',' or end of container at offset {pos}" if stack else f"Extra data at offset {pos}")
+
+        if char == 0x22:  # "
+            string_end = _string_end(data, pos)
+            if stack and stack[-1][1] in _KEY_FIELDS and _in_token_metadata(stack):
+                raw = bytes(data[pos + 1:string_end - 1])
+                value = json.loads(b'"' + raw + b'"') if b'\\' in raw else raw.decode("utf-8")
+                if stack[-1][1] == b'"chain"':
+                    chain = value
+                else:
+                    contract = value
+            last = _VALUE_DONE
+            pos = string_end
+        elif char == 0x7b or char == 0x5b:  # { or [
+            if not _on_key_path(stack, char):
+                match = _FLAT_CONTAINER.match(data, pos, min(end, pos + _FLAT_LIMIT))
+                if match is not None:
+                    last = _VALUE_DONE
+                    pos = match.end()
+                    continue
+            stack.append([_OBJECT if char == 0x7b else _ARRAY, None])
+            expect_key = char == 0x7b
+            last = _OPEN
+            pos += 1
+        elif char == 0x7d:  # }
+            if not stack or stack[-1][0] != _OBJECT or last == _KEY_DONE:
+                raise ValueError(f"Unexpected '}}' at offset {pos}")
+            if _in_token_metadata(stack):
+                yield chain, contract
+                chain = contract = None
+            stack.pop()
+            expect_key = False
+            last = _VALUE_DONE
+            pos += 1
+        elif char == 0x5d:  # ]
+            if not stack or stack[-1][0] != _ARRAY or last == _COMMA:
+                raise ValueError(f"Unexpected ']' at offset {pos}")
+            stack.pop()
+            last = _VALUE_DONE
+            pos += 1
+        elif char == 0x2c:  # ,
+            if not stack or last != _VALUE_DONE:
+                raise ValueError(f"Unexpected ',' at offset {pos}")
+            expect_key = stack[-1][0] == _OBJECT
+            last = _COMMA
+            pos += 1
+        else:
+            match = _SCALAR.match(data, pos)
+            if match is None:
+                raise ValueError(f"Unexpected byte {chr(char)!r} at offset {pos}")
+            last = _VALUE_DONE
+            pos = match.end()
+
+    if stack or last != _VALUE_DONE:
+        raise ValueError("Unexpected end of document")
+
+
+def _on_key_path(stack, char) -> bool:
+    """True when a container opened here lies on the path root.tokens[i].token_metadata."""
+    depth = len(stack)
+    if depth == 0:
+        return True
+    if depth == 1:
+        return char == 0x5b and stack[0][1] == b'"tokens"'
+    if depth == 2:
+        return char == 0x7b and stack[0][1] == b'"tokens"' and stack[1][0] == _ARRAY
+    if depth == 3:
+        return char == 0x7b and stack[2][1] == b'"token_metadata"' and stack[0][1] == b'"tokens"'
+    return False
+
+
+def _in_token_metadata(stack) -> bool:
+    """True when the innermost container is root.tokens[i].token_metadata."""
+    return (
+        len(stack) == 4
+        and stack[0][1] == b'"tokens"'
+        and stack[1][0] == _ARRAY
+        and stack[2][1] == b'"token_metadata"'
+        and stack[3][0] == _OBJECT
+    )
+
+
+def key_document(data):
+    """
+    Reduce a JSON document to its token keys, in the same {"tokens": [...]} shape
+    the uniqueness check reads from full documents.
+    """
+    return {
+        "tokens": [
+            {"token_metadata": {"chain": chain, "contract": contract}}
+            for chain, contract in iter_token_keys(data)
+        ]
+    }
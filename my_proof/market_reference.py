@@ -0,0 +1,296 @@
+"""
+Market reference snapshot for authenticity cross-checks.
+
+validate_token_metrics only checks a token's metrics against each other, so a
+fabricated but consistent price / market cap / supply passes. This stage checks
+them against reference values for the same (chain, contract) instead.
+
+The snapshot is a columnar file: a header, the sorted 64-bit key hashes (see
+global_index.key_hash) and one float64 column per metric, all little-endian and
+8-byte aligned:
+
+    magic | count | generated_at | hashes[count] | price[count] | marketCap[count] | circulatingSupply[count]
+
+Proofs map it read-only and view the columns in place with NumPy, so opening a
+large snapshot costs a few page faults rather than a parse, and a submission's
+tokens are looked up together with one searchsorted. A missing reference value
+is stored as NaN and not checked. The snapshot is refreshed offline from market
+data exports (CSV or JSON records with chain, contract, price, marketCap and
+circulatingSupply):
+
+    python -m my_proof.market_reference refresh --output market_reference.bin prices.csv
+    python -m my_proof.market_reference refresh --output market_reference.bin --merge market_reference.bin new.json
+
+The output is replaced atomically. Proofs find the file through MARKET_REFERENCE_PATH.
+"""
+import argparse
+import csv
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from my_proof import metrics
+from my_proof.global_index import key_hash
+
+MAGIC = b"POCMREF1"
+# magic, key count, generation time (unix seconds)
+_HEADER = struct.Struct("<8sQd")
+# Snapshot columns and the submission metrics they are compared with
+COLUMNS = ("price", "marketCap", "circulatingSupply")
+DEFAULT_TOLERANCE = 0.5
+DEFAULT_MAX_AGE = 7 * 24 * 3600  # seconds
+
+_references = {}
+_lock = threading.Lock()
+
+
+def get_settings():
+    """Market reference settings from environment variables."""
+    return {
+        'path': os.environ.get('MARKET_REFERENCE_PATH'),
+        # Largest accepted relative deviation from the reference value
+        'tolerance': float(os.environ.get('MARKET_REFERENCE_TOLERANCE', DEFAULT_TOLERANCE)),
+        # Older snapshots are not used; 0 accepts any age
+        'max_age': float(os.environ.get('MARKET_REFERENCE_MAX_AGE', DEFAULT_MAX_AGE)),
+    }
+
+
+class MarketReference:
+    """Read-only view of a snapshot file; the columns are NumPy arrays over the mapped pages."""
+
+    def __init__(self, path: str):
+        import numpy as np
+
+        self.path = path
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            if len(self._mmap) < _HEADER.size:
+                raise ValueError(f"{path} is not a market reference snapshot")
+            magic, self.count, self.generated_at = _HEADER.unpack_from(self._mmap)
+            if magic != MAGIC:
+                raise ValueError(f"{path} is not a market reference snapshot")
+            if len(self._mmap) != _HEADER.size + 8 * self.count * (1 + len(COLUMNS)):
+                raise ValueError(f"{path} is truncated")
+            self.hashes = np.frombuffer(self._mmap, dtype="<u8", count=self.count, offset=_HEADER.size)
+            self.columns = {
+                name: np.frombuffer(self._mmap, dtype="<f8", count=self.count,
+                                    offset=_HEADER.size + 8 * self.count * (1 + i))
+                for i, name in enumerate(COLUMNS)
+            }
+        except BaseException:
+            self._mmap.close()
+            raise
+
+    def lookup(self, key_hashes):
+        """
+        Find many keys at once.
+
+        :param key_hashes: uint64 array of key_hash values.
+        :return: (found, positions): a bool mask, and each found key's row in the columns.
+        """
+        import numpy as np
+
+        if not self.count:
+            return np.zeros(len(key_hashes), dtype=bool), np.zeros(len(key_hashes), dtype=np.intp)
+        positions = np.minimum(np.searchsorted(self.hashes, key_hashes), self.count - 1)
+        return self.hashes[positions] == key_hashes, positions
+
+    def __len__(self) -> int:
+        return self.count
+
+    def close(self) -> None:
+        # The arrays export the mmap's buffer, which must be released before it closes
+        self.hashes = None
+        self.columns = {}
+        self._mmap.close()
+
+
+def get_market_reference(path: str = None):
+    """
+    The snapshot at `path` (default MARKET_REFERENCE_PATH), opened once per file version.
+
+    Returns None when no snapshot is configured, it cannot be read, or it is older
+    than MARKET_REFERENCE_MAX_AGE.
+    """
+    settings = get_settings()
+    path = path or settings['path']
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except OSError as e:
+        logging.warning(f"Market reference unavailable: {e}")
+        return None
+    version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _references.get(path)
+        if cached is not None and cached[0] == version:
+            reference = cached[1]
+        else:
+            try:
+                reference = MarketReference(path)
+            except (OSError, ValueError) as e:
+                logging.warning(f"Market reference unavailable: {e}")
+                return None
+            _references[path] = (version, reference)
+    if settings['max_age'] > 0 and time.time() - reference.generated_at > settings['max_age']:
+        logging.warning(f"Market reference {path} is older than {settings['max_age']:.0f}s, skipping the cross-check")
+        return None
+    return reference
+
+
+def _number(value) -> float:
+    """A submitted metric as a float; NaN (not checked) when it is missing or not a number."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
+
+
+def find_market_mismatches(reference: MarketReference, documents, tolerance: float = None):
+    """
+    Compare the submitted tokens' metrics with the snapshot.
+
+    Tokens missing from the snapshot, and metrics without a positive reference
+    value, are not checked.
+
+    :return: Dict mapping (chain, contract) to the names of the metrics that deviate
+             from the reference by more than `tolerance` (default MARKET_REFERENCE_TOLERANCE).
+    """
+    import numpy as np
+
+    if tolerance is None:
+        tolerance = get_settings()['tolerance']
+    keys = []
+    submitted = {name: [] for name in COLUMNS}
+    for document in documents:
+        for token in document.get("tokens", []):
+            token_metadata = token.get("token_metadata", {})
+            keys.append((token_metadata.get("chain", "").lower(), token_metadata.get("contract", "")))
+            token_metrics = token_metadata.get("metrics", {})
+            for name in COLUMNS:
+                submitted[name].append(_number(token_metrics.get(name)))
+    if not keys or not len(reference):
+        return {}
+
+    with metrics.span("market_reference"):
+        found, positions = reference.lookup(np.array([key_hash(chain, contract) for chain, contract in keys], dtype=np.uint64))
+        deviating = {}
+        with np.errstate(invalid="ignore"):
+            for name in COLUMNS:
+                expected = np.where(found, reference.columns[name][positions], np.nan)
+                value = np.array(submitted[name], dtype=np.float64)
+                # NaN on either side compares False, so it is never a mismatch
+                deviating[name] = (expected > 0) & (np.abs(value - expected) > tolerance * expected)
+
+        mismatches = {}
+        for i in np.flatnonzero(np.logical_or.reduce([deviating[name] for name in COLUMNS])).tolist():
+            mismatches[keys[i]] = [name for name in COLUMNS if deviating[name][i]]
+    metrics.incr("market_reference_found", int(found.sum()))
+    metrics.incr("market_reference_mismatches", len(mismatches))
+    return mismatches
+
+
+def write_reference(path: str, key_hashes, columns, generated_at: float = None) -> int:
+    """
+    Write a snapshot file atomically. Where a key appears more than once, its last row wins.
+
+    :param key_hashes: uint64 key_hash values, one per row.
+    :param columns: Dict of column name (see COLUMNS) to float64 values, one per row.
+    :return: Number of distinct keys written.
+    """
+    import numpy as np
+
+    key_hashes = np.asarray(key_hashes, dtype=np.uint64)
+    # Unique over the reversed rows keeps each key's last occurrence
+    _, last = np.unique(key_hashes[::-1], return_index=True)
+    rows = len(key_hashes) - 1 - last
+    count = len(rows)
+
+    header = _HEADER.pack(MAGIC, count, time.time() if generated_at is None else generated_at)
+    fd, tmp_path = tempfile.mkstemp(prefix=".market-reference-", dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(header)
+            file.write(key_hashes[rows].astype("<u8").tobytes())
+            for name in COLUMNS:
+                file.write(np.asarray(columns[name], dtype=np.float64)[rows].astype("<f8").tobytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    return count
+
+
+def iter_source_records(source: str):
+    """Market data records from a CSV file, a JSON list (or {"tokens": [...]}) or JSON Lines."""
+    with open(source, "r", encoding="utf-8", newline="") as file:
+        if source.endswith(".csv"):
+            yield from csv.DictReader(file)
+        elif source.endswith(".jsonl"):
+            for line in file:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            data = json.load(file)
+            yield from (data.get("tokens", []) if isinstance(data, dict) else data)
+
+
+def _record_value(record, name) -> float:
+    value = record.get(name)
+    try:
+        return float(value) if value not in (None, "") else math.nan
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def refresh(output: str, sources, merge: str = None) -> int:
+    """Build (or, with `merge`, update) the snapshot at `output` from market data exports."""
+    key_hashes = []
+    columns = {name: [] for name in COLUMNS}
+    if merge:
+        existing = MarketReference(merge)
+        try:
+            key_hashes.extend(existing.hashes.tolist())
+            for name in COLUMNS:
+                columns[name].extend(existing.columns[name].tolist())
+        finally:
+            existing.close()
+    for source in sources:
+        skipped = 0
+        for record in iter_source_records(source):
+            if not record.get("chain") or not record.get("contract"):
+                skipped += 1
+                continue
+            key_hashes.append(key_hash(record["chain"], record["contract"]))
+            for name in COLUMNS:
+                columns[name].append(_record_value(record, name))
+        if skipped:
+            logging.warning(f"Skipped {skipped} records without chain or contract in {source}")
+    return write_reference(output, key_hashes, columns)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the market reference snapshot.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    refresh_parser = subparsers.add_parser("refresh", help="build or update a snapshot from market data exports")
+    refresh_parser.add_argument("sources", nargs="*", help="CSV, JSON or JSON Lines market data files")
+    refresh_parser.add_argument("--output", required=True)
+    refresh_parser.add_argument("--merge", help="existing snapshot whose tokens are kept unless a source updates them")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    count = refresh(args.output, args.sources, args.merge)
+    print(f"{args.output}: {count} tokens")
+
+
+if __name__ == "__main__":
+    main()
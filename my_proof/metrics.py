@@ -0,0 +1,165 @@
+"""
+Per-run timing spans and counters.
+
+Stages wrap their work in `span(...)` and bump `incr(...)` counters; both are
+recorded into one process-wide registry that `run()` resets at the start of a
+proof and writes next to results.json at the end:
+
+    metrics.json   always, unless PROOF_METRICS=false
+    metrics.prom   Prometheus text format, when PROOF_METRICS_PROMETHEUS=true
+
+The registry is shared by all threads, so the fetch and ownership worker
+threads record into the run that started them.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_FILENAME = "metrics.json"
+PROMETHEUS_FILENAME = "metrics.prom"
+PROMETHEUS_PREFIX = "proof_"
+
+
+class Metrics:
+    """Thread-safe registry of timing spans and counters for one proof run."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.started = time.time()
+            self.spans = {}
+            self.counters = {}
+
+    def record(self, name: str, seconds: float, labels=None) -> None:
+        key = (name, tuple(sorted((labels or {}).items())))
+        with self._lock:
+            span = self.spans.setdefault(key, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            span["count"] += 1
+            span["total_ms"] += seconds * 1000
+            span["max_ms"] = max(span["max_ms"], seconds * 1000)
+
+    def incr(self, name: str, value=1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        """JSON-serializable copy of the recorded spans and counters."""
+        with self._lock:
+            return {
+                "started_at": self.started,
+                "spans": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": span["count"],
+                        "total_ms": round(span["total_ms"], 3),
+                        "max_ms": round(span["max_ms"], 3),
+                    }
+                    for (name, labels), span in sorted(self.spans.items())
+                ],
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def merge(self, snapshot) -> None:
+        """Fold in a snapshot taken in another process, e.g. a batch pool worker."""
+        with self._lock:
+            for entry in snapshot.get("spans", []):
+                key = (entry["name"], tuple(sorted(entry["labels"].items())))
+                span = self.spans.setdefault(key, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+                span["count"] += entry["count"]
+                span["total_ms"] += entry["total_ms"]
+                span["max_ms"] = max(span["max_ms"], entry["max_ms"])
+            for name, value in snapshot.get("counters", {}).items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+
+_metrics = Metrics()
+
+
+def get_metrics() -> Metrics:
+    return _metrics
+
+
+@contextmanager
+def span(name: str, **labels):
+    """Time the enclosed block as one occurrence of stage `name`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _metrics.record(name, time.perf_counter() - start, labels)
+
+
+def incr(name: str, value=1) -> None:
+    _metrics.incr(name, value)
+
+
+def reset() -> None:
+    _metrics.reset()
+
+
+def metrics_enabled() -> bool:
+    return os.environ.get("PROOF_METRICS", "true").lower() in ("1", "true", "yes")
+
+
+def prometheus_enabled() -> bool:
+    return os.environ.get("PROOF_METRICS_PROMETHEUS", "false").lower() in ("1", "true", "yes")
+
+
+def _prometheus_labels(labels) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _prometheus_name(name: str) -> str:
+    return PROMETHEUS_PREFIX + "".join(char if char.isalnum() else "_" for char in name)
+
+
+def to_prometheus(snapshot) -> str:
+    """Render a snapshot in the Prometheus text exposition format."""
+    lines = []
+    span_families = (
+        ("stage_seconds_total", "counter", lambda entry: f"{entry['total_ms'] / 1000:.6f}"),
+        ("stage_calls_total", "counter", lambda entry: str(entry["count"])),
+        ("stage_max_seconds", "gauge", lambda entry: f"{entry['max_ms'] / 1000:.6f}"),
+    )
+    for family, kind, value in span_families:
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}{family} {kind}")
+        for entry in snapshot["spans"]:
+            labels = _prometheus_labels({"stage": entry["name"], **entry["labels"]})
+            lines.append(f"{PROMETHEUS_PREFIX}{family}{labels} {value(entry)}")
+    for name, value in snapshot["counters"].items():
+        metric = _prometheus_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(output_dir: str):
+    """
+    Write this run's metrics next to results.json.
+
+    :return: Path of metrics.json, or None when metrics are disabled.
+    """
+    if not metrics_enabled() or not os.path.isdir(output_dir):
+        return None
+    snapshot = _metrics.snapshot()
+    path = os.path.join(output_dir, METRICS_FILENAME)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, indent=2)
+    if prometheus_enabled():
+        with open(os.path.join(output_dir, PROMETHEUS_FILENAME), 'w', encoding='utf-8') as f:
+            f.write(to_prometheus(snapshot))
+    logging.info(f"Proof metrics written to {path}")
+    return path
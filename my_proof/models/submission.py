@@ -0,0 +1,35 @@
+from typing import Any, Dict
+
+from pydantic import BaseModel, field_validator, model_validator
+
+
+class Submission(BaseModel):
+    """
+    A contributor submission, parsed once from the input directory and shared by every proof stage.
+
+        source: Where the submission was read from (file name, or "archive.zip/member.json").
+        user_address: The contributor's wallet address, lowercased.
+        document: The parsed JSON document; its "tokens" list is validated but not copied.
+    """
+
+    source: str
+    user_address: str
+    document: Dict[str, Any]
+
+    @field_validator("user_address")
+    @classmethod
+    def normalize_user_address(cls, value: str) -> str:
+        if not value:
+            raise ValueError("userAddress is required")
+        return value.lower()
+
+    @model_validator(mode="after")
+    def check_tokens(self) -> "Submission":
+        tokens = self.document.get("tokens")
+        if not isinstance(tokens, list) or not all(isinstance(token, dict) for token in tokens):
+            raise ValueError("tokens must be a list of objects")
+        return self
+
+    @property
+    def tokens(self):
+        return self.document["tokens"]
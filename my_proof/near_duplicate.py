@@ -0,0 +1,511 @@
+"""
+Near-duplicate detection for the free-text fields of submitted tokens.
+
+Uniqueness is decided on (chain, contract), so a contributor could copy someone
+else's `on_chain_analysis`, `reason_recommend` or `suggestion` with small edits.
+Each text is reduced to word shingles and a MinHash signature, and signatures
+are kept in an LSH index: NUM_BANDS bands of ROWS_PER_BAND values, each band
+hashed to a bucket. A new text is only compared with the entries sharing at
+least one bucket with it, so a query costs a fixed number of bucket lookups
+plus the few candidates found, independent of the size of the history.
+
+The index is shared by all wallets and lives in Redis when it is configured,
+else in a SQLite file (NEAR_DUPLICATE_INDEX_PATH, or near_duplicates.sqlite3
+in the sealed directory). Texts of other wallets whose estimated Jaccard
+similarity reaches NEAR_DUPLICATE_THRESHOLD are reported; the proof lowers
+those tokens' uniqueness accordingly. Only texts first recorded before the
+submitter's own copy count, so the original author is not penalized when a
+copier's text is indexed after theirs.
+
+In Redis, entries and bucket sets expire NEAR_DUPLICATE_TTL seconds after their
+last write (0 keeps them), so the index only covers recently submitted texts.
+The SQLite index belongs to one validator and is not expired. It can be seeded
+from decrypted submissions:
+
+    python -m my_proof.near_duplicate build --sealed-dir /sealed /data/decrypted/
+"""
+import argparse
+import atexit
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+
+from my_proof import metrics
+
+TEXT_FIELDS = ("on_chain_analysis", "reason_recommend", "suggestion")
+# Changing the signature layout invalidates every stored signature
+NUM_PERM = 128
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_PERM // NUM_BANDS
+DEFAULT_THRESHOLD = 0.7
+DEFAULT_SHINGLE_SIZE = 5
+DEFAULT_MIN_WORDS = 20
+DEFAULT_INDEX_PREFIX = "poc:lsh:"
+DEFAULT_TTL = 180 * 24 * 3600  # seconds
+SQLITE_FILENAME = "near_duplicates.sqlite3"
+# Seconds a connection waits for another process's write lock
+SQLITE_BUSY_TIMEOUT = 30
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_WORD = re.compile(r"\w+")
+_permutations = None
+_sqlite_indexes = {}
+_sqlite_indexes_lock = threading.Lock()
+
+
+def get_settings():
+    """Near-duplicate detection settings from environment variables."""
+    return {
+        'enabled': os.environ.get('NEAR_DUPLICATE', 'true').lower() in ('1', 'true', 'yes'),
+        'threshold': float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', DEFAULT_THRESHOLD)),
+        'shingle_size': int(os.environ.get('NEAR_DUPLICATE_SHINGLE_SIZE', DEFAULT_SHINGLE_SIZE)),
+        'min_words': int(os.environ.get('NEAR_DUPLICATE_MIN_WORDS', DEFAULT_MIN_WORDS)),
+        'prefix': os.environ.get('NEAR_DUPLICATE_PREFIX', DEFAULT_INDEX_PREFIX),
+        # Retention of Redis entries and buckets after their last write; 0 keeps them
+        'ttl': int(os.environ.get('NEAR_DUPLICATE_TTL', DEFAULT_TTL)),
+        'path': os.environ.get('NEAR_DUPLICATE_INDEX_PATH'),
+    }
+
+
+def _get_permutations(np):
+    # Derived from fixed hashes rather than a seeded RNG, so signatures stay comparable across NumPy versions
+    global _permutations
+    if _permutations is None:
+        values = [
+            int.from_bytes(hashlib.blake2b(f"minhash:{i}".encode("utf-8"), digest_size=8).digest(), "little")
+            % _MERSENNE_PRIME
+            for i in range(2 * NUM_PERM)
+        ]
+        a = np.array([value or 1 for value in values[:NUM_PERM]], dtype=np.uint64)
+        b = np.array(values[NUM_PERM:], dtype=np.uint64)
+        _permutations = (a, b)
+    return _permutations
+
+
+def shingles(text: str, size: int = DEFAULT_SHINGLE_SIZE, min_words: int = DEFAULT_MIN_WORDS):
+    """
+    32-bit hashes of the word `size`-grams of a lowercased text.
+
+    Texts shorter than `min_words` words yield nothing: short boilerplate is too
+    common to count as copying.
+    """
+    words = _WORD.findall(text.lower())
+    if len(words) < max(min_words, 1):
+        return set()
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode("utf-8"))}
+    return {zlib.crc32(" ".join(words[i:i + size]).encode("utf-8")) for i in range(len(words) - size + 1)}
+
+
+def minhash(shingle_hashes):
+    """MinHash signature (NUM_PERM uint32 values) of a non-empty set of 32-bit shingle hashes."""
+    import numpy as np
+
+    a, b = _get_permutations(np)
+    values = np.fromiter(shingle_hashes, dtype=np.uint64, count=len(shingle_hashes))
+    # (a * x + b) mod p wraps at 64 bits like other MinHash implementations; it stays a valid hash family
+    with np.errstate(over="ignore"):
+        permuted = (np.outer(values, a) + b) % np.uint64(_MERSENNE_PRIME)
+    return (permuted & np.uint64(0xFFFFFFFF)).min(axis=0).astype(np.uint32)
+
+
+def band_keys(signature):
+    """(band, bucket hash) of each LSH band of a signature."""
+    data = signature.astype("<u4").tobytes()
+    width = 4 * ROWS_PER_BAND
+    return [
+        (band, struct.unpack("<q", hashlib.blake2b(data[band * width:(band + 1) * width], digest_size=8).digest())[0])
+        for band in range(NUM_BANDS)
+    ]
+
+
+def similarity(signature_a, signature_b) -> float:
+    """Estimated Jaccard similarity of the texts behind two signatures."""
+    return float((signature_a == signature_b).mean())
+
+
+def entry_id(wallet_address: str, chain: str, contract: str, field: str) -> str:
+    """Stable id of one text, so resubmitting it replaces rather than duplicates its entry."""
+    return hashlib.sha256(f"{wallet_address.lower()}\n{chain}\n{contract}\n{field}".encode("utf-8")).hexdigest()[:32]
+
+
+def submission_texts(documents, settings=None):
+    """
+    Signatures of every long enough text field in submission documents.
+
+    :return: List of ((chain, contract), field, wallet_address, signature).
+    """
+    settings = settings or get_settings()
+    texts = []
+    for document in documents:
+        wallet_address = (document.get("userAddress") or "").lower()
+        for token in document.get("tokens", []):
+            token_metadata = token.get("token_metadata", {})
+            token_key = (token_metadata.get("chain", "").lower(), token_metadata.get("contract", ""))
+            for field in TEXT_FIELDS:
+                text = token.get(field)
+                if not isinstance(text, str):
+                    continue
+                hashes = shingles(text, settings['shingle_size'], settings['min_words'])
+                if hashes:
+                    texts.append((token_key, field, wallet_address, minhash(hashes)))
+    return texts
+
+
+def _first_seen(entry, signature, threshold: float = DEFAULT_THRESHOLD) -> float:
+    """When the text behind `signature` was first recorded: its stored entry's time, unless the text has since been rewritten."""
+    if entry is None or similarity(signature, entry[1]) < threshold:
+        return math.inf
+    return entry[2]
+
+
+class NearDuplicateIndex(ABC):
+    """LSH index of text signatures, shared by all wallets."""
+
+    def find(self, texts, threshold: float = DEFAULT_THRESHOLD):
+        """
+        Highest similarity of each token's texts to texts other wallets recorded before them.
+
+        :param texts: Output of submission_texts.
+        :return: Dict mapping (chain, contract) to the similarity, for tokens at or above `threshold`.
+        """
+        if not texts:
+            return {}
+        keys_per_text = [band_keys(signature) for _, _, _, signature in texts]
+        members = self._bucket_members({key for keys in keys_per_text for key in keys})
+        candidates = [set().union(*(members.get(key, ()) for key in keys)) for keys in keys_per_text]
+        own_ids = [entry_id(wallet_address, chain, contract, field) for (chain, contract), field, wallet_address, _ in texts]
+        entries = self._entries(set(own_ids).union(*candidates))
+        metrics.incr("near_duplicate_candidates", sum(len(ids) for ids in candidates))
+
+        found = {}
+        for (token_key, _, wallet_address, signature), own_id, ids in zip(texts, own_ids, candidates):
+            # A text already recorded for this wallet only loses to texts recorded before it
+            own_first_seen = _first_seen(entries.get(own_id), signature, threshold)
+            for candidate in ids:
+                entry = entries.get(candidate)
+                if entry is None or entry[0] == wallet_address or entry[2] >= own_first_seen:
+                    continue
+                score = similarity(signature, entry[1])
+                if score >= threshold and score > found.get(token_key, 0.0):
+                    found[token_key] = score
+        return found
+
+    def add(self, texts, threshold: float = DEFAULT_THRESHOLD) -> None:
+        """
+        Store the texts' signatures so later submissions are compared with them.
+
+        A resubmitted text keeps the time it was first recorded; a rewritten one starts over.
+        """
+        signatures = {}
+        buckets = []
+        for (chain, contract), field, wallet_address, signature in texts:
+            text_id = entry_id(wallet_address, chain, contract, field)
+            signatures[text_id] = (wallet_address, signature)
+            buckets.extend((band, bucket, text_id) for band, bucket in band_keys(signature))
+        if not signatures:
+            return
+        existing = self._entries(signatures)
+        now = time.time()
+        entries = {}
+        for text_id, (wallet_address, signature) in signatures.items():
+            first_seen = _first_seen(existing.get(text_id), signature, threshold)
+            entries[text_id] = (wallet_address, signature, now if first_seen == math.inf else first_seen)
+        self._store(entries, buckets)
+
+    @abstractmethod
+    def _bucket_members(self, keys):
+        """Dict mapping each (band, bucket) in `keys` to the set of entry ids in it."""
+
+    @abstractmethod
+    def _entries(self, ids):
+        """Dict mapping each known id to (wallet_address, signature, first_seen)."""
+
+    @abstractmethod
+    def _store(self, entries, buckets) -> None:
+        """Write entries (id -> (wallet_address, signature, first_seen)) and (band, bucket, id) memberships."""
+
+
+def _decode_signature(data: bytes):
+    import numpy as np
+
+    return np.frombuffer(data, dtype="<u4").astype(np.uint32)
+
+
+class RedisNearDuplicateIndex(NearDuplicateIndex):
+    """
+    Index in Redis: one set per bucket and one key per entry, each read in a single pipelined round trip.
+
+    Both expire `ttl` seconds after their last write. A bucket can outlive some of
+    its members' entries; ids without an entry are skipped.
+    """
+
+    def __init__(self, redis_client, prefix=DEFAULT_INDEX_PREFIX, ttl=DEFAULT_TTL):
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self.ttl = ttl
+
+    def _bucket_key(self, key):
+        band, bucket = key
+        return f"{self.prefix}b:{band}:{bucket}"
+
+    def _bucket_members(self, keys):
+        import redis
+
+        keys = list(keys)
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.smembers(self._bucket_key(key))
+        try:
+            return dict(zip(keys, pipeline.execute()))
+        except redis.RedisError as e:
+            logging.warning(f"Near-duplicate index read failed: {e}")
+            return {}
+
+    def _entries(self, ids):
+        import redis
+
+        ids = list(ids)
+        if not ids:
+            return {}
+        try:
+            values = self.redis_client.mget([f"{self.prefix}e:{text_id}" for text_id in ids])
+        except redis.RedisError as e:
+            logging.warning(f"Near-duplicate index read failed: {e}")
+            return {}
+        entries = {}
+        for text_id, value in zip(ids, values):
+            if value:
+                entry = json.loads(value)
+                entries[text_id] = (
+                    entry["wallet"], _decode_signature(bytes.fromhex(entry["signature"])), entry.get("first_seen", 0.0)
+                )
+        return entries
+
+    def _store(self, entries, buckets):
+        import redis
+
+        ttl = self.ttl if self.ttl > 0 else None
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for text_id, (wallet_address, signature, first_seen) in entries.items():
+            value = {
+                "wallet": wallet_address, "signature": signature.astype("<u4").tobytes().hex(), "first_seen": first_seen
+            }
+            pipeline.set(f"{self.prefix}e:{text_id}", json.dumps(value), ex=ttl)
+        members = {}
+        for band, bucket, text_id in buckets:
+            members.setdefault(self._bucket_key((band, bucket)), []).append(text_id)
+        for bucket_key, ids in members.items():
+            pipeline.sadd(bucket_key, *ids)
+            if ttl:
+                pipeline.expire(bucket_key, ttl)
+        try:
+            pipeline.execute()
+        except redis.RedisError as e:
+            logging.warning(f"Near-duplicate index write failed: {e}")
+
+
+class SqliteNearDuplicateIndex(NearDuplicateIndex):
+    """
+    Index in a local SQLite file; buckets are looked up through the primary key.
+
+    Batch pool workers share the file, so it runs in WAL mode and writers wait up
+    to SQLITE_BUSY_TIMEOUT for the lock. A read that still fails finds nothing and
+    a write that still fails is skipped, both logged.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " id TEXT PRIMARY KEY, wallet TEXT NOT NULL, signature BLOB NOT NULL, first_seen REAL NOT NULL DEFAULT 0)"
+        )
+        # Files written before first_seen was tracked: their entries count as the earliest
+        if "first_seen" not in {row[1] for row in self._conn.execute("PRAGMA table_info(entries)")}:
+            self._conn.execute("ALTER TABLE entries ADD COLUMN first_seen REAL NOT NULL DEFAULT 0")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS buckets ("
+            " band INTEGER NOT NULL, bucket INTEGER NOT NULL, id TEXT NOT NULL,"
+            " PRIMARY KEY (band, bucket, id)) WITHOUT ROWID"
+        )
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _bucket_members(self, keys):
+        try:
+            return self._select_members(list(keys))
+        except sqlite3.Error as e:
+            logging.warning(f"Near-duplicate index read failed: {e}")
+            return {}
+
+    def _select_members(self, keys):
+        members = {}
+        with self._lock:
+            # Keep well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 300):
+                chunk = keys[i:i + 300]
+                clause = " OR ".join(["(band = ? AND bucket = ?)"] * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT band, bucket, id FROM buckets WHERE {clause}", [part for key in chunk for part in key]
+                ).fetchall()
+                for band, bucket, text_id in rows:
+                    members.setdefault((band, bucket), set()).add(text_id)
+        return members
+
+    def _entries(self, ids):
+        try:
+            return self._select_entries(list(ids))
+        except sqlite3.Error as e:
+            logging.warning(f"Near-duplicate index read failed: {e}")
+            return {}
+
+    def _select_entries(self, ids):
+        entries = {}
+        with self._lock:
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                rows = self._conn.execute(
+                    f"SELECT id, wallet, signature, first_seen FROM entries WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+                for text_id, wallet_address, signature, first_seen in rows:
+                    entries[text_id] = (wallet_address, _decode_signature(signature), first_seen)
+        return entries
+
+    def _store(self, entries, buckets):
+        # Batch pool workers share the file, so a write can lose the race for the lock
+        with self._lock:
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO entries (id, wallet, signature, first_seen) VALUES (?, ?, ?, ?)",
+                    [
+                        (text_id, wallet_address, signature.astype("<u4").tobytes(), first_seen)
+                        for text_id, (wallet_address, signature, first_seen) in entries.items()
+                    ],
+                )
+                self._conn.executemany("INSERT OR IGNORE INTO buckets (band, bucket, id) VALUES (?, ?, ?)", buckets)
+                self._conn.commit()
+            except sqlite3.Error as e:
+                self._conn.rollback()
+                logging.warning(f"Near-duplicate index write failed: {e}")
+
+
+def get_near_duplicate_index(redis_client=None, sealed_dir=None):
+    """
+    Open the near-duplicate index for this run.
+
+    Uses Redis when a client is given, otherwise the SQLite file at
+    NEAR_DUPLICATE_INDEX_PATH or in the sealed directory. Returns None when
+    detection is disabled or no backend is available.
+    """
+    settings = get_settings()
+    if not settings['enabled']:
+        return None
+    if redis_client is not None:
+        return RedisNearDuplicateIndex(redis_client, prefix=settings['prefix'], ttl=settings['ttl'])
+    path = settings['path'] or (os.path.join(sealed_dir, SQLITE_FILENAME) if sealed_dir and os.path.isdir(sealed_dir) else None)
+    if not path:
+        return None
+    # One connection per file for the life of the process, closed at exit
+    with _sqlite_indexes_lock:
+        index = _sqlite_indexes.get(os.path.abspath(path))
+        if index is None:
+            try:
+                index = _sqlite_indexes[os.path.abspath(path)] = SqliteNearDuplicateIndex(path)
+            except sqlite3.Error as e:
+                logging.warning(f"Near-duplicate index unavailable: {e}")
+        return index
+
+
+@atexit.register
+def close_indexes() -> None:
+    """Close the SQLite indexes opened by get_near_duplicate_index."""
+    with _sqlite_indexes_lock:
+        indexes = list(_sqlite_indexes.values())
+        _sqlite_indexes.clear()
+    for index in indexes:
+        index.close()
+
+
+def find_near_duplicates(index: NearDuplicateIndex, documents):
+    """Similarity of the documents' tokens to other wallets' texts; see NearDuplicateIndex.find."""
+    settings = get_settings()
+    with metrics.span("near_duplicates"):
+        found = index.find(submission_texts(documents, settings), settings['threshold'])
+    metrics.incr("near_duplicate_tokens", len(found))
+    return found
+
+
+def record_texts(index: NearDuplicateIndex, documents) -> None:
+    """Add the documents' texts to the index."""
+    settings = get_settings()
+    with metrics.span("near_duplicates_record"):
+        index.add(submission_texts(documents, settings), settings['threshold'])
+
+
+def build(index: NearDuplicateIndex, sources, batch_size: int = 500) -> int:
+    """Add the texts of decrypted submission files (or directories of them) to `index`."""
+    from my_proof.history_fetch import iter_json_documents
+
+    def paths(source):
+        if os.path.isdir(source):
+            for root, _, file_names in os.walk(source):
+                for file_name in sorted(file_names):
+                    yield os.path.join(root, file_name)
+        else:
+            yield source
+
+    settings = get_settings()
+    added = 0
+    batch = []
+    for source in sources:
+        for path in paths(source):
+            try:
+                batch.extend(submission_texts(iter_json_documents(path), settings))
+            except ValueError as e:
+                logging.warning(f"Skipping {path}: {e}")
+            if len(batch) >= batch_size:
+                index.add(batch, settings['threshold'])
+                added += len(batch)
+                batch = []
+    index.add(batch, settings['threshold'])
+    return added + len(batch)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Seed the near-duplicate text index.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="add the texts of decrypted submissions")
+    build_parser.add_argument("sources", nargs="+", help="decrypted submission files or directories")
+    build_parser.add_argument("--sealed-dir", help="use the SQLite index in this directory instead of Redis")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.sealed_dir or os.environ.get("NEAR_DUPLICATE_INDEX_PATH"):
+        index = get_near_duplicate_index(sealed_dir=args.sealed_dir)
+    else:
+        from my_proof.proof_of_uniqueness import get_redis_client
+
+        index = get_near_duplicate_index(get_redis_client())
+    if index is None:
+        raise SystemExit("No near-duplicate index: set REDIS_HOST or NEAR_DUPLICATE_INDEX_PATH, or pass --sealed-dir")
+    print(f"Indexed {build(index, args.sources)} texts")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from my_proof.token_index import normalize_token_key
+
+DEFAULT_CACHE_TTL = 6 * 3600  # seconds
+DEFAULT_NEGATIVE_TTL = 15 * 60  # seconds
+DEFAULT_CACHE_PREFIX = "poc:ownership:"
+SQLITE_FILENAME = "ownership_cache.sqlite3"
+# Seconds a connection waits for another process's write lock
+SQLITE_BUSY_TIMEOUT = 30
+
+_sqlite_caches = {}
+_sqlite_caches_lock = threading.Lock()
+
+
+def get_cache_settings():
+    """Ownership cache settings from environment variables."""
+    max_blocks = os.environ.get('OWNERSHIP_CACHE_MAX_BLOCKS')
+    return {
+        'enabled': os.environ.get('OWNERSHIP_CACHE', 'true').lower() in ('1', 'true', 'yes'),
+        'ttl': int(os.environ.get('OWNERSHIP_CACHE_TTL', DEFAULT_CACHE_TTL)),
+        'negative_ttl': int(os.environ.get('OWNERSHIP_CACHE_NEGATIVE_TTL', DEFAULT_NEGATIVE_TTL)),
+        'max_blocks': int(max_blocks) if max_blocks else None,
+        'prefix': os.environ.get('OWNERSHIP_CACHE_PREFIX', DEFAULT_CACHE_PREFIX),
+    }
+
+
+def ownership_key(chain: str, token_address: str, wallet_address: str):
+    """Normalized (chain, token, wallet) cache key."""
+    chain, token_address = normalize_token_key(chain, token_address)
+    return chain, token_address, normalize_token_key(chain, wallet_address)[1]
+
+
+class OwnershipCache(ABC):
+    """
+    Cache of ownership results keyed by (chain, token, wallet).
+
+    Both positive and negative results are cached, with separate TTLs. When
+    max_blocks is set, entries also expire once the chain has advanced that many
+    blocks past the block they were checked at; this needs the current block
+    number per chain, so it costs one eth_blockNumber call per chain.
+    """
+
+    def __init__(self, ttl=DEFAULT_CACHE_TTL, negative_ttl=DEFAULT_NEGATIVE_TTL, max_blocks=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_blocks = max_blocks
+
+    def is_fresh(self, entry, now, current_block=None) -> bool:
+        ttl = self.ttl if entry["owned"] else self.negative_ttl
+        if now - entry["checked_at"] > ttl:
+            return False
+        if self.max_blocks is not None and current_block is not None and entry.get("block") is not None:
+            return current_block - entry["block"] <= self.max_blocks
+        return True
+
+    def get_many(self, keys, current_blocks=None):
+        """
+        Bulk prefetch of cached results.
+
+        :param keys: Iterable of (chain, token_address, wallet_address).
+        :param current_blocks: Optional dict chain -> current block number for block-age expiry.
+        :return: Dict mapping each requested key that has a fresh entry to True/False.
+        """
+        keys = list(keys)
+        normalized = [ownership_key(*key) for key in keys]
+        entries = self._load(normalized) if keys else {}
+        now = time.time()
+        current_blocks = current_blocks or {}
+        results = {}
+        for key, norm_key in zip(keys, normalized):
+            entry = entries.get(norm_key)
+            if entry and self.is_fresh(entry, now, current_blocks.get(norm_key[0])):
+                results[key] = entry["owned"]
+        return results
+
+    def put_many(self, results, current_blocks=None):
+        """
+        Store ownership results.
+
+        :param results: Dict mapping (chain, token_address, wallet_address) to True/False.
+                        Unverified (None) results are never cached.
+        """
+        now = time.time()
+        current_blocks = current_blocks or {}
+        entries = {
+            ownership_key(*key): {"owned": bool(owned), "checked_at": now, "block": current_blocks.get(key[0])}
+            for key, owned in results.items()
+            if owned is not None
+        }
+        if entries:
+            self._store(entries)
+
+    @abstractmethod
+    def _load(self, keys):
+        """Dict of the stored entries for the given normalized keys."""
+
+    @abstractmethod
+    def _store(self, entries):
+        """Write entries, a dict of normalized key to entry."""
+
+
+class RedisOwnershipCache(OwnershipCache):
+    """Ownership cache shared across validators through Redis; expiry uses Redis TTLs."""
+
+    def __init__(self, redis_client, prefix=DEFAULT_CACHE_PREFIX, **kwargs):
+        super().__init__(**kwargs)
+        self.redis_client = redis_client
+        self.prefix = prefix
+
+    def _redis_key(self, key):
+        return self.prefix + ":".join(key)
+
+    def _load(self, keys):
+        import redis
+
+        try:
+            values = self.redis_client.mget([self._redis_key(key) for key in keys])
+        except redis.RedisError as e:
+            logging.warning(f"Ownership cache read failed: {e}")
+            return {}
+        return {key: json.loads(value) for key, value in zip(keys, values) if value}
+
+    def _store(self, entries):
+        import redis
+
+        pipeline = self.redis_client.pipeline(transaction=False)
+        for key, entry in entries.items():
+            pipeline.set(self._redis_key(key), json.dumps(entry), ex=self.ttl if entry["owned"] else self.negative_ttl)
+        try:
+            pipeline.execute()
+        except redis.RedisError as e:
+            logging.warning(f"Ownership cache write failed: {e}")
+
+
+class SqliteOwnershipCache(OwnershipCache):
+    """
+    Ownership cache in a local SQLite file, used when Redis is not configured.
+
+    Batch pool workers share the file, so it runs in WAL mode (readers do not
+    block the writer) and writers wait up to SQLITE_BUSY_TIMEOUT for the lock.
+    A read or write that still fails is logged and skipped like a Redis error.
+    """
+
+    def __init__(self, path, **kwargs):
+        super().__init__(**kwargs)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=SQLITE_BUSY_TIMEOUT, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ownership ("
+            " chain TEXT NOT NULL, token TEXT NOT NULL, wallet TEXT NOT NULL,"
+            " owned INTEGER NOT NULL, checked_at REAL NOT NULL, block INTEGER,"
+            " PRIMARY KEY (chain, token, wallet))"
+        )
+        self._conn.commit()
+
+    def _load(self, keys):
+        try:
+            return self._select(keys)
+        except sqlite3.Error as e:
+            logging.warning(f"Ownership cache read failed: {e}")
+            return {}
+
+    def _select(self, keys):
+        entries = {}
+        with self._lock:
+            # Keep well under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 300):
+                chunk = keys[i:i + 300]
+                clause = " OR ".join(["(chain = ? AND token = ? AND wallet = ?)"] * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT chain, token, wallet, owned, checked_at, block FROM ownership WHERE {clause}",
+                    [part for key in chunk for part in key],
+                ).fetchall()
+                for chain, token, wallet, owned, checked_at, block in rows:
+                    entries[(chain, token, wallet)] = {"owned": bool(owned), "checked_at": checked_at, "block": block}
+        return entries
+
+    def _store(self, entries):
+        try:
+            self._write(entries)
+        except sqlite3.Error as e:
+            logging.warning(f"Ownership cache write failed: {e}")
+
+    def _write(self, entries):
+        with self._lock:
+            now = time.time()
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO ownership (chain, token, wallet, owned, checked_at, block) VALUES (?, ?, ?, ?, ?, ?)",
+                [(*key, int(entry["owned"]), entry["checked_at"], entry["block"]) for key, entry in entries.items()],
+            )
+            self._conn.execute(
+                "DELETE FROM ownership WHERE checked_at < ?", (now - max(self.ttl, self.negative_ttl),)
+            )
+            self._conn.commit()
+
+
+def get_ownership_cache(redis_client=None, sealed_dir=None):
+    """
+    Build the ownership cache for this run.
+
+    Uses Redis when a client is given, otherwise a SQLite file in the sealed
+    directory, opened once per process. Returns None when caching is disabled or
+    neither is available.
+    """
+    settings = get_cache_settings()
+    if not settings['enabled']:
+        return None
+    kwargs = {'ttl': settings['ttl'], 'negative_ttl': settings['negative_ttl'], 'max_blocks': settings['max_blocks']}
+    if redis_client is not None:
+        return RedisOwnershipCache(redis_client, prefix=settings['prefix'], **kwargs)
+    if sealed_dir and os.path.isdir(sealed_dir):
+        # One connection per file and settings for the life of the process
+        path = os.path.join(sealed_dir, SQLITE_FILENAME)
+        cache_key = (os.path.abspath(path), tuple(sorted(kwargs.items())))
+        with _sqlite_caches_lock:
+            cache = _sqlite_caches.get(cache_key)
+            if cache is None:
+                try:
+                    cache = _sqlite_caches[cache_key] = SqliteOwnershipCache(path, **kwargs)
+                except sqlite3.Error as e:
+                    logging.warning(f"Ownership cache unavailable: {e}")
+            return cache
+    return None
@@ -1,15 +1,40 @@
 from datetime import datetime
-from web3 import Web3
-import json
 import logging
 import os
-from typing import Dict, Any
-import json
+from typing import Dict, Any, List, Optional
 
-from my_proof.proof_of_ownership import RPC_URLS , check_token_ownership
-from my_proof.proof_of_uniqueness import uniqueness_details
-from my_proof.proof_of_quality_n_authenticity import final_scores
+from my_proof import metrics
+from my_proof.proof_of_ownership import get_chain_timeout, resolve_ownership
+from my_proof.proof_of_uniqueness import (
+    failed_history, get_redis_client, list_history, submission_uniqueness_details, wallet_history
+)
+from my_proof.input_loader import load_input
+from my_proof.models.submission import Submission
+from my_proof.market_reference import find_market_mismatches, get_market_reference
+from my_proof.near_duplicate import find_near_duplicates, get_near_duplicate_index, record_texts
+from my_proof.global_index import get_global_index
+from my_proof.ownership_cache import get_ownership_cache
+from my_proof.proof_of_quality_n_authenticity import VALID_CHAINS, final_scores
 from my_proof.models.proof_response import ProofResponse
+from my_proof.result_cache import get_result_cache, result_key
+from my_proof.scheduler import StageScheduler
+
+def submitted_token_keys(documents):
+    """The (chain, contract) pairs that scoring can report, in the form used by its metadata."""
+    keys = []
+    for document in documents:
+        for token in document.get("tokens", []):
+            token_metadata = token.get("token_metadata", {})
+            chain = token_metadata.get("chain", "").lower()
+            if chain in VALID_CHAINS:
+                keys.append((chain, token_metadata.get("contract", "")))
+    return keys
+
+
+def ownership_timeout(remaining):
+    """Per-chain ownership deadline, cut short by the time left before the proof deadline."""
+    return get_chain_timeout() if remaining is None else min(get_chain_timeout(), remaining)
+
 
 class Proof:
     def __init__(self, config: Dict[str, Any]):
@@ -33,39 +58,166 @@ class Proof:
                 params[key] = value
         return params["author"]
 
-    def generate(self) -> ProofResponse:
-        """Generate proofs for all input files."""
+    def generate(self, submissions: Optional[List[Submission]] = None) -> ProofResponse:
+        """
+        Generate proofs for all input files.
+
+        :param submissions: Submissions already read by load_input; read from config['input_dir'] if omitted.
+        """
         logging.info("Starting proof generation")
 
-        json_files = [f for f in os.listdir(self.config['input_dir']) if f.endswith('.json')]
+        if submissions is None:
+            submissions = load_input(self.config['input_dir'])
+        if not submissions:
+            raise FileNotFoundError(f"No submissions found in {self.config['input_dir']}")
+        self.wallet_address = submissions[0].user_address
+
+        logging.info(f"Wallet address from proof is {self.wallet_address}")
+
+        documents = [submission.document for submission in submissions]
+        sealed_dir = self.get_sealed_dir()
 
-        json_file_path = os.path.join(self.config['input_dir'], json_files[0])
-        with open(json_file_path, 'r') as json_file:
-            wallet_data = json.load(json_file)
-            self.wallet_address = wallet_data.get("userAddress").lower()
-        
-        print(f"wallet address from proof is",self.wallet_address)
+        # A rerun of the same submission against an unchanged history returns the stored proof.
+        # The cache key needs every historical fileId, so with a result cache the history
+        # (above the digest's watermark) is listed in full before downloads start. Page
+        # streaming into downloads only applies without one, the default without Redis
+        result_cache = self.get_result_cache()
+        market_reference = get_market_reference()
+        global_index = get_global_index()
+        listing = None
+        cache_key = None
+        if result_cache is not None:
+            listing = list_history(self.wallet_address, sealed_dir)
+        if listing is not None and listing.error is None:
+            cache_key = result_key(
+                documents, self.wallet_address, listing.file_ids,
+                self.config['dlp_id'], self.max_rewards, self.reward_per_token,
+                reference_version=market_reference.generated_at if market_reference is not None else None,
+                global_index_version=global_index.version if global_index is not None else None,
+            )
+            with metrics.span("result_cache_read"):
+                cached = result_cache.get(cache_key)
+            if cached is not None:
+                logging.info("Returning the cached proof for this submission")
+                self.proof_response = ProofResponse(**cached)
+                if self.proof_response.metadata:
+                    # The stored proof was scored earlier; it is submitted now
+                    self.proof_response.metadata['submission_time'] = datetime.now().isoformat()
+                return self.proof_response
 
-        uniqueness_details_ = uniqueness_details(self.wallet_address, self.config['input_dir'] )
+        scheduler = StageScheduler()
+        # A history that cannot be loaded is scored like one the API could not list: every
+        # token counts as unique, the proof is marked invalid and the stage shows as degraded
+        scheduler.add(
+            "history",
+            lambda: wallet_history(self.wallet_address, sealed_dir, listing),
+            fallback=failed_history(),
+        )
+        # Ownership only needs the submitted tokens, so its RPCs run while history downloads.
+        # Lookups for tokens that turn out not to be unique are wasted but harmless.
+        # Chains still pending at the proof deadline stay unverified instead of degrading the whole stage
+        scheduler.add(
+            "ownership",
+            lambda: self.check_ownership(submitted_token_keys(documents), ownership_timeout(scheduler.remaining())),
+            fallback=({}, {}),
+        )
+        # Near-duplicate lookups only read the submitted texts as well
+        near_duplicate_index = self.get_near_duplicate_index()
+        if near_duplicate_index is not None:
+            scheduler.add("near_duplicates", lambda: find_near_duplicates(near_duplicate_index, documents), fallback={})
+        # So are the market reference cross-checks
+        if market_reference is not None:
+            scheduler.add("market_reference", lambda: find_market_mismatches(market_reference, documents), fallback={})
+        scheduler.add(
+            "uniqueness",
+            lambda history: submission_uniqueness_details(
+                documents, history["history_index"], history["cache_stats"], history["status"]
+            ),
+            after=("history",),
+        )
+        results = scheduler.run()
+        if scheduler.degraded:
+            self.proof_response.attributes['degraded_stages'] = scheduler.degraded
+        proof_response = self.build_response(
+            results["uniqueness"], results["ownership"], results.get("near_duplicates"), results.get("market_reference")
+        )
+        # A near-duplicate penalty depends on the shared text index, which the cache key does not cover
+        if cache_key is not None and not results.get("near_duplicates"):
+            result_cache.put(cache_key, proof_response)
+        return proof_response
+
+    def build_response(self, uniqueness_details_: Dict[str, Any], ownership_results=None,
+                       text_similarity=None, market_mismatches=None) -> ProofResponse:
+        """
+        Score, check ownership and assemble the proof for one submission of self.wallet_address.
+
+        :param ownership_results: (ownership, chain_stats) from check_ownership, when ownership was resolved
+                                  ahead of scoring; otherwise the scored tokens are checked here.
+        :param text_similarity: Near-duplicate similarities from find_near_duplicates, when already looked up.
+        :param market_mismatches: Tokens contradicting the market reference from find_market_mismatches, when
+                                  already checked.
+        """
         unique_tokens = uniqueness_details_.get("unique_json_data", [])
-        combined_tokens = uniqueness_details_.get("old_files_json_data",[])
+        history_index = uniqueness_details_.get("history_index", [])
+        documents = uniqueness_details_.get("curr_file_json_data", [])
         # combined_tokens = unique_tokens + unique_tokens # for testing uniquness
 
         logging.info(f" Count of Unique tokens from proof.py: {len(unique_tokens)}")
 
-        authenticity_score, quality_score, uniqueness_score, metadata = final_scores(unique_tokens, combined_tokens)
+        cache_stats = uniqueness_details_.get("cache_stats", {})
+        self.proof_response.attributes['history_cache_hits'] = cache_stats.get("hits", 0)
+        self.proof_response.attributes['history_cache_misses'] = cache_stats.get("misses", 0)
+        # Files listed for loading (not already in the wallet digest), and how many of them loaded
+        if "listed" in cache_stats:
+            self.proof_response.attributes['history_files_listed'] = cache_stats["listed"]
+            self.proof_response.attributes['history_files_loaded'] = cache_stats.get("loaded", 0)
+            self.proof_response.attributes['history_files_failed'] = cache_stats.get("failed", 0)
+        # Uniqueness across every wallet in the DLP, reported alongside the per-wallet score
+        global_uniqueness_score = uniqueness_details_.get("global_uniqueness_score")
+        if global_uniqueness_score is not None:
+            self.proof_response.attributes['global_uniqueness'] = global_uniqueness_score
+        # "none" (a wallet without history) and "failed" (the API could not list it, or no file
+        # loaded) both score every token as unique, so the status says which one it was; see history_status
+        status = uniqueness_details_.get("history_status")
+        if status is not None:
+            self.proof_response.attributes['history_status'] = status
+        if status in ("partial", "failed"):
+            stage = "history_files" if cache_stats.get("failed") else "file_mappings"
+            self.proof_response.attributes.setdefault('degraded_stages', {})[stage] = "error"
+
+        # Tokens whose texts copy another contributor's lose uniqueness in proportion to the similarity
+        near_duplicate_index = self.get_near_duplicate_index()
+        if text_similarity is None and near_duplicate_index is not None:
+            text_similarity = find_near_duplicates(near_duplicate_index, documents)
+        if near_duplicate_index is not None:
+            self.proof_response.attributes['near_duplicate_tokens'] = len(text_similarity or {})
+
+        # Tokens whose price, market cap or supply contradict the market reference fail authenticity
+        market_reference = get_market_reference()
+        if market_mismatches is None and market_reference is not None:
+            market_mismatches = find_market_mismatches(market_reference, documents)
+        if market_reference is not None:
+            self.proof_response.attributes['market_reference_mismatches'] = len(market_mismatches or {})
+
+        with metrics.span("scoring"):
+            authenticity_score, quality_score, uniqueness_score, metadata = final_scores(
+                unique_tokens, history_index, text_similarity, market_mismatches
+            )
         self.proof_response.quality = quality_score
         self.proof_response.authenticity = authenticity_score
         self.proof_response.uniqueness = uniqueness_score
 
         self.proof_response.score = self.calculate_final_score(len(unique_tokens))
-        self.proof_response.valid = True
+        # Uniqueness that could not be checked against any history is not vouched for
+        self.proof_response.valid = status != "failed"
 
         # Additional metadata about the proof, written onchain
+        # Chains that miss their deadline fall back to the unverified 0.95 score
+        if ownership_results is None:
+            ownership_results = self.check_ownership([(item["chain"], item["token_submitted"]) for item in metadata])
+        ownership, ownership_chains = ownership_results
         for item in metadata:
-            token_address = item["token_submitted"]
-            chain = item["chain"]
-            item["ownership"] = 1.0 if check_token_ownership(chain, token_address, self.wallet_address) else 0.95
+            item["ownership"] = 1.0 if ownership.get((item["chain"], item["token_submitted"])) else 0.95
             item["score"] = (item["authenticity"] + item["quality"] + item["uniqueness"] + item["ownership"]) / 4  # Compute avg score
 
         self.proof_response.ownership = sum(item["ownership"] for item in metadata) / len(metadata) if metadata else 0
@@ -75,10 +227,37 @@ class Proof:
             'submission_time': datetime.now().isoformat(),
             'token_rewarded': len(unique_tokens) * self.reward_per_token,
             'metadata': metadata,
+            'ownership_chains': ownership_chains,
         }
 
+        if near_duplicate_index is not None:
+            record_texts(near_duplicate_index, documents)
         return self.proof_response
     
+    def check_ownership(self, tokens, timeout: float = None):
+        """Resolve ownership of (chain, contract) pairs for self.wallet_address; see resolve_ownership."""
+        with metrics.span("ownership"):
+            return resolve_ownership(tokens, self.wallet_address, timeout, cache=self.get_ownership_cache())
+
+    def get_sealed_dir(self):
+        """The sealed directory for persistent state, or None when sealing is unavailable."""
+        return self.config.get('sealed_dir') if self.config.get('use_sealing') else None
+
+    def get_result_cache(self):
+        """Proof result cache backed by Redis when configured, else by the sealed directory."""
+        redis_client = get_redis_client() if os.environ.get('REDIS_HOST') else None
+        return get_result_cache(redis_client, self.get_sealed_dir())
+
+    def get_near_duplicate_index(self):
+        """Near-duplicate text index in Redis when configured, else in the sealed directory."""
+        redis_client = get_redis_client() if os.environ.get('REDIS_HOST') else None
+        return get_near_duplicate_index(redis_client, self.get_sealed_dir())
+
+    def get_ownership_cache(self):
+        """Ownership cache backed by Redis when configured, else by the sealed directory."""
+        redis_client = get_redis_client() if os.environ.get('REDIS_HOST') else None
+        return get_ownership_cache(redis_client, self.get_sealed_dir())
+
     def calculate_final_score(self, unique_token_count) -> float:
         score = (unique_token_count * self.reward_per_token) / (self.max_rewards)
         return score
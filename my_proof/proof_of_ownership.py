@@ -1,38 +1,46 @@
 import logging
 import os
-import json
-from eth_account import Account
-from eth_account.messages import encode_defunct
-from web3 import Web3
-
-RPC_URLS = { 
-        "vana": os.environ.get("VANA_RPC_URL"),
-        "ethereum": os.environ.get("ETH_RPC_URL"),
-        "base": os.environ.get("BASE_RPC_URL"),
-        "optimistic-ethereum": os.environ.get("OPTIMISM_RPC_URL"),
-        "binance-smart-chain": os.environ.get("BSC_RPC_URL"),
-        "polygon-pos": os.environ.get("POLYGON_RPC_URL"),
-        "opbnb": os.environ.get("OPBNB_RPC_URL"),
-        "zksync": os.environ.get("ZK_RPC_URL"),
-        "mantle": os.environ.get("MANTLE_RPC_URL"),
-        "scroll": os.environ.get("SCROLL_RPC_URL"),
-        "arbitrum-one": os.environ.get("ARBITRUM_RPC_URL"),
-        "avalanche": os.environ.get("AVALANCHE_RPC_URL"),
-        "linea": os.environ.get("LINEA_RPC_URL"),
-        "blast": os.environ.get("BLAST_RPC_URL"),
-        "solana": os.environ.get("SOLANA_RPC_URL"),
-        "xdai": os.environ.get("GNOSIS_RPC_URL"),
-        "fantom": os.environ.get("FANTOM_RPC_URL"),
-        "zklink-nova": os.environ.get("ZKLINK_RPC_URL"),
-        "tron": os.environ.get("TRON_RPC_URL"),
-        "kucoin-community-chain": os.environ.get("KCC_RPC_URL"),
-        "manta-pacific": os.environ.get("MANTA_RPC_URL"),
-        "x-layer": os.environ.get("XLAYER_RPC_URL"),
-        "merlin-chain": os.environ.get("MERLIN_RPC_URL"),
-        "bitlayer": os.environ.get("BITLAYER_RPC_URL"),
-        "cronos": os.environ.get("CRONOS_RPC_URL"),
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from typing import TYPE_CHECKING
+
+from my_proof import metrics
+
+if TYPE_CHECKING:
+    from web3 import Web3
+
+RPC_URL_ENV = {
+        "vana": "VANA_RPC_URL",
+        "ethereum": "ETH_RPC_URL",
+        "base": "BASE_RPC_URL",
+        "optimistic-ethereum": "OPTIMISM_RPC_URL",
+        "binance-smart-chain": "BSC_RPC_URL",
+        "polygon-pos": "POLYGON_RPC_URL",
+        "opbnb": "OPBNB_RPC_URL",
+        "zksync": "ZK_RPC_URL",
+        "mantle": "MANTLE_RPC_URL",
+        "scroll": "SCROLL_RPC_URL",
+        "arbitrum-one": "ARBITRUM_RPC_URL",
+        "avalanche": "AVALANCHE_RPC_URL",
+        "linea": "LINEA_RPC_URL",
+        "blast": "BLAST_RPC_URL",
+        "solana": "SOLANA_RPC_URL",
+        "xdai": "GNOSIS_RPC_URL",
+        "fantom": "FANTOM_RPC_URL",
+        "zklink-nova": "ZKLINK_RPC_URL",
+        "tron": "TRON_RPC_URL",
+        "kucoin-community-chain": "KCC_RPC_URL",
+        "manta-pacific": "MANTA_RPC_URL",
+        "x-layer": "XLAYER_RPC_URL",
+        "merlin-chain": "MERLIN_RPC_URL",
+        "bitlayer": "BITLAYER_RPC_URL",
+        "cronos": "CRONOS_RPC_URL",
     }
 
+RPC_URLS = {chain: os.environ.get(env_var) for chain, env_var in RPC_URL_ENV.items()}
+
 NON_EVM_CHAINS = {"solana", "tron", "zklink-nova"}
 
 def check_token_ownership(chain: str, token_address: str, wallet_address: str) -> bool:
@@ -46,14 +54,10 @@ def check_token_ownership(chain: str, token_address: str, wallet_address: str) -
     """
     if chain in NON_EVM_CHAINS:
         return 1
+
+    from web3 import Web3
     
-    rpc_url = RPC_URLS.get(chain)
-    if not rpc_url:
-        raise ValueError(f"RPC URL not found for chain: {chain}")
-    
-    w3 = Web3(Web3.HTTPProvider(rpc_url))
-    if not w3.is_connected():
-        raise ConnectionError("Failed to connect to RPC")
+    w3 = get_web3(chain)
     
     wallet_address = Web3.to_checksum_address(wallet_address)
     token_address = Web3.to_checksum_address(token_address)
@@ -74,3 +78,340 @@ def check_token_ownership(chain: str, token_address: str, wallet_address: str) -
     balance = contract.functions.balanceOf(wallet_address).call()
     
     return balance > 0
+
+
+# Multicall3 is deployed at the same address on most EVM chains
+MULTICALL3_ADDRESS = "0xca11bDE05977B3631167028862BE2a6c4b4FEF5b"
+MULTICALL3_ABI = [
+    {
+        "inputs": [
+            {
+                "components": [
+                    {"name": "target", "type": "address"},
+                    {"name": "allowFailure", "type": "bool"},
+                    {"name": "callData", "type": "bytes"}
+                ],
+                "name": "calls",
+                "type": "tuple[]"
+            }
+        ],
+        "name": "aggregate3",
+        "outputs": [
+            {
+                "components": [
+                    {"name": "success", "type": "bool"},
+                    {"name": "returnData", "type": "bytes"}
+                ],
+                "name": "returnData",
+                "type": "tuple[]"
+            }
+        ],
+        "stateMutability": "payable",
+        "type": "function"
+    }
+]
+BALANCE_OF_SELECTOR = bytes.fromhex("70a08231")
+
+DEFAULT_CHAIN_TIMEOUT = 10.0
+
+_providers = {}
+_multicall_deployed = {}
+_rpc_session = None
+_providers_lock = threading.Lock()
+
+
+def get_rpc_session():
+    """Keep-alive requests.Session shared by the raw JSON-RPC batch requests."""
+    global _rpc_session
+    import requests
+
+    with _providers_lock:
+        if _rpc_session is None:
+            _rpc_session = requests.Session()
+        return _rpc_session
+
+
+def get_chain_timeout() -> float:
+    """Per-chain deadline in seconds for ownership lookups (OWNERSHIP_CHAIN_TIMEOUT)."""
+    return float(os.environ.get("OWNERSHIP_CHAIN_TIMEOUT", DEFAULT_CHAIN_TIMEOUT))
+
+
+def refresh_rpc_urls() -> None:
+    """Re-read RPC_URLS from the environment, e.g. after a worker job changed it."""
+    RPC_URLS.update({chain: os.environ.get(env_var) for chain, env_var in RPC_URL_ENV.items()})
+
+
+def get_web3(chain: str) -> "Web3":
+    """
+    Return the Web3 client for a chain, created and connection-checked once per RPC URL.
+
+    :raises ValueError: if no RPC URL is configured for the chain
+    :raises ConnectionError: if the RPC endpoint is unreachable
+    """
+    rpc_url = RPC_URLS.get(chain)
+    if not rpc_url:
+        raise ValueError(f"RPC URL not found for chain: {chain}")
+    with _providers_lock:
+        w3 = _providers.get(rpc_url)
+    if w3 is None:
+        from web3 import Web3
+
+        w3 = Web3(Web3.HTTPProvider(rpc_url, request_kwargs={"timeout": get_chain_timeout()}))
+        if not w3.is_connected():
+            raise ConnectionError("Failed to connect to RPC")
+        with _providers_lock:
+            w3 = _providers.setdefault(rpc_url, w3)
+    return w3
+
+
+def encode_balance_of(wallet_address: str) -> bytes:
+    """ABI-encode a balanceOf(wallet_address) call."""
+    return BALANCE_OF_SELECTOR + bytes.fromhex(wallet_address[2:].lower().rjust(64, "0"))
+
+
+def decode_balance(return_data) -> int:
+    if isinstance(return_data, str):
+        return_data = bytes.fromhex(return_data[2:] if return_data.startswith("0x") else return_data)
+    return int.from_bytes(return_data[:32], "big") if len(return_data) >= 32 else 0
+
+
+def has_multicall3(chain: str, w3: "Web3") -> bool:
+    """
+    Whether Multicall3 is deployed on the chain behind `w3`, looked up once per RPC URL.
+
+    :raises Exception: whatever the eth_getCode call raises; nothing is remembered then
+    """
+    rpc_url = w3.provider.endpoint_uri
+    with _providers_lock:
+        deployed = _multicall_deployed.get(rpc_url)
+    if deployed is None:
+        # Concurrent first lookups for one URL may both call eth_getCode; they agree on the answer
+        deployed = len(w3.eth.get_code(MULTICALL3_ADDRESS)) > 0
+        with _providers_lock:
+            deployed = _multicall_deployed.setdefault(rpc_url, deployed)
+    return deployed
+
+
+def multicall_balances(w3: "Web3", token_addresses, wallet_address: str):
+    """
+    Resolve balanceOf(wallet) for every token in one Multicall3 aggregate3 call.
+
+    :return: One balance per token; None where its sub-call failed, since a failure says nothing about ownership.
+    """
+    multicall = w3.eth.contract(address=MULTICALL3_ADDRESS, abi=MULTICALL3_ABI)
+    call_data = encode_balance_of(wallet_address)
+    results = multicall.functions.aggregate3(
+        [(token_address, True, call_data) for token_address in token_addresses]
+    ).call()
+    return [decode_balance(return_data) if success else None for success, return_data in results]
+
+
+def batch_rpc_balances(w3: "Web3", token_addresses, wallet_address: str):
+    """
+    Resolve balanceOf(wallet) for every token in one JSON-RPC batch of eth_call requests.
+
+    :return: One balance per token; None where the reply is missing, carries an error
+             (e.g. rate limiting) or has no result.
+    :raises requests.HTTPError: if the endpoint answers with an HTTP error status
+    """
+    call_data = "0x" + encode_balance_of(wallet_address).hex()
+    payload = [
+        {
+            "jsonrpc": "2.0",
+            "id": i,
+            "method": "eth_call",
+            "params": [{"to": token_address, "data": call_data}, "latest"]
+        }
+        for i, token_address in enumerate(token_addresses)
+    ]
+    response = get_rpc_session().post(w3.provider.endpoint_uri, json=payload, timeout=get_chain_timeout())
+    response.raise_for_status()
+    replies = response.json()
+    if isinstance(replies, dict):
+        replies = [replies]
+    by_id = {reply.get("id"): reply for reply in replies if isinstance(reply, dict)}
+    balances = []
+    for i in range(len(token_addresses)):
+        reply = by_id.get(i)
+        if reply is None or reply.get("error") is not None or not isinstance(reply.get("result"), str):
+            balances.append(None)
+        else:
+            balances.append(decode_balance(reply["result"]))
+    return balances
+
+
+def check_tokens_ownership(tokens, wallet_address: str):
+    """
+    Batched ownership check for many tokens of one wallet.
+
+    Tokens are grouped by chain and each chain's balanceOf(wallet) calls are resolved
+    in a single Multicall3 aggregate3 call, or a single JSON-RPC batch where Multicall3
+    is not deployed. One Web3 provider is reused per chain for the whole run.
+
+    :param tokens: Iterable of (chain, token_address) pairs.
+    :param wallet_address: The wallet address to check ownership for.
+    :return: Dict mapping each (chain, token_address) pair to True if the wallet holds a
+             balance > 0, or None when the call failed or got no answer. Non-EVM chains are always True.
+    """
+    by_chain = defaultdict(list)
+    for chain, token_address in tokens:
+        by_chain[chain].append(token_address)
+
+    ownership = {}
+    for chain, token_addresses in by_chain.items():
+        ownership.update(check_chain_ownership(chain, token_addresses, wallet_address))
+    return ownership
+
+
+def check_chain_ownership(chain: str, token_addresses, wallet_address: str):
+    """Resolve ownership of `token_addresses` on a single chain; see check_tokens_ownership."""
+    token_addresses = list(dict.fromkeys(token_addresses))
+    if chain in NON_EVM_CHAINS:
+        return {(chain, token_address): True for token_address in token_addresses}
+
+    from web3 import Web3
+
+    w3 = get_web3(chain)
+    wallet = Web3.to_checksum_address(wallet_address)
+    checksummed = [Web3.to_checksum_address(token_address) for token_address in token_addresses]
+
+    balances = None
+    try:
+        if has_multicall3(chain, w3):
+            balances = multicall_balances(w3, checksummed, wallet)
+    except Exception as e:
+        logging.warning(f"Multicall3 failed on {chain}, using JSON-RPC batch: {e}")
+    if balances is None:
+        balances = batch_rpc_balances(w3, checksummed, wallet)
+
+    return {
+        (chain, token_address): balance > 0 if balance is not None else None
+        for token_address, balance in zip(token_addresses, balances)
+    }
+
+
+def current_block_numbers(chains, timeout: float = None):
+    """
+    Latest block number per EVM chain, fetched in parallel; None where unavailable.
+
+    :param timeout: Seconds to wait for all chains, defaults to OWNERSHIP_CHAIN_TIMEOUT.
+                    Chains that have not answered by then are None.
+    """
+    def block_number(chain):
+        if chain in NON_EVM_CHAINS:
+            return None
+        try:
+            return get_web3(chain).eth.block_number
+        except Exception as e:
+            logging.warning(f"Could not read block number on {chain}: {e}")
+            return None
+
+    chains = list(chains)
+    if not chains:
+        return {}
+    timeout = get_chain_timeout() if timeout is None else timeout
+    executor = ThreadPoolExecutor(max_workers=len(chains), thread_name_prefix="block-number")
+    try:
+        futures = {chain: executor.submit(block_number, chain) for chain in chains}
+        done, _ = wait(futures.values(), timeout=timeout)
+    finally:
+        # A slow RPC is abandoned rather than waited for
+        executor.shutdown(wait=False, cancel_futures=True)
+    return {chain: future.result() if future in done else None for chain, future in futures.items()}
+
+
+def resolve_ownership(tokens, wallet_address: str, timeout: float = None, cache=None):
+    """
+    Check ownership on all chains in parallel, each chain under its own deadline.
+
+    A chain that misses its deadline or fails (unreachable RPC, missing RPC URL)
+    does not abort the run; its tokens are reported as unverified (None), as are
+    tokens whose own call failed or got no answer.
+    With an OwnershipCache, all cached results are prefetched in bulk first and
+    only the misses reach the RPCs; only verified results are written back.
+
+    :param tokens: Iterable of (chain, token_address) pairs.
+    :param wallet_address: The wallet address to check ownership for.
+    :param timeout: Per-chain deadline in seconds, defaults to OWNERSHIP_CHAIN_TIMEOUT.
+    :param cache: Optional OwnershipCache.
+    :return: (ownership, chain_stats) where ownership maps each (chain, token_address)
+             to True, False or None (unverified) and chain_stats maps each chain to
+             its latency in milliseconds and status ("ok", "cached", "timeout" or "error",
+             or "partial" when only some of its tokens were verified).
+    """
+    timeout = get_chain_timeout() if timeout is None else timeout
+    # Block number lookups count against the same per-chain deadline as the checks
+    started = time.perf_counter()
+    tokens = list(dict.fromkeys(tokens))
+    ownership = {}
+    chain_stats = {}
+
+    current_blocks = {}
+    if cache is not None and tokens:
+        if cache.max_blocks is not None:
+            current_blocks = current_block_numbers({chain for chain, _ in tokens}, timeout)
+        cached = cache.get_many([(chain, token_address, wallet_address) for chain, token_address in tokens], current_blocks)
+        ownership.update({(chain, token_address): owned for (chain, token_address, _), owned in cached.items()})
+        for chain, _ in ownership:
+            chain_stats[chain] = {"latency_ms": 0.0, "status": "cached"}
+        metrics.incr("ownership_cache_hits", len(cached))
+        metrics.incr("ownership_cache_misses", len(tokens) - len(cached))
+
+    by_chain = defaultdict(list)
+    for chain, token_address in tokens:
+        if (chain, token_address) not in ownership:
+            by_chain[chain].append(token_address)
+    if not by_chain:
+        return ownership, chain_stats
+
+    def timed_check(chain, token_addresses):
+        start = time.perf_counter()
+        try:
+            with metrics.span("ownership_rpc", chain=chain):
+                result = check_chain_ownership(chain, token_addresses, wallet_address)
+            return result, time.perf_counter() - start, None
+        except Exception as e:
+            return None, time.perf_counter() - start, e
+
+    verified = {}
+    executor = ThreadPoolExecutor(max_workers=len(by_chain), thread_name_prefix="ownership")
+    futures = {chain: executor.submit(timed_check, chain, token_addresses) for chain, token_addresses in by_chain.items()}
+    try:
+        for chain, future in futures.items():
+            # All chains started together, so each one's deadline is measured from the common start
+            remaining = max(0.0, started + timeout - time.perf_counter())
+            try:
+                result, elapsed, error = future.result(timeout=remaining)
+            except FutureTimeoutError:
+                logging.warning(f"Ownership check on {chain} missed its {timeout}s deadline")
+                result, elapsed, error = None, time.perf_counter() - started, None
+
+            if result is not None:
+                unverified = [key for key, owned in result.items() if owned is None]
+                if not unverified:
+                    status = "ok"
+                elif len(unverified) < len(result):
+                    status = "partial"
+                else:
+                    status = "error"
+                if unverified:
+                    logging.warning(f"Ownership of {len(unverified)} tokens on {chain} could not be verified")
+                verified.update({key: owned for key, owned in result.items() if owned is not None})
+                ownership.update({key: None for key in unverified})
+            else:
+                status = "timeout" if error is None else "error"
+                if error is not None:
+                    logging.warning(f"Ownership check on {chain} failed: {error}")
+                ownership.update({(chain, token_address): None for token_address in by_chain[chain]})
+            chain_stats[chain] = {"latency_ms": round(elapsed * 1000, 1), "status": status}
+            metrics.incr(f"ownership_chains_{status}")
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    ownership.update(verified)
+    if cache is not None and verified:
+        cache.put_many(
+            {(chain, token_address, wallet_address): owned for (chain, token_address), owned in verified.items()},
+            current_blocks,
+        )
+    return ownership, chain_stats
@@ -1,6 +1,11 @@
 from base64 import b64decode
 import json
 import logging
+import os
+import sys
+
+from my_proof.metrics import incr
+from my_proof.token_index import index_history
 
 # Check for Quality
 # Since Risk Factor follows reverse scoring pattern while taking input from UI
@@ -33,33 +38,84 @@ def validate_token_metrics(metrics):
     
     if metrics["volatility24h"] > 100:
         errors.append("Volatility is unrealistically high (>100%).")
-    
-    print(f"print the error", errors)
 
+    if errors:
+        logging.debug(f"Token metrics failed authenticity checks: {errors}")
     return 0.0 if errors else 1.0
 
-def calculate_individual_proofs(unique_tokens, combined_tokens):
+VALID_CHAINS = {
+    "ethereum", "optimistic-ethereum", "cronos", "binance-smart-chain", "xdai", 
+    "polygon-pos", "manta-pacific", "x-layer", "opbnb", "fantom", 
+    "kucoin-community-chain", "zksync", "merlin-chain", "mantle", "base", 
+    "arbitrum-one", "avalanche", "linea", "blast", "bitlayer", 
+    "scroll", "zklink-nova", "tron", "vana", "solana"
+}
+
+VALID_ATTRIBUTES = {
+    "momentum-surge", "high-liquidity", "utility-driven", "backed-by-major-investors",
+    "community-powered", "verified-contracts", "disruptive-tech", "major-integrations",
+    "limited-supply"
+}
+
+VALID_CATEGORIES = {
+    "Meme Coins", "Web3 Gaming", "Blue Chip DeFi", "AI Agent", "Layer 1", 
+    "Layer 2 / Layer 3", "RWA (Real World Assets)", "Decentralized AI", 
+    "Decentralized Finance", "DePIN", "Liquid Staking & Restaking", 
+    "Blockchain Service Infra"
+}
+
+DEFAULT_COLUMNAR_MIN_TOKENS = 1000
+# Importing NumPy costs ~140 ms, which the columnar path only wins back at this size
+DEFAULT_COLUMNAR_COLD_MIN_TOKENS = 50000
+
+
+def get_scoring_engine() -> str:
+    """SCORING_ENGINE: "auto" (default), "columnar" or "python"."""
+    return os.environ.get("SCORING_ENGINE", "auto").lower()
+
+
+def use_columnar(token_count: int) -> bool:
+    """
+    Whether final_scores takes the NumPy path for `token_count` tokens.
+
+    In "auto" mode it does once NumPy is loaded (e.g. in a long-lived worker) and
+    the submission has SCORING_COLUMNAR_MIN_TOKENS tokens (default 1000); a cold
+    process only pays for the NumPy import from SCORING_COLUMNAR_COLD_MIN_TOKENS
+    (default 50000).
+    """
+    engine = get_scoring_engine()
+    if engine == "python":
+        return False
+    if engine == "columnar":
+        return True
+    if "numpy" in sys.modules:
+        return token_count >= int(os.environ.get("SCORING_COLUMNAR_MIN_TOKENS", DEFAULT_COLUMNAR_MIN_TOKENS))
+    return token_count >= int(os.environ.get("SCORING_COLUMNAR_COLD_MIN_TOKENS", DEFAULT_COLUMNAR_COLD_MIN_TOKENS))
+
+
+def text_uniqueness(uniqueness, similarity):
+    """Uniqueness of a token whose texts are `similarity`-similar to another contributor's (None if not)."""
+    return uniqueness if similarity is None else uniqueness * (1.0 - similarity)
+
+
+def calculate_individual_proofs(unique_tokens, combined_tokens, text_similarity=None, market_mismatches=None):
+    """
+    Score each submitted token.
+
+    `combined_tokens` is the contributor's history, either as a prebuilt
+    TokenKeyIndex or as a list of submission documents / token entries.
+    `text_similarity` maps (chain, contract) to the similarity of the token's
+    texts to another contributor's, for tokens flagged as near-duplicates.
+    `market_mismatches` holds the (chain, contract) pairs whose metrics contradict
+    the market reference snapshot; they fail authenticity.
+    """
     results = []
-    valid_chains = {
-        "ethereum", "optimistic-ethereum", "cronos", "binance-smart-chain", "xdai", 
-        "polygon-pos", "manta-pacific", "x-layer", "opbnb", "fantom", 
-        "kucoin-community-chain", "zksync", "merlin-chain", "mantle", "base", 
-        "arbitrum-one", "avalanche", "linea", "blast", "bitlayer", 
-        "scroll", "zklink-nova", "tron", "vana", "solana"
-    }
-    
-    valid_attributes = {
-        "momentum-surge", "high-liquidity", "utility-driven", "backed-by-major-investors",
-        "community-powered", "verified-contracts", "disruptive-tech", "major-integrations",
-        "limited-supply"
-    }
-    
-    valid_categories = {
-        "Meme Coins", "Web3 Gaming", "Blue Chip DeFi", "AI Agent", "Layer 1", 
-        "Layer 2 / Layer 3", "RWA (Real World Assets)", "Decentralized AI", 
-        "Decentralized Finance", "DePIN", "Liquid Staking & Restaking", 
-        "Blockchain Service Infra"
-    }
+    history_index = index_history(combined_tokens)
+    text_similarity = text_similarity or {}
+    market_mismatches = market_mismatches or {}
+    valid_chains = VALID_CHAINS
+    valid_attributes = VALID_ATTRIBUTES
+    valid_categories = VALID_CATEGORIES
     
     for token in unique_tokens:
         token_metadata = token.get("token_metadata", {})
@@ -68,12 +124,14 @@ def calculate_individual_proofs(unique_tokens, combined_tokens):
         metrics = token_metadata.get("metrics", {})
         
         if data_chain not in valid_chains:
-            print(f"Skipping token {data_contract}: Invalid chain {data_chain}")
+            logging.debug(f"Skipping token {data_contract}: Invalid chain {data_chain}")
+            incr("tokens_skipped_chain")
             continue
         
         token_category = token.get("tokenCategory", "")
         if token_category not in valid_categories:
-            print(f"Skipping token {data_contract}: Invalid category {token_category}")
+            logging.debug(f"Skipping token {data_contract}: Invalid category {token_category}")
+            incr("tokens_skipped_category")
             continue
         
         suggestion_attributes = set(token.get("suggestionAttributes", []))
@@ -81,18 +139,16 @@ def calculate_individual_proofs(unique_tokens, combined_tokens):
         has_valid_attributes = bool(suggestion_attributes & valid_attributes or recommendation_attributes & valid_attributes)
         
         individual_authenticity = validate_token_metrics(metrics) if has_valid_attributes else 0
+        if individual_authenticity and (data_chain, data_contract) in market_mismatches:
+            individual_authenticity = 0.0
         
         risk_score = metrics.get("riskScore", 0)
         individual_quality = get_risk_status_and_quality(risk_score)
         individual_quality *= individual_authenticity  # Ensure quality is zero if authenticity is zero
 
         # Calculate uniqueness: Check if the token exists in the combined set
-        is_unique = not any(
-            data_chain == existing_token["token_metadata"]["chain"] and
-            data_contract == existing_token["token_metadata"]["contract"]
-            for existing_token in combined_tokens
-        )
-        individual_uniqueness = 1.0 if is_unique else 0.0
+        is_unique = not history_index.contains(data_chain, data_contract)
+        individual_uniqueness = text_uniqueness(1.0 if is_unique else 0.0, text_similarity.get((data_chain, data_contract)))
         
         results.append({
             "token_submitted": data_contract,
@@ -104,13 +160,149 @@ def calculate_individual_proofs(unique_tokens, combined_tokens):
     
     return results
 
-def final_scores(unique_tokens, combined_tokens):
-    """Calculate the average authenticity and quality scores."""
-    results = calculate_individual_proofs(unique_tokens, combined_tokens)
+def _numeric_column(np, values):
+    """float64 column of `values`, or None if any value is missing or not a number."""
+    try:
+        column = np.array(values)
+    except (TypeError, ValueError):
+        return None
+    if column.ndim != 1 or column.dtype.kind not in "biuf":
+        return None
+    return column.astype(np.float64, copy=False)
+
+
+def _numeric_column_where(np, values, mask):
+    """Like _numeric_column, but only the values where `mask` is set have to be numbers."""
+    column = _numeric_column(np, values)
+    if column is None:
+        selected = _numeric_column(np, [value for value, needed in zip(values, mask.tolist()) if needed])
+        if selected is None:
+            return None
+        column = np.zeros(len(values), dtype=np.float64)
+        column[mask] = selected
+    return column
+
+
+def calculate_columnar_proofs(unique_tokens, combined_tokens, text_similarity=None, market_mismatches=None):
+    """
+    Columnar variant of calculate_individual_proofs, plus the averages of final_scores.
+
+    One pass over the tokens applies the chain/category/attribute filters and
+    collects the metrics into columns; the market cap and volatility checks, the
+    risk-to-quality binning and the averages then run as float64 array operations.
+    The results are identical to the per-token path, value for value and type for type.
+
+    :return: (results, (authenticity_avg, quality_avg, uniqueness_avg)), or None when
+             a metric the checks read is missing or not a number; the per-token path
+             then scores the submission, with its exact behaviour for such input.
+    """
+    import numpy as np
+
+    history_index = index_history(combined_tokens)
+    kept, checked, risk, supply, volatility, price, market_cap = [], [], [], [], [], [], []
+    for token in unique_tokens:
+        token_metadata = token.get("token_metadata", {})
+        data_chain = token_metadata.get("chain", "").lower()
+        data_contract = token_metadata.get("contract", "")
+        if data_chain not in VALID_CHAINS:
+            logging.debug(f"Skipping token {data_contract}: Invalid chain {data_chain}")
+            incr("tokens_skipped_chain")
+            continue
+        token_category = token.get("tokenCategory", "")
+        if token_category not in VALID_CATEGORIES:
+            logging.debug(f"Skipping token {data_contract}: Invalid category {token_category}")
+            incr("tokens_skipped_category")
+            continue
+
+        token_metrics = token_metadata.get("metrics", {})
+        # isdisjoint() tests the overlap without building a set per token
+        has_valid_attributes = not (
+            VALID_ATTRIBUTES.isdisjoint(token.get("suggestionAttributes", []))
+            and VALID_ATTRIBUTES.isdisjoint(token.get("recommendationAttributes", []))
+        )
+        kept.append((data_chain, data_contract))
+        checked.append(has_valid_attributes)
+        risk.append(token_metrics.get("riskScore", 0))
+        if has_valid_attributes:
+            supply.append(token_metrics.get("circulatingSupply"))
+            volatility.append(token_metrics.get("volatility24h"))
+            price.append(token_metrics.get("price"))
+            market_cap.append(token_metrics.get("marketCap"))
+
+    if not kept:
+        return [], (0, 0, 0)
+
+    risk = _numeric_column(np, risk)
+    supply = _numeric_column(np, supply)
+    volatility = _numeric_column(np, volatility)
+    if risk is None or supply is None or volatility is None:
+        return None
+    # price and marketCap are only read where circulatingSupply > 0
+    has_supply = supply > 0
+    price = _numeric_column_where(np, price, has_supply)
+    market_cap = _numeric_column_where(np, market_cap, has_supply)
+    if price is None or market_cap is None:
+        return None
+
+    checked = np.array(checked, dtype=bool)
+    with np.errstate(all="ignore"):
+        expected_market_cap = price * supply
+        cap_error = has_supply & (np.abs(expected_market_cap - market_cap) > 0.05 * expected_market_cap)
+        authenticity = np.zeros(len(kept), dtype=np.float64)
+        authenticity[checked] = np.where(cap_error | (volatility > 100), 0.0, 1.0)
+        if market_mismatches:
+            authenticity[np.array([key in market_mismatches for key in kept], dtype=bool)] = 0.0
+        quality = np.select([risk <= 2, risk <= 4, risk <= 7], [0.75, 0.85, 0.95], 1.0) * authenticity
+
+    # Unchecked tokens score the int 0, as on the per-token path
+    authenticity_values = [value if is_checked else 0 for value, is_checked in zip(authenticity.tolist(), checked.tolist())]
+    quality_values = quality.tolist()
+    uniqueness_values = [0.0 if seen else 1.0 for seen in history_index.contains_many(kept)]
+    if text_similarity:
+        uniqueness_values = [
+            text_uniqueness(value, text_similarity.get(key)) for key, value in zip(kept, uniqueness_values)
+        ]
+
+    results = [
+        {
+            "token_submitted": data_contract,
+            "chain": data_chain,
+            "authenticity": authenticity_value,
+            "quality": quality_value,
+            "uniqueness": uniqueness_value
+        }
+        for (data_chain, data_contract), authenticity_value, quality_value, uniqueness_value
+        in zip(kept, authenticity_values, quality_values, uniqueness_values)
+    ]
+    # sum() over the Python values keeps the per-token path's summation order and rounding
+    count = len(results)
+    averages = (sum(authenticity_values) / count, sum(quality_values) / count, sum(uniqueness_values) / count)
+    return results, averages
+
+
+def final_scores(unique_tokens, combined_tokens, text_similarity=None, market_mismatches=None):
+    """
+    Calculate the average authenticity and quality scores.
+
+    :param text_similarity: Near-duplicate similarities from find_near_duplicates, lowering those tokens' uniqueness.
+    :param market_mismatches: Tokens contradicting the market reference, from find_market_mismatches.
+    """
+    columnar = (
+        calculate_columnar_proofs(unique_tokens, combined_tokens, text_similarity, market_mismatches)
+        if use_columnar(len(unique_tokens)) else None
+    )
+    if columnar is not None:
+        results, (authenticity_avg, quality_avg, uniqueness_avg) = columnar
+        if not results:
+            return 0, 0, 0, []
+        logging.info(f"authenticity_avg: {authenticity_avg}, quality_avg: {quality_avg}, uniqueness_avg:, {uniqueness_avg},results, {results[0]}")
+        return authenticity_avg, quality_avg, uniqueness_avg, results
+
+    results = calculate_individual_proofs(unique_tokens, combined_tokens, text_similarity, market_mismatches)
     # unique_token_count = len(unique_tokens)
     
     if not results:
-        return 0, 0
+        return 0, 0, 0, []
 
     quality_avg = sum(result["quality"] for result in results) / len(results)
     authenticity_avg = sum(result["authenticity"] for result in results) / len(results)
@@ -121,13 +313,13 @@ def final_scores(unique_tokens, combined_tokens):
 # Execute the script independently for testing
 if __name__ == "__main__":
     # Assuming we have some example unique tokens
-    with open("../demo/input/tokenInput.json", "r") as file:
+    demo_input = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo", "input", "tokenInput.json")
+    with open(sys.argv[1] if len(sys.argv) > 1 else demo_input, "r") as file:
         data = json.load(file)
     
     unique_tokens = data.get("tokens", []) 
-    results = calculate_individual_proofs( unique_tokens,[])
-    authenticity, quality = final_scores(unique_tokens)
-    print(f"authenticity, quality", authenticity, quality)
+    authenticity, quality, uniqueness, results = final_scores(unique_tokens, [])
+    print("authenticity, quality, uniqueness", authenticity, quality, uniqueness)
 
     # Output the results
     for result in results:
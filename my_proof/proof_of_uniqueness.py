@@ -1,27 +1,43 @@
 import os
-import bs4
-import jinja2
-import redis
-import requests
-import gnupg
-import zipfile
-import io
-import pandas as pd
 import json
 import logging
-import yaml
-from deepdiff import DeepDiff  # Ensure deepdiff is installed
-from jwt import encode as jwt_encode
-from datetime import datetime, timedelta, timezone
+import time
 
-# Initialize Redis connection
+from my_proof import metrics
+from my_proof.blob_cache import get_blob_cache
+from my_proof.file_mappings import (
+    FileMappingsError, fetch_file_mappings, iter_file_mapping_pages, prefetched
+)
+from my_proof.global_index import get_global_index
+from my_proof.history_fetch import fetch_history_files
+from my_proof.submission_cache import read_cached_submissions, write_cached_submissions
+from my_proof.token_index import TokenKeyIndex
+from my_proof.wallet_digest import digest_enabled, load_digest, save_digest
+
+DEFAULT_REDIS_RETRY_INTERVAL = 30  # seconds
+
+_redis_clients = {}
+# When each unreachable Redis last failed to connect, so callers do not wait on it again
+_redis_failures = {}
+
+# Initialize Redis connection, reused for the life of the process
 def get_redis_client():
+    import redis
+
     try:
         redis_host = os.environ.get('REDIS_HOST', 'localhost')
         redis_port = int(os.environ.get('REDIS_PORT', 6379))
         redis_username = os.environ.get('REDIS_USERNAME', '')
         redis_password = os.environ.get('REDIS_PWD', 'password')
-        
+
+        client_key = (redis_host, redis_port, redis_username, redis_password)
+        if client_key in _redis_clients:
+            return _redis_clients[client_key]
+        retry_interval = float(os.environ.get('REDIS_RETRY_INTERVAL', DEFAULT_REDIS_RETRY_INTERVAL))
+        failed_at = _redis_failures.get(client_key)
+        if failed_at is not None and time.monotonic() - failed_at < retry_interval:
+            return None
+
         redis_client = redis.StrictRedis(
             host=redis_host,
             port=redis_port,
@@ -33,162 +49,86 @@ def get_redis_client():
             retry_on_timeout=True
         )
         redis_client.ping()
+        _redis_clients[client_key] = redis_client
+        _redis_failures.pop(client_key, None)
         return redis_client
     except redis.ConnectionError:
         logging.warning("Redis connection failed. Proceeding without caching.")
+        _redis_failures[client_key] = time.monotonic()
         return None
 
 # Fetch file mappings from API
-def generate_jwt_token(wallet_address: str, secret_key: str, expiration_time: int) -> str:
-    """Generate a JWT token for a given wallet address."""
-    exp = datetime.now(timezone.utc) + timedelta(seconds=expiration_time)
+def get_file_mappings(wallet_address: str, after=None):
+    """
+    Fetch file mappings for a given wallet address with JWT authentication.
 
-    payload = {
-        'exp': exp,
-        'walletAddress': wallet_address  # Send wallet address in the payload
-    }
-    
-    # Encode the JWT
-    token = jwt_encode(payload, secret_key, algorithm='HS256')
-    return token
-
-def get_file_mappings(wallet_address: str):
-    """Fetch file mappings for a given wallet address with JWT authentication."""
-    validator_base_api_url = os.environ.get('VALIDATOR_BASE_API_URL')
-    secret_key = os.environ.get('JWT_SECRET_KEY')  # Retrieve the secret key from environment variables
-    expiration_time = int(os.environ.get('JWT_EXPIRATION_TIME', 600))  # JWT expiration time in seconds (10 minutes)
+    :param after: Only list mappings whose fileId is above this watermark.
+    :raises FileMappingsError: if the validator API cannot list them
+    """
+    return fetch_file_mappings(wallet_address, after)
+    # return [{"fileId":1615127, "fileUrl":"https://drive.google.com/uc?export=download&id=1DX-e7gzJHQ_j_EJWUeBUdhYgwxmKf2oF"}
+    #         ,{"fileId":1615146, "fileUrl":"https://drive.google.com/uc?export=download&id=1qm0gQ3w462qZYdTrDH4bU8wuH8Qs9dVq"}
+    #         ]
 
-    if not validator_base_api_url or not secret_key:
-        raise ValueError("VALIDATOR_BASE_API_URL and JWT_SECRET_KEY must be set in environment variables.")
+def load_history(redis_client, file_mappings, gpg_signature, max_workers=None, blob_cache=None):
+    """
+    Load the historical submissions named by `file_mappings` into a TokenKeyIndex.
 
-    jwt_token = generate_jwt_token(wallet_address, secret_key, expiration_time)
+    Each file's documents are folded into the index and released as soon as
+    they are indexed, so only the compact keys outlive this call.
 
-    endpoint = "/api/userinfo"
-    url = f"{validator_base_api_url.rstrip('/')}{endpoint}"
+    :return: (history_index, cache_stats, loaded_file_ids) where loaded_file_ids lists
+             the fileIds that were read from the cache or downloaded successfully, and
+             cache_stats["failed"] counts the files that could not be loaded.
+    """
+    # Resolve all cached submissions in one pipelined read; only misses go to the fetch stage
+    with metrics.span("history_cache_read"):
+        cached_json_data, misses, cache_stats = read_cached_submissions(redis_client, file_mappings)
+    metrics.incr("history_cache_hits", cache_stats["hits"])
+    metrics.incr("history_cache_misses", cache_stats["misses"])
 
-    payload = {"walletAddress": wallet_address}  # Send walletAddress in the body
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {jwt_token}"  # Attach JWT token
-    }
+    downloads = []
+    for file_info in misses:
+        if not file_info.get("fileUrl"):
+            logging.warning(f"Skipping invalid fileUrl for fileId {file_info.get('fileId')}")
+            continue
+        downloads.append(file_info)
 
-    response = requests.post(url, json=payload, headers=headers)  # Make POST request
+    with metrics.span("history_fetch"):
+        fetched = fetch_history_files(downloads, gpg_signature, max_workers, blob_cache)
+    cache_stats["written"] = write_cached_submissions(redis_client, zip(downloads, fetched))
 
-    if response.status_code == 200:
-        return response.json()  # Return JSON response
-    else:
-        return []  # Return empty list in case of an error
-    # return [{"fileId":1615127, "fileUrl":"https://drive.google.com/uc?export=download&id=1DX-e7gzJHQ_j_EJWUeBUdhYgwxmKf2oF"}
-    #         ,{"fileId":1615146, "fileUrl":"https://drive.google.com/uc?export=download&id=1qm0gQ3w462qZYdTrDH4bU8wuH8Qs9dVq"}
-    #         ]
+    cache_stats["failed"] = len(misses) - len(downloads) + sum(json_data_list is None for json_data_list in fetched)
+    fetched_json_data = {id(file_info): json_data_list for file_info, json_data_list in zip(downloads, fetched)}
+    del fetched
 
-# Download and decrypt file
-def download_and_decrypt(file_url, gpg_signature):
-    response = requests.get(file_url)
-    if response.status_code == 200:
-        gpg = gnupg.GPG()
-        decrypted_data = gpg.decrypt(response.content, passphrase=gpg_signature)
-        if decrypted_data.ok:
-            return decrypted_data.data
+    history_index = TokenKeyIndex()
+    loaded_file_ids = []
+    for file_info in file_mappings:
+        if id(file_info) in fetched_json_data:
+            json_data_list = fetched_json_data.pop(id(file_info))
         else:
-            logging.error("Decryption failed.")
-            return None
-    else:
-        logging.error(f"Failed to download file: {response.status_code}")
-        return None
+            json_data_list = cached_json_data.pop(file_info.get("fileId"), None)
+        if json_data_list is None:
+            # Skipped, or the download failed
+            continue
+        history_index.add_documents(json_data_list)
+        loaded_file_ids.append(file_info.get("fileId"))
 
-# Extract files from ZIP data
-def extract_files_from_zip(zip_data):
-    json_data_list = []
-
-    # Check if the data is a zip file by inspecting the header
-    if zip_data[:2] == b'PK':  # Check for the "PK" header of ZIP files
-        with zipfile.ZipFile(io.BytesIO(zip_data), 'r') as zip_ref:
-            for file_name in zip_ref.namelist():
-                with zip_ref.open(file_name) as file:
-                    content = file.read().decode("utf-8")
-                    
-                    if file_name.endswith('.json'):
-                        json_data = json.loads(content)
-                        json_data_list.append(json_data)
-    else:
-        # If it's not a ZIP, assume it's a JSON file directly
-        content = zip_data.decode("utf-8")
-        json_data = json.loads(content)
-        json_data_list.append(json_data)
-    
-    return json_data_list
-
-def process_json_files(redis_client, file_mappings, gpg_signature, input_dir):
-    combined_json_data = []
-
-    if redis_client:
-        for file_info in file_mappings:
-            file_id = file_info.get("fileId")
-            if redis_client.exists(file_id):
-                stored_json_data = redis_client.hget(file_id, "submission_data")
-                if stored_json_data:
-                    json_data = json.loads(stored_json_data)
-                    combined_json_data.extend(json_data)
-                else:
-                    file_url = file_info.get("fileUrl")
-                    if not file_url:
-                        logging.warning(f"Skipping invalid fileUrl for fileId {file_id}")
-                        continue
-
-                    decrypted_data = download_and_decrypt(file_url, gpg_signature)
-                    if decrypted_data:
-                        json_data_list = extract_files_from_zip(decrypted_data)
-                        if json_data_list:
-                            combined_json_data.extend(json_data_list)
-            else:
-                file_url = file_info.get("fileUrl")
-                if not file_url:
-                    logging.warning(f"Skipping invalid fileUrl for fileId {file_id}")
-                    continue
-                decrypted_data = download_and_decrypt(file_url, gpg_signature)
-                if decrypted_data:
-                    json_data_list = extract_files_from_zip(decrypted_data)
-                    if json_data_list:
-                        combined_json_data.extend(json_data_list)
-    else:
-        for file_info in file_mappings:
-            file_url = file_info.get("fileUrl")
-            if not file_url:
-                logging.warning(f"Skipping invalid fileUrl for fileId {file_info.get('fileId')}")
-                continue
-            decrypted_data = download_and_decrypt(file_url, gpg_signature)
-            if decrypted_data:
-                json_data_list = extract_files_from_zip(decrypted_data)
-                if json_data_list:
-                    combined_json_data.extend(json_data_list)
+    return history_index, cache_stats, loaded_file_ids
 
-    curr_file_json_data = []
-    local_json_files = [f for f in os.listdir(input_dir) if f.endswith('.json')]
-    for json_file in local_json_files:
-        file_path = os.path.join(input_dir, json_file)
-        with open(file_path, 'r') as file:
-            json_data = json.load(file)
-            curr_file_json_data.append(json_data)
-        with open(file_path, 'w') as file:
-            json.dump(json_data, file, indent=4)
-
-    print("JSON files processed and formatted successfully.")
-
-    # Flatten the list of tokens for comparison
-    curr_file_tokens = [token for entry in curr_file_json_data for token in entry["tokens"]]
-    combined_tokens = [token for entry in combined_json_data for token in entry.get("tokens", [])]
-
-    # Calculate uniqueness by comparing current file tokens against combined (old) tokens
-    unique_tokens = []
-    for token in curr_file_tokens:
-        # Check if the token exists in the combined data with the exact same 'reason'
-        if not any(
-            token["token_metadata"]["chain"] == existing_token["token_metadata"]["chain"] and
-            token["token_metadata"]["contract"] == existing_token["token_metadata"]["contract"]
-            for existing_token in combined_tokens
-        ):
-            unique_tokens.append(token)
+
+def score_uniqueness(curr_file_json_data, history_index):
+    """
+    Compare the current submission's tokens against the history index.
+
+    :return: (json_uniqueness_score, unique_tokens)
+    """
+    with metrics.span("uniqueness"):
+        curr_file_tokens = [token for entry in curr_file_json_data for token in entry["tokens"]]
+
+        # Calculate uniqueness by looking up current file tokens in the combined (old) tokens
+        unique_tokens = [token for token in curr_file_tokens if token not in history_index]
 
     # Calculate total and unique entries
     total_json_entries = len(curr_file_tokens)
@@ -197,10 +137,46 @@ def process_json_files(redis_client, file_mappings, gpg_signature, input_dir):
     # Uniqueness score calculation
     json_uniqueness_score = unique_json_entries / total_json_entries if total_json_entries > 0 else 0.0
 
-    print(f"Uniqueness Score: {json_uniqueness_score}, {unique_json_entries} unique tokens out of {total_json_entries} total tokens.")
-    print(f"Unique Tokens: {unique_tokens}")
+    metrics.incr("tokens_scored", total_json_entries)
+    metrics.incr("unique_tokens", unique_json_entries)
+    logging.info(f"Uniqueness Score: {json_uniqueness_score}, {unique_json_entries} unique tokens out of {total_json_entries} total tokens.")
+
+    return json_uniqueness_score, unique_tokens
+
+
+def score_global_uniqueness(curr_file_json_data):
+    """
+    Share of the current submission's tokens that no wallet in the DLP has submitted before.
+
+    :return: The score, or None when no global index is configured (GLOBAL_INDEX_PATH).
+    """
+    global_index = get_global_index()
+    if global_index is None:
+        return None
+    with metrics.span("global_uniqueness"):
+        curr_file_tokens = [token.get("token_metadata") or {} for entry in curr_file_json_data for token in entry["tokens"]]
+        seen = sum(
+            1 for token_metadata in curr_file_tokens
+            if global_index.contains(token_metadata.get("chain"), token_metadata.get("contract"))
+        )
+    metrics.incr("globally_seen_tokens", seen)
+    return (len(curr_file_tokens) - seen) / len(curr_file_tokens) if curr_file_tokens else 0.0
+
+
+def process_json_files(redis_client, file_mappings, gpg_signature, input_dir, max_workers=None):
+    history_index, cache_stats, _ = load_history(redis_client, file_mappings, gpg_signature, max_workers, get_blob_cache())
+
+    curr_file_json_data = []
+    local_json_files = [f for f in os.listdir(input_dir) if f.endswith('.json')]
+    for json_file in local_json_files:
+        file_path = os.path.join(input_dir, json_file)
+        with open(file_path, 'r') as file:
+            curr_file_json_data.append(json.load(file))
+
+    json_uniqueness_score, unique_tokens = score_uniqueness(curr_file_json_data, history_index)
+    global_uniqueness_score = score_global_uniqueness(curr_file_json_data)
 
-    return combined_json_data, curr_file_json_data, json_uniqueness_score, unique_tokens
+    return curr_file_json_data, json_uniqueness_score, unique_tokens, history_index, cache_stats, global_uniqueness_score
 
 
 def uniqueness_details(wallet_address, input_dir):
@@ -209,25 +185,186 @@ def uniqueness_details(wallet_address, input_dir):
     redis_client = get_redis_client()
     file_mappings = get_file_mappings(wallet_address)
     
-    combined_json_data, curr_file_json_data, json_uniqueness_score, unique_json_entries = process_json_files(redis_client, file_mappings, gpg_signature, input_dir)
+    curr_file_json_data, json_uniqueness_score, unique_json_entries, history_index, cache_stats, global_uniqueness_score = process_json_files(redis_client, file_mappings, gpg_signature, input_dir)
     
     return {
         "unique_json_data": unique_json_entries,
-        "old_files_json_data": combined_json_data,
         "curr_file_json_data": curr_file_json_data,
-        "uniqueness_score": json_uniqueness_score
+        "uniqueness_score": json_uniqueness_score,
+        "global_uniqueness_score": global_uniqueness_score,
+        "history_index": history_index,
+        "cache_stats": cache_stats
+    }
+
+class HistoryListing:
+    """A wallet's history files: those already in its digest, and the mappings listed above its watermark."""
+
+    def __init__(self, digest, file_mappings, error: FileMappingsError = None):
+        self.digest = digest
+        self.file_mappings = file_mappings
+        self.error = error
+
+    @property
+    def file_ids(self):
+        """Every historical fileId the proof is scored against."""
+        file_ids = set(self.digest.file_ids) if self.digest is not None else set()
+        file_ids.update(str(file_info.get("fileId")) for file_info in self.file_mappings)
+        return file_ids
+
+
+def _wallet_digest(wallet_address, sealed_dir):
+    if not sealed_dir or not digest_enabled():
+        return None
+    with metrics.span("wallet_digest_load"):
+        return load_digest(sealed_dir, wallet_address)
+
+
+def list_history(wallet_address, sealed_dir=None) -> HistoryListing:
+    """
+    List a wallet's history without downloading it: the mappings above its digest's watermark, in full.
+
+    A failed listing is returned in `error` rather than raised.
+    """
+    digest = _wallet_digest(wallet_address, sealed_dir)
+    try:
+        file_mappings = get_file_mappings(wallet_address, digest.watermark if digest is not None else None)
+    except FileMappingsError as e:
+        logging.error(f"Could not list the history of {wallet_address}: {e}")
+        return HistoryListing(digest, [], e)
+    return HistoryListing(digest, file_mappings)
+
+
+def history_status(listing_failed: bool, has_history: bool, failed_files: int = 0) -> str:
+    """
+    How far a proof's history can be trusted, reported as the `history_status` attribute:
+
+        ok        the API listed the history and all of it was loaded
+        none      the API answered and the wallet has no history
+        partial   the API failed, or some files could not be loaded; scored against the rest
+        failed    the API failed or every file failed to load, and no history is available,
+                  so uniqueness is unverified
+    """
+    if listing_failed or failed_files:
+        return "partial" if has_history else "failed"
+    return "ok" if has_history else "none"
+
+
+def wallet_history(wallet_address, sealed_dir=None, listing: HistoryListing = None):
+    """
+    Fetch a wallet's history once, for scoring any number of its submissions.
+
+    With a sealed directory, the wallet's digest supplies the keys of every file
+    already seen, so only mappings above its watermark are listed and only new
+    ones are downloaded; the digest is then updated with them.
+
+    Unless a listing is given, pages of file mappings are downloaded as they
+    arrive while the next page is requested. Proof.generate only leaves the
+    listing to this function when there is no result cache (the default without
+    Redis); with one, the listing above the digest's watermark is completed first
+    to build the cache key.
+
+    :param listing: The wallet's history from list_history, if already listed.
+    :return: dict with the history's TokenKeyIndex, the cache stats and the history status
+    """
+    gpg_signature = os.environ.get("SIGNATURE")
+    redis_client = get_redis_client()
+    blob_cache = get_blob_cache(sealed_dir)
+
+    if listing is not None:
+        digest, pages, listing_error = listing.digest, [listing.file_mappings], listing.error
+    else:
+        digest, listing_error = _wallet_digest(wallet_address, sealed_dir), None
+        pages = prefetched(iter_file_mapping_pages(wallet_address, digest.watermark if digest is not None else None))
+
+    history_index = TokenKeyIndex()
+    cache_stats = {"hits": 0, "misses": 0, "written": 0, "listed": 0, "failed": 0}
+    if digest is not None:
+        cache_stats["digest_files"] = 0
+    listed_file_ids = []
+    loaded_file_ids = []
+    try:
+        for file_mappings in pages:
+            new_file_mappings = digest.unseen(file_mappings) if digest is not None else file_mappings
+            page_index, page_stats, page_file_ids = load_history(
+                redis_client, new_file_mappings, gpg_signature, blob_cache=blob_cache
+            )
+            history_index.update(page_index)
+            for name, value in page_stats.items():
+                cache_stats[name] = cache_stats.get(name, 0) + value
+            listed_file_ids.extend(file_info.get("fileId") for file_info in file_mappings)
+            loaded_file_ids.extend(page_file_ids)
+            cache_stats["listed"] += len(new_file_mappings)
+            if digest is not None:
+                cache_stats["digest_files"] += len(file_mappings) - len(new_file_mappings)
+    except FileMappingsError as e:
+        metrics.incr("file_mappings_errors")
+        logging.error(f"Could not list the history of {wallet_address}: {e}")
+        listing_error = e
+
+    cache_stats["loaded"] = len(loaded_file_ids)
+    if digest is None:
+        return {
+            "history_index": history_index,
+            "cache_stats": cache_stats,
+            "status": history_status(listing_error is not None, bool(loaded_file_ids), cache_stats["failed"]),
+        }
+
+    metrics.incr("wallet_digest_files", cache_stats["digest_files"])
+    changed = bool(loaded_file_ids)
+    if loaded_file_ids:
+        digest.fold_in(history_index, loaded_file_ids)
+    if listing_error is None:
+        # Only a complete listing shows which files below the new watermark exist
+        changed = digest.advance_watermark(listed_file_ids) or changed
+    if changed:
+        try:
+            with metrics.span("wallet_digest_save"):
+                save_digest(sealed_dir, digest)
+        except OSError as e:
+            logging.warning(f"Could not update the wallet digest: {e}")
+    return {
+        "history_index": digest.history_index,
+        "cache_stats": cache_stats,
+        "status": history_status(listing_error is not None, bool(digest.file_ids), cache_stats["failed"]),
+    }
+
+
+def failed_history():
+    """The wallet_history result used when the history could not be loaded at all."""
+    return {"history_index": TokenKeyIndex(), "cache_stats": {}, "status": "failed"}
+
+
+def submission_uniqueness_details(curr_file_json_data, history_index, cache_stats=None, history_status=None):
+    """
+    uniqueness_details for an in-memory submission scored against a prefetched history index.
+
+    :param history_status: The history's status from wallet_history, reported in the proof.
+    """
+    json_uniqueness_score, unique_json_entries = score_uniqueness(curr_file_json_data, history_index)
+    return {
+        "unique_json_data": unique_json_entries,
+        "curr_file_json_data": curr_file_json_data,
+        "uniqueness_score": json_uniqueness_score,
+        "global_uniqueness_score": score_global_uniqueness(curr_file_json_data),
+        "history_index": history_index,
+        "cache_stats": cache_stats or {},
+        "history_status": history_status,
     }
 
 # Execute the script independently for testing the values
+# Talks to the services in the environment; benchmarks.standins provides local ones
 if __name__ == "__main__":
+    import sys
+
     redis_client = get_redis_client()
-    file_mappings = get_file_mappings("0x1234567890abcdef")
-    gpg_signature = ""
-    input_dir = "../demo/input"
+    file_mappings = get_file_mappings(sys.argv[1] if len(sys.argv) > 1 else "0x1234567890abcdef")
+    gpg_signature = os.environ.get("SIGNATURE", "")
+    input_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "demo", "input")
     
-    combined_json_data, curr_file_json_data, json_uniqueness_score, unique_json_entries = process_json_files(redis_client, file_mappings, gpg_signature, input_dir)
+    curr_file_json_data, json_uniqueness_score, unique_json_entries, history_index, _, global_uniqueness_score = process_json_files(redis_client, file_mappings, gpg_signature, input_dir)
     
     print("Unique JSON Entries:", unique_json_entries)
-    print("Combined JSON Data:", combined_json_data)
+    print("Historical Token Keys:", len(history_index))
     print("Current File JSON Data:", curr_file_json_data)
-    print("JSON Uniqueness Score:", json_uniqueness_score)
\ No newline at end of file
+    print("JSON Uniqueness Score:", json_uniqueness_score)
+    print("Global Uniqueness Score:", global_uniqueness_score)
\ No newline at end of file
@@ -0,0 +1,268 @@
+"""
+Whole-proof result cache.
+
+Validators rerun the same proof after timeouts, and several nodes may score the
+same file. A finished ProofResponse is stored under a key derived from
+
+    the normalized submission documents, the wallet, the set of historical
+    fileIds, the DLP id, MAX_TOKEN_REWARD / REWARD_PER_TOKEN, SCORING_VERSION,
+    and the market reference snapshot and global uniqueness index in use, if any
+
+so a rerun against an unchanged history returns the stored response without
+downloading history or calling any RPC. A returned response carries the time of
+the rerun as its submission_time, not the time it was first scored. Degraded
+proofs (a stage missed the deadline, an ownership chain timed out or failed, or
+part of the history could not be listed or loaded) are never stored.
+
+Building the key means listing the wallet's history (above its digest's
+watermark) before any download starts, so while the cache is on, file mapping
+pages are not streamed into the downloads. The cache is therefore only on by
+default when Redis is configured, where validators share it; the per-enclave
+cache in proof_results/ in the sealed directory needs PROOF_RESULT_CACHE=true,
+and PROOF_RESULT_CACHE=false turns off both. When scoring logic changes, bump
+SCORING_VERSION (or set PROOF_RESULT_CACHE_VERSION) so old entries stop
+matching, or drop them:
+
+    python -m my_proof.result_cache clear [--sealed-dir /sealed]
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+from abc import ABC, abstractmethod
+
+from my_proof import metrics
+
+# Part of every cache key; bump whenever scoring or proof assembly changes
+SCORING_VERSION = "2"
+DEFAULT_CACHE_TTL = 3600  # seconds
+DEFAULT_CACHE_PREFIX = "poc:proof:"
+RESULTS_DIRNAME = "proof_results"
+
+
+def get_cache_settings():
+    """Result cache settings from environment variables."""
+    enabled = os.environ.get('PROOF_RESULT_CACHE')
+    return {
+        # None (unset): only the Redis cache is used
+        'enabled': enabled.lower() in ('1', 'true', 'yes') if enabled else None,
+        'ttl': int(os.environ.get('PROOF_RESULT_CACHE_TTL', DEFAULT_CACHE_TTL)),
+        'prefix': os.environ.get('PROOF_RESULT_CACHE_PREFIX', DEFAULT_CACHE_PREFIX),
+        'version': os.environ.get('PROOF_RESULT_CACHE_VERSION', SCORING_VERSION),
+    }
+
+
+def result_key(documents, wallet_address: str, file_ids, dlp_id, max_rewards, reward_per_token, version=None,
+               reference_version=None, global_index_version=None) -> str:
+    """
+    Hex digest identifying a proof's inputs.
+
+    Documents are hashed as canonical JSON (sorted keys, no whitespace), so
+    formatting and key order do not matter; fileIds are compared as a set.
+
+    :param reference_version: The market reference snapshot's generation time, when one is used.
+    :param global_index_version: The global uniqueness index build (GlobalUniquenessIndex.version), when one is used.
+    """
+    digest = hashlib.sha256()
+    header = {
+        "version": version if version is not None else get_cache_settings()['version'],
+        "wallet": wallet_address.lower(),
+        "file_ids": sorted({str(file_id) for file_id in file_ids}),
+        "dlp_id": dlp_id,
+        "max_rewards": max_rewards,
+        "reward_per_token": reward_per_token,
+    }
+    if reference_version is not None:
+        header["market_reference"] = reference_version
+    if global_index_version is not None:
+        header["global_index"] = list(global_index_version)
+    digest.update(json.dumps(header, sort_keys=True).encode("utf-8"))
+    for document in documents:
+        digest.update(b"\n")
+        digest.update(json.dumps(document, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def is_cacheable(response) -> bool:
+    """
+    Only complete proofs are stored: nothing degraded, the whole history loaded and
+    every ownership chain answered.
+    """
+    if response.attributes.get('degraded_stages'):
+        return False
+    if response.attributes.get('history_status') not in (None, "ok", "none"):
+        return False
+    if response.attributes.get('history_files_failed'):
+        return False
+    chains = (response.metadata or {}).get('ownership_chains') or {}
+    return all(stats.get("status") in ("ok", "cached") for stats in chains.values())
+
+
+class ResultCache(ABC):
+    """Stored ProofResponse dicts keyed by result_key."""
+
+    def __init__(self, ttl=DEFAULT_CACHE_TTL):
+        self.ttl = ttl
+
+    def get(self, key: str):
+        """The stored response dict for `key`, or None."""
+        entry = self._load(key)
+        if entry is None or time.time() - entry.get("stored_at", 0) > self.ttl:
+            metrics.incr("proof_result_cache_misses")
+            return None
+        metrics.incr("proof_result_cache_hits")
+        return entry["response"]
+
+    def put(self, key: str, response) -> None:
+        """Store a ProofResponse if it is cacheable."""
+        if not is_cacheable(response):
+            return
+        self._store(key, {"stored_at": time.time(), "response": response.model_dump()})
+
+    @abstractmethod
+    def clear(self) -> int:
+        """Drop every stored result. Returns the number removed."""
+
+    @abstractmethod
+    def _load(self, key: str):
+        """The stored entry for `key`, or None."""
+
+    @abstractmethod
+    def _store(self, key: str, entry) -> None:
+        """Store `entry` under `key`."""
+
+
+class RedisResultCache(ResultCache):
+    """Results shared across validators through Redis; expiry uses Redis TTLs."""
+
+    def __init__(self, redis_client, prefix=DEFAULT_CACHE_PREFIX, **kwargs):
+        super().__init__(**kwargs)
+        self.redis_client = redis_client
+        self.prefix = prefix
+
+    def _load(self, key):
+        import redis
+
+        try:
+            value = self.redis_client.get(self.prefix + key)
+        except redis.RedisError as e:
+            logging.warning(f"Proof result cache read failed: {e}")
+            return None
+        return json.loads(value) if value else None
+
+    def _store(self, key, entry):
+        import redis
+
+        try:
+            self.redis_client.set(self.prefix + key, json.dumps(entry), ex=self.ttl)
+        except redis.RedisError as e:
+            logging.warning(f"Proof result cache write failed: {e}")
+
+    def clear(self):
+        removed = 0
+        keys = list(self.redis_client.scan_iter(match=self.prefix + "*", count=1000))
+        for i in range(0, len(keys), 1000):
+            removed += self.redis_client.delete(*keys[i:i + 1000])
+        return removed
+
+
+class FileResultCache(ResultCache):
+    """Results as JSON files in the sealed directory, used when Redis is not configured."""
+
+    def __init__(self, directory, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _load(self, key):
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable proof result {key}: {e}")
+            return None
+
+    def _store(self, key, entry):
+        try:
+            fd, tmp_path = tempfile.mkstemp(prefix=".result-", dir=self.directory)
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump(entry, file)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            logging.warning(f"Proof result cache write failed: {e}")
+            return
+        self._expire()
+
+    def _expire(self):
+        cutoff = time.time() - self.ttl
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self):
+        removed = 0
+        for name in os.listdir(self.directory):
+            try:
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+            except OSError:
+                pass
+        return removed
+
+
+def get_result_cache(redis_client=None, sealed_dir=None, enabled_only=True):
+    """
+    Build the result cache for this run.
+
+    Uses Redis when a client is given, otherwise proof_results/ in the sealed
+    directory if PROOF_RESULT_CACHE=true. Returns None when caching is disabled
+    or no backend is available.
+
+    :param enabled_only: Honour PROOF_RESULT_CACHE; False opens any available backend (for clearing it).
+    """
+    settings = get_cache_settings()
+    if enabled_only and settings['enabled'] is False:
+        return None
+    if redis_client is not None:
+        return RedisResultCache(redis_client, prefix=settings['prefix'], ttl=settings['ttl'])
+    if (settings['enabled'] or not enabled_only) and sealed_dir and os.path.isdir(sealed_dir):
+        try:
+            return FileResultCache(os.path.join(sealed_dir, RESULTS_DIRNAME), ttl=settings['ttl'])
+        except OSError as e:
+            logging.warning(f"Proof result cache unavailable: {e}")
+    return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Manage the proof result cache.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    clear_parser = subparsers.add_parser("clear", help="drop every stored proof result")
+    clear_parser.add_argument("--sealed-dir", help="clear the sealed-directory cache instead of Redis")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.sealed_dir:
+        cache = get_result_cache(sealed_dir=args.sealed_dir, enabled_only=False)
+    else:
+        from my_proof.proof_of_uniqueness import get_redis_client
+
+        cache = get_result_cache(get_redis_client(), enabled_only=False)
+    if cache is None:
+        raise SystemExit("No result cache found: set REDIS_HOST or pass --sealed-dir")
+    print(f"Removed {cache.clear()} proof results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Dependency-aware stage scheduler for one proof run.
+
+Stages are named callables that receive the results of the stages they depend
+on. Every stage starts as soon as its dependencies have finished, so independent
+network-bound stages (history download, ownership RPCs) overlap instead of
+running one after the other.
+
+The whole run shares one deadline (PROOF_DEADLINE seconds, unset or 0 for none).
+A stage that declares a fallback degrades to it when it fails or is still running
+at the deadline, and is listed in `degraded`; a stage without one is required and
+its failure or timeout ends the run. A required stage that has not started by the
+deadline still runs, after it, once its dependencies have results or fallbacks, so
+a slow dependency degrades the cheap stages built on it instead of ending the run.
+"""
+import logging
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from my_proof import metrics
+
+_REQUIRED = object()
+
+
+def get_proof_deadline():
+    """Overall deadline for a proof in seconds (PROOF_DEADLINE), or None for no deadline."""
+    deadline = float(os.environ.get("PROOF_DEADLINE", 0))
+    return deadline if deadline > 0 else None
+
+
+class StageDeadlineExceeded(TimeoutError):
+    """A required stage did not finish before the proof deadline."""
+
+
+class StageScheduler:
+    """Run named stages concurrently in dependency order under one deadline."""
+
+    def __init__(self, deadline: float = None):
+        """
+        :param deadline: Seconds from run() for all stages to finish, defaults to PROOF_DEADLINE.
+        """
+        self.deadline = get_proof_deadline() if deadline is None else deadline
+        self.stages = {}
+        self.results = {}
+        self.degraded = {}
+
+    def add(self, name: str, fn, after=(), fallback=_REQUIRED) -> None:
+        """
+        Register a stage.
+
+        :param fn: Called with the results of `after` as keyword arguments named after those stages.
+        :param after: Names of the stages this one depends on; they must already be registered.
+        :param fallback: Result used when the stage fails or misses the deadline. Without one the stage is required.
+        """
+        missing = [dependency for dependency in after if dependency not in self.stages]
+        if missing:
+            raise ValueError(f"Stage {name} depends on unknown stages: {missing}")
+        self.stages[name] = (fn, tuple(after), fallback)
+
+    def remaining(self):
+        """Seconds left before the deadline, or None without a deadline."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self._started + self.deadline - time.perf_counter())
+
+    def _degrade(self, name: str, reason: str) -> None:
+        fallback = self.stages[name][2]
+        if fallback is _REQUIRED:
+            raise StageDeadlineExceeded(f"Stage {name} missed the {self.deadline}s proof deadline")
+        logging.warning(f"Stage {name} degraded: {reason}")
+        self.results[name] = fallback
+        self.degraded[name] = reason
+        metrics.incr("stages_degraded")
+
+    def _run_stage(self, name: str):
+        fn, after, _ = self.stages[name]
+        with metrics.span("stage", stage=name):
+            return fn(**{dependency: self.results[dependency] for dependency in after})
+
+    def run(self):
+        """
+        Run every stage.
+
+        :return: Dict of stage name to result (the fallback for degraded stages).
+        :raises StageDeadlineExceeded: if a required stage misses the deadline
+        """
+        self._started = time.perf_counter()
+        pending = dict(self.stages)
+        running = {}
+        executor = ThreadPoolExecutor(max_workers=max(1, len(self.stages)), thread_name_prefix="stage")
+        try:
+            while pending or running:
+                if self.remaining() == 0:
+                    # Out of time: whatever is still running degrades
+                    for name in sorted(running.values()):
+                        self._degrade(name, "timeout")
+                    # Of the stages not started, required ones run now on their dependencies'
+                    # results or fallbacks (registration order puts dependencies first); the rest degrade
+                    for name, (_, after, fallback) in pending.items():
+                        if fallback is _REQUIRED and all(dependency in self.results for dependency in after):
+                            self.results[name] = self._run_stage(name)
+                        else:
+                            self._degrade(name, "timeout")
+                    break
+                for name in [name for name, (_, after, _) in pending.items() if all(d in self.results for d in after)]:
+                    del pending[name]
+                    running[executor.submit(self._run_stage, name)] = name
+
+                done, _ = wait(running, timeout=self.remaining(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        self.results[name] = future.result()
+                    except Exception as e:
+                        if self.stages[name][2] is _REQUIRED:
+                            raise
+                        logging.error(f"Stage {name} failed: {e}")
+                        self._degrade(name, "error")
+        finally:
+            # Stages abandoned at the deadline keep their threads; do not wait for them
+            executor.shutdown(wait=False, cancel_futures=True)
+        return self.results
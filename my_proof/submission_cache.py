@@ -0,0 +1,143 @@
+import json
+import logging
+import os
+
+SUBMISSION_FIELD = "submission_data"
+DEFAULT_CACHE_PREFIX = "poc:submission:"
+DEFAULT_CACHE_TTL = 7 * 24 * 3600  # seconds
+DEFAULT_CACHE_MAX_BYTES = 256 * 1024
+
+
+def get_cache_settings():
+    """Write-back cache settings from environment variables."""
+    return {
+        'write_back': os.environ.get('SUBMISSION_CACHE_WRITE_BACK', 'false').lower() in ('1', 'true', 'yes'),
+        'keys_only': os.environ.get('SUBMISSION_CACHE_KEYS_ONLY', 'false').lower() in ('1', 'true', 'yes'),
+        'ttl': int(os.environ.get('SUBMISSION_CACHE_TTL', DEFAULT_CACHE_TTL)),
+        'max_bytes': int(os.environ.get('SUBMISSION_CACHE_MAX_BYTES', DEFAULT_CACHE_MAX_BYTES)),
+        'prefix': os.environ.get('SUBMISSION_CACHE_PREFIX', DEFAULT_CACHE_PREFIX),
+    }
+
+
+def cache_key(file_id, prefix=None) -> str:
+    return f"{prefix if prefix is not None else get_cache_settings()['prefix']}{file_id}"
+
+
+def read_cached_submissions(redis_client, file_mappings):
+    """
+    Resolve every file mapping against the Redis submission cache in one round trip.
+
+    A file is a hit if its `fileId` hash has a non-empty `submission_data` field,
+    or if a write-back entry exists for it. All lookups are sent in a single
+    non-transactional pipeline.
+
+    :return: (hits, misses, stats) where hits maps fileId -> list of documents,
+             misses is the list of file mappings to download and stats holds the
+             hit and miss counts.
+    """
+    file_mappings = list(file_mappings)
+    prefix = get_cache_settings()['prefix']
+    hits = {}
+    misses = []
+
+    stored = [None] * (2 * len(file_mappings))
+    if redis_client and file_mappings:
+        import redis
+
+        try:
+            pipeline = redis_client.pipeline(transaction=False)
+            for file_info in file_mappings:
+                pipeline.hget(file_info.get("fileId"), SUBMISSION_FIELD)
+                pipeline.get(cache_key(file_info.get("fileId"), prefix))
+            stored = pipeline.execute()
+        except redis.RedisError as e:
+            logging.warning(f"Redis cache read failed, downloading all files: {e}")
+
+    hit_count = 0
+    for i, file_info in enumerate(file_mappings):
+        stored_json_data = stored[2 * i] or stored[2 * i + 1]
+        if stored_json_data:
+            hits[file_info.get("fileId")] = json.loads(stored_json_data)
+            hit_count += 1
+        else:
+            misses.append(file_info)
+
+    stats = {"hits": hit_count, "misses": len(misses)}
+    logging.info(f"Submission cache: {stats['hits']} hits, {stats['misses']} misses")
+    return hits, misses, stats
+
+
+def compact_submissions(json_data_list, keys_only=False):
+    """
+    Reduce downloaded documents to what is worth caching.
+
+    Full mode keeps the token entries; keys-only mode keeps just the
+    (chain, contract) pairs the uniqueness check reads. Either way the result
+    has the same {"tokens": [...]} shape as a downloaded document.
+    """
+    if not keys_only:
+        return [{"tokens": json_data.get("tokens", [])} for json_data in json_data_list]
+    return [
+        {"tokens": [
+            {"token_metadata": {
+                "chain": token.get("token_metadata", {}).get("chain"),
+                "contract": token.get("token_metadata", {}).get("contract"),
+            }}
+            for token in json_data.get("tokens", [])
+        ]}
+        for json_data in json_data_list
+    ]
+
+
+def encode_submissions(json_data_list, keys_only=False, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+    """
+    Serialize documents for the cache within a per-entry byte budget.
+
+    If the full form is over budget it falls back to keys-only; returns None when
+    even that does not fit.
+    """
+    modes = [True] if keys_only else [False, True]
+    for keys_only_mode in modes:
+        payload = json.dumps(compact_submissions(json_data_list, keys_only_mode), separators=(',', ':'))
+        if len(payload.encode("utf-8")) <= max_bytes:
+            return payload
+    return None
+
+
+def write_cached_submissions(redis_client, fetched):
+    """
+    Write downloaded submissions back to Redis after a cache miss.
+
+    `fetched` is an iterable of (file_info, json_data_list). Entries are stored as
+    strings under their own prefixed key with a TTL, so the validator-owned fileId
+    hashes are never modified. Does nothing unless SUBMISSION_CACHE_WRITE_BACK is set.
+
+    :return: number of entries written
+    """
+    settings = get_cache_settings()
+    if not redis_client or not settings['write_back']:
+        return 0
+
+    pipeline = redis_client.pipeline(transaction=False)
+    written = 0
+    for file_info, json_data_list in fetched:
+        if not json_data_list:
+            continue
+        payload = encode_submissions(json_data_list, settings['keys_only'], settings['max_bytes'])
+        if payload is None:
+            logging.info(f"Not caching fileId {file_info.get('fileId')}: over {settings['max_bytes']} bytes")
+            continue
+        pipeline.set(cache_key(file_info.get("fileId"), settings['prefix']), payload, ex=settings['ttl'] or None)
+        written += 1
+
+    if not written:
+        return 0
+
+    import redis
+
+    try:
+        pipeline.execute()
+    except redis.RedisError as e:
+        logging.warning(f"Redis cache write failed: {e}")
+        return 0
+    return written
@@ -0,0 +1,191 @@
+import json
+import struct
+from typing import Any, Dict, Iterable, List, Tuple
+
+TokenKey = Tuple[str, str]
+
+# Compact key layout: 2-byte interned chain id, 1-byte tag, contract payload
+_CHAIN_ID = struct.Struct(">H")
+_HEX_TAG = b"\x01"  # payload is the address decoded from hex
+_TEXT_TAG = b"\x00"  # payload is the UTF-8 address (base58 and anything not plain hex)
+_LENGTH = struct.Struct("<I")
+_RECORD_LENGTH = struct.Struct("<H")
+
+
+def normalize_token_key(chain: str, contract: str) -> TokenKey:
+    """
+    Build the canonical (chain, contract) key used for uniqueness checks.
+
+    Chains are lowercased. Hex (EVM) contract addresses are lowercased so EIP-55
+    checksum casing does not matter; base58 addresses (Solana, Tron) are case
+    sensitive and are only stripped.
+    """
+    chain = (chain or "").strip().lower()
+    contract = (contract or "").strip()
+    if contract[:2].lower() == "0x":
+        contract = contract.lower()
+    return chain, contract
+
+
+def token_key(token: Dict[str, Any]) -> TokenKey:
+    """Return the normalized key of a submitted token entry."""
+    token_metadata = token.get("token_metadata") or {}
+    return normalize_token_key(token_metadata.get("chain"), token_metadata.get("contract"))
+
+
+class TokenKeyIndex:
+    """
+    Hash index of the (chain, contract) keys a contributor has already submitted.
+
+    Built once from the history and shared by the uniqueness and scoring stages,
+    so every lookup is O(1) instead of a scan over all historical tokens.
+
+    Keys are held as compact bytes records rather than tuples of strings: the
+    chain is interned to a 2-byte id from the index's own chain table (so an index
+    pickled to another process stays valid) and hex contract addresses are stored
+    as their decoded bytes. A 20-byte EVM address costs a 23-byte record instead
+    of a tuple holding a 42-character string.
+    """
+
+    __slots__ = ("_keys", "_chain_prefixes", "_chains", "token_count")
+
+    def __init__(self, keys: Iterable[TokenKey] = ()):
+        self._keys = set()
+        # chain -> packed 2-byte id; _chains maps the id back to the chain
+        self._chain_prefixes = {}
+        self._chains = []
+        # Historical token entries indexed, duplicates included
+        self.token_count = 0
+        for chain, contract in keys:
+            self.add(chain, contract)
+
+    @classmethod
+    def from_tokens(cls, tokens: Iterable[Dict[str, Any]]) -> "TokenKeyIndex":
+        index = cls()
+        index.add_tokens(tokens)
+        return index
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]]) -> "TokenKeyIndex":
+        index = cls()
+        index.add_documents(documents)
+        return index
+
+    def _encode(self, key: TokenKey, intern: bool):
+        """Compact record of a normalized key; None for an unknown chain when not interning."""
+        chain, contract = key
+        prefix = self._chain_prefixes.get(chain)
+        if prefix is None:
+            if not intern:
+                return None
+            prefix = self._chain_prefixes[chain] = _CHAIN_ID.pack(len(self._chains))
+            self._chains.append(chain)
+        if contract[:2] == "0x":
+            try:
+                payload = bytes.fromhex(contract[2:])
+            except ValueError:
+                payload = None
+            # fromhex() skips whitespace, so only an exact-length decode round-trips
+            if payload is not None and 2 * len(payload) == len(contract) - 2:
+                return prefix + _HEX_TAG + payload
+        return prefix + _TEXT_TAG + contract.encode("utf-8")
+
+    def _decode(self, record: bytes) -> TokenKey:
+        chain = self._chains[_CHAIN_ID.unpack_from(record)[0]]
+        if record[2:3] == _HEX_TAG:
+            return chain, "0x" + record[3:].hex()
+        return chain, record[3:].decode("utf-8")
+
+    def _contains_key(self, key: TokenKey) -> bool:
+        record = self._encode(key, intern=False)
+        return record is not None and record in self._keys
+
+    def add(self, chain: str, contract: str) -> None:
+        self._keys.add(self._encode(normalize_token_key(chain, contract), intern=True))
+        self.token_count += 1
+
+    def add_tokens(self, tokens: Iterable[Dict[str, Any]]) -> None:
+        for token in tokens:
+            self._keys.add(self._encode(token_key(token), intern=True))
+            self.token_count += 1
+
+    def add_documents(self, documents: Iterable[Dict[str, Any]]) -> None:
+        for document in documents:
+            self.add_tokens(document.get("tokens", []))
+
+    def contains(self, chain: str, contract: str) -> bool:
+        return self._contains_key(normalize_token_key(chain, contract))
+
+    def contains_many(self, pairs: Iterable[TokenKey]) -> List[bool]:
+        """Batch form of contains() for many (chain, contract) pairs."""
+        contains_key = self._contains_key
+        return [contains_key(normalize_token_key(chain, contract)) for chain, contract in pairs]
+
+    def update(self, other: "TokenKeyIndex") -> None:
+        """Add every key of another index, re-interning its chains into this index's table."""
+        for chain, contract in other.keys():
+            self._keys.add(self._encode((chain, contract), intern=True))
+        self.token_count += other.token_count
+
+    def keys(self):
+        return {self._decode(record) for record in self._keys}
+
+    def to_bytes(self) -> bytes:
+        """Serialize the index: a JSON header with the chain table, then length-prefixed records."""
+        header = json.dumps({"chains": self._chains, "token_count": self.token_count}).encode("utf-8")
+        parts = [_LENGTH.pack(len(header)), header]
+        for record in self._keys:
+            parts.append(_RECORD_LENGTH.pack(len(record)))
+            parts.append(record)
+        return b"".join(parts)
+
+    @classmethod
+    def from_bytes(cls, data) -> "TokenKeyIndex":
+        """
+        Inverse of to_bytes().
+
+        :raises ValueError: if the data is truncated or malformed
+        """
+        data = memoryview(data)
+        try:
+            (header_length,) = _LENGTH.unpack_from(data)
+            header = json.loads(bytes(data[_LENGTH.size:_LENGTH.size + header_length]))
+            index = cls()
+            index._chains = list(header["chains"])
+            index._chain_prefixes = {chain: _CHAIN_ID.pack(i) for i, chain in enumerate(index._chains)}
+            index.token_count = int(header["token_count"])
+            position = _LENGTH.size + header_length
+            while position < len(data):
+                (record_length,) = _RECORD_LENGTH.unpack_from(data, position)
+                position += _RECORD_LENGTH.size
+                if position + record_length > len(data):
+                    raise ValueError("truncated record")
+                index._keys.add(bytes(data[position:position + record_length]))
+                position += record_length
+        except (struct.error, KeyError, TypeError) as e:
+            raise ValueError(f"Malformed token index: {e}") from e
+        return index
+
+    def __contains__(self, token: Dict[str, Any]) -> bool:
+        return self._contains_key(token_key(token))
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+
+def index_history(history) -> TokenKeyIndex:
+    """
+    Return a TokenKeyIndex for `history`.
+
+    Accepts an existing index (returned as is), a list of submission documents
+    (each with a "tokens" list) or a flat list of token entries.
+    """
+    if isinstance(history, TokenKeyIndex):
+        return history
+    index = TokenKeyIndex()
+    for entry in history or []:
+        if "token_metadata" in entry:
+            index.add_tokens([entry])
+        else:
+            index.add_tokens(entry.get("tokens", []))
+    return index
@@ -0,0 +1,154 @@
+"""
+Per-wallet uniqueness digest in the sealed directory.
+
+For each wallet the digest records which historical fileIds have already been
+folded into its TokenKeyIndex, so a run only downloads the file mappings it has
+not seen yet. Its watermark is the highest fileId below which every listed file
+has been folded in; the validator API is only asked for mappings above it. Digests live in <sealed_dir>/wallet_digests/, one file per wallet:
+
+    magic | SHA-256 (or HMAC-SHA256 with WALLET_DIGEST_KEY) of the body | body
+    body = JSON header (wallet, fileIds, watermark) length-prefixed, then TokenKeyIndex.to_bytes()
+
+A digest that fails its integrity check is ignored and rebuilt from the full
+history. Updates are written to a temporary file and renamed into place.
+"""
+import hashlib
+import hmac
+import json
+import logging
+import os
+import struct
+import tempfile
+import time
+
+from my_proof.file_mappings import numeric_file_id
+from my_proof.token_index import TokenKeyIndex
+
+MAGIC = b"POCWDG1\n"
+DIGEST_DIRNAME = "wallet_digests"
+_LENGTH = struct.Struct("<I")
+
+
+def digest_enabled() -> bool:
+    return os.environ.get("WALLET_DIGEST", "true").lower() in ("1", "true", "yes")
+
+
+def digest_path(sealed_dir: str, wallet_address: str) -> str:
+    name = hashlib.sha256(wallet_address.lower().encode("utf-8")).hexdigest()
+    return os.path.join(sealed_dir, DIGEST_DIRNAME, f"{name}.digest")
+
+
+def _checksum(body: bytes) -> bytes:
+    key = os.environ.get("WALLET_DIGEST_KEY")
+    if key:
+        return hmac.new(key.encode("utf-8"), body, hashlib.sha256).digest()
+    return hashlib.sha256(body).digest()
+
+
+class WalletDigest:
+    """The fileIds already folded into a wallet's history index, and that index."""
+
+    def __init__(self, wallet_address: str, file_ids=(), history_index: TokenKeyIndex = None, updated_at: float = None,
+                 watermark: int = None):
+        self.wallet_address = wallet_address.lower()
+        self.file_ids = {str(file_id) for file_id in file_ids}
+        self.history_index = history_index if history_index is not None else TokenKeyIndex()
+        self.updated_at = updated_at
+        self.watermark = watermark
+
+    def unseen(self, file_mappings):
+        """The file mappings whose fileId is not yet in the digest."""
+        return [file_info for file_info in file_mappings if str(file_info.get("fileId")) not in self.file_ids]
+
+    def fold_in(self, history_index: TokenKeyIndex, file_ids) -> None:
+        """Merge the index of newly loaded files and mark their fileIds as seen."""
+        self.history_index.update(history_index)
+        self.file_ids.update(str(file_id) for file_id in file_ids)
+
+    def advance_watermark(self, listed_file_ids) -> bool:
+        """
+        Move the watermark up after a complete listing of the mappings above it.
+
+        It stops below the first listed file that is not in the digest (its
+        download failed), so the next run lists that file again. Non-numeric
+        fileIds cannot be ordered and clear the watermark.
+
+        :return: Whether the watermark changed.
+        """
+        previous = self.watermark
+        listed = []
+        for file_id in listed_file_ids:
+            number = numeric_file_id(file_id)
+            if number is None:
+                self.watermark = None
+                return previous is not None
+            listed.append((number, str(file_id)))
+        for number, file_id in sorted(listed):
+            if file_id not in self.file_ids:
+                break
+            self.watermark = max(number, self.watermark if self.watermark is not None else number)
+        return self.watermark != previous
+
+    def to_bytes(self) -> bytes:
+        header = json.dumps({
+            "wallet": self.wallet_address,
+            "file_ids": sorted(self.file_ids),
+            "updated_at": self.updated_at,
+            "watermark": self.watermark,
+        }).encode("utf-8")
+        body = _LENGTH.pack(len(header)) + header + self.history_index.to_bytes()
+        return MAGIC + _checksum(body) + body
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> "WalletDigest":
+        """
+        :raises ValueError: if the magic, the checksum or the contents are invalid
+        """
+        if not data.startswith(MAGIC):
+            raise ValueError("not a wallet digest")
+        checksum = data[len(MAGIC):len(MAGIC) + 32]
+        body = data[len(MAGIC) + 32:]
+        if not hmac.compare_digest(checksum, _checksum(body)):
+            raise ValueError("checksum mismatch")
+        try:
+            (header_length,) = _LENGTH.unpack_from(body)
+            header = json.loads(body[_LENGTH.size:_LENGTH.size + header_length])
+        except struct.error as e:
+            raise ValueError(f"malformed header: {e}") from e
+        history_index = TokenKeyIndex.from_bytes(body[_LENGTH.size + header_length:])
+        return cls(header["wallet"], header["file_ids"], history_index, header.get("updated_at"), header.get("watermark"))
+
+
+def load_digest(sealed_dir: str, wallet_address: str) -> WalletDigest:
+    """
+    The wallet's digest, or an empty one when there is none yet or it fails its checks.
+    """
+    path = digest_path(sealed_dir, wallet_address)
+    try:
+        with open(path, "rb") as file:
+            digest = WalletDigest.from_bytes(file.read())
+        if digest.wallet_address != wallet_address.lower():
+            raise ValueError("digest belongs to another wallet")
+        return digest
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        logging.warning(f"Ignoring wallet digest {path}: {e}")
+    return WalletDigest(wallet_address)
+
+
+def save_digest(sealed_dir: str, digest: WalletDigest) -> None:
+    """Atomically replace the wallet's digest file."""
+    digest.updated_at = time.time()
+    path = digest_path(sealed_dir, digest.wallet_address)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".digest-", dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(digest.to_bytes())
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
@@ -0,0 +1,175 @@
+"""
+Long-lived proof worker.
+
+Runs many proof jobs in one process, so interpreter startup, the Redis
+connection, the HTTP session, Web3 providers and the GPG handle are paid for
+once. Jobs are JSON lines, read from stdin or from a Unix socket:
+
+    {"id": "job-1", "input_dir": "/jobs/1/input", "output_dir": "/jobs/1/output",
+     "env": {"FILE_ID": "123", "SIGNATURE": "..."}}
+
+Each job gets one JSON line back with its status, duration and the running
+jobs-per-second rate.
+
+    python -m my_proof.worker                      # stdin / stdout
+    python -m my_proof.worker --socket /tmp/proof.sock
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import socketserver
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+from my_proof.__main__ import run
+from my_proof.proof_of_ownership import refresh_rpc_urls
+
+DEFAULT_QUEUE_SIZE = 4
+_STOP = object()
+
+
+@contextmanager
+def job_environment(overrides):
+    """Apply a job's env overrides for the duration of the job, then restore the environment."""
+    overrides = {key: str(value) for key, value in (overrides or {}).items()}
+    saved = {key: os.environ.get(key) for key in overrides}
+    os.environ.update(overrides)
+    refresh_rpc_urls()
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        refresh_rpc_urls()
+
+
+class Worker:
+    """Runs jobs one at a time, keeping process-wide clients and caches warm between them."""
+
+    def __init__(self):
+        self.jobs_done = 0
+        self.jobs_failed = 0
+        self.started = time.perf_counter()
+
+    def jobs_per_second(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return round((self.jobs_done + self.jobs_failed) / elapsed, 3) if elapsed > 0 else 0.0
+
+    def run_job(self, job):
+        job_id = job.get("id")
+        start = time.perf_counter()
+        try:
+            input_dir = job["input_dir"]
+            output_dir = job["output_dir"]
+            with job_environment(job.get("env")):
+                output_path = run(input_dir, output_dir)
+            self.jobs_done += 1
+            result = {"id": job_id, "status": "ok", "output_path": output_path}
+        except Exception as e:
+            logging.error(f"Job {job_id} failed: {e}")
+            traceback.print_exc()
+            self.jobs_failed += 1
+            result = {"id": job_id, "status": "error", "error": str(e)}
+        result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        result["jobs_per_second"] = self.jobs_per_second()
+        return result
+
+    def serve_stream(self, reader, writer, queue_size=DEFAULT_QUEUE_SIZE):
+        """
+        Process JSON-lines jobs from `reader`, writing one JSON line per job to `writer`.
+
+        Lines are read ahead into a bounded queue; when it is full the reader stops
+        consuming input, which pushes back on the job producer.
+        """
+        jobs = queue.Queue(maxsize=queue_size)
+
+        def read_jobs():
+            for line in reader:
+                line = line.strip()
+                if line:
+                    jobs.put(line)
+            jobs.put(_STOP)
+
+        threading.Thread(target=read_jobs, name="job-reader", daemon=True).start()
+        while True:
+            line = jobs.get()
+            if line is _STOP:
+                break
+            try:
+                job = json.loads(line)
+            except json.JSONDecodeError as e:
+                result = {"id": None, "status": "error", "error": f"Invalid job: {e}"}
+            else:
+                result = self.run_job(job)
+            writer.write(json.dumps(result) + "\n")
+            writer.flush()
+
+    def summary(self):
+        return {
+            "jobs_done": self.jobs_done,
+            "jobs_failed": self.jobs_failed,
+            "jobs_per_second": self.jobs_per_second(),
+        }
+
+
+def serve_socket(worker, path, queue_size=DEFAULT_QUEUE_SIZE):
+    """Serve jobs on a Unix socket, one connection at a time."""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            reader = (line.decode("utf-8") for line in self.rfile)
+            writer = _TextWriter(self.wfile)
+            worker.serve_stream(reader, writer, queue_size)
+
+    if os.path.exists(path):
+        os.remove(path)
+    with socketserver.UnixStreamServer(path, Handler) as server:
+        logging.info(f"Proof worker listening on {path}")
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(path)
+
+
+class _TextWriter:
+    def __init__(self, binary):
+        self.binary = binary
+
+    def write(self, text):
+        self.binary.write(text.encode("utf-8"))
+
+    def flush(self):
+        self.binary.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run proof jobs in a long-lived worker.")
+    parser.add_argument("--socket", help="Unix socket path; reads jobs from stdin when omitted")
+    parser.add_argument("--queue-size", type=int, default=int(os.environ.get("WORKER_QUEUE_SIZE", DEFAULT_QUEUE_SIZE)))
+    args = parser.parse_args()
+
+    worker = Worker()
+    try:
+        if args.socket:
+            serve_socket(worker, args.socket, args.queue_size)
+        else:
+            # stdout carries the protocol; anything the proof prints goes to stderr
+            results = sys.stdout
+            sys.stdout = sys.stderr
+            worker.serve_stream(sys.stdin, results, args.queue_size)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        logging.info(f"Proof worker stopped: {json.dumps(worker.summary())}")
+
+
+if __name__ == "__main__":
+    main()
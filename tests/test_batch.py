@@ -0,0 +1,57 @@
+import json
+import random
+
+import pytest
+
+from benchmarks.standins import StandInServices
+from benchmarks.synthetic import make_submission
+from my_proof import batch
+from my_proof.proof_of_ownership import RPC_URL_ENV, refresh_rpc_urls
+from my_proof.proof_of_uniqueness import failed_history
+from my_proof.token_index import TokenKeyIndex
+
+GOOD_WALLET = "0x" + "a" * 40
+BAD_WALLET = "0x" + "b" * 40
+
+
+@pytest.fixture
+def rpc(monkeypatch):
+    """Point every chain's RPC URL at a local stand-in, in this process and in the spawned pool workers."""
+    services = StandInServices().start()
+    for env_var in RPC_URL_ENV.values():
+        monkeypatch.setenv(env_var, f"{services.base_url}/rpc")
+    refresh_rpc_urls()
+    yield services
+    services.stop()
+    monkeypatch.undo()
+    refresh_rpc_urls()
+
+
+def test_history_failure_is_isolated_per_wallet(tmp_path, monkeypatch, rpc):
+    rng = random.Random(3)
+    for name, wallet in (("good.json", GOOD_WALLET), ("bad.json", BAD_WALLET)):
+        (tmp_path / name).write_text(json.dumps(make_submission(rng, 5, wallet, analysis_chars=50)))
+    (tmp_path / "broken.json").write_text("{")
+
+    def wallet_history(wallet_address, sealed_dir=None):
+        if wallet_address == BAD_WALLET:
+            raise RuntimeError("history unavailable")
+        return {"history_index": TokenKeyIndex(), "cache_stats": {}, "status": "none"}
+
+    monkeypatch.setattr(batch, "wallet_history", wallet_history)
+    responses = batch.generate_batch({"dlp_id": 1, "input_dir": str(tmp_path), "use_sealing": False}, max_workers=1)
+
+    assert sorted(responses) == ["bad.json", "broken.json", "good.json"]
+    assert responses["good.json"].valid
+    assert responses["good.json"].attributes["history_status"] == "none"
+    assert not responses["bad.json"].valid
+    assert responses["bad.json"].attributes["history_status"] == "failed"
+    assert responses["bad.json"].attributes["degraded_stages"]["history"] == "error"
+    assert not responses["broken.json"].valid
+    assert "error" in responses["broken.json"].attributes
+
+
+def test_failed_history_is_empty():
+    history = failed_history()
+    assert history["status"] == "failed"
+    assert len(history["history_index"]) == 0
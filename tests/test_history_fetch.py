@@ -0,0 +1,74 @@
+import io
+import json
+import os
+import tempfile
+import zipfile
+
+import pytest
+
+from benchmarks.standins import zip_documents
+from my_proof import history_fetch
+
+DOCUMENT = {"tokens": [{"token_metadata": {"chain": "eth", "contract": "0x1"}}]}
+
+
+def zip_members(*members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for i, member in enumerate(members):
+            archive.writestr(f"submission_{i}.json", member)
+    return buffer.getvalue()
+
+
+CORRUPT = {
+    "truncated json": json.dumps(DOCUMENT).encode("utf-8")[:-5],
+    "not utf-8": b'{"tokens": [{"token_metadata": {"chain": "eth", "contract": "\xff"}}]}',
+    "not json": b"not json",
+    "truncated zip": zip_documents([DOCUMENT])[:-30],
+    "zip with a malformed member": zip_members(json.dumps(DOCUMENT), '{"tokens": ['),
+}
+
+
+@pytest.fixture(params=["buffered", "streaming"])
+def decrypted(request, monkeypatch):
+    """Make every download 'decrypt' to the bytes the test sets, on the buffered or streaming path."""
+    holder = {}
+    monkeypatch.setenv("HISTORY_STREAMING", "true" if request.param == "streaming" else "false")
+
+    def to_bytes(file_url, gpg_signature, session=None, gpg=None):
+        return holder["data"]
+
+    def to_file(file_url, gpg_signature, session=None, gpg=None):
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, "wb") as file:
+            file.write(holder["data"])
+        return path
+
+    monkeypatch.setattr(history_fetch, "download_and_decrypt", to_bytes)
+    monkeypatch.setattr(history_fetch, "download_and_decrypt_to_file", to_file)
+    return holder
+
+
+@pytest.mark.parametrize("keys_only", ["true", "false"])
+@pytest.mark.parametrize("name", sorted(CORRUPT))
+def test_corrupt_file_counts_as_failed(decrypted, monkeypatch, name, keys_only):
+    monkeypatch.setenv("HISTORY_KEYS_ONLY", keys_only)
+    decrypted["data"] = CORRUPT[name]
+    assert history_fetch.fetch_history_file({"fileId": 1, "fileUrl": "http://files/1"}, "secret") is None
+
+
+def test_other_files_still_load(decrypted, monkeypatch):
+    monkeypatch.setenv("HISTORY_FETCH_WORKERS", "1")
+    files = {"http://files/good": zip_documents([DOCUMENT]), "http://files/bad": CORRUPT["truncated zip"]}
+
+    def fetch(file_info, *args):
+        decrypted["data"] = files[file_info["fileUrl"]]
+        return original(file_info, *args)
+
+    original = history_fetch.fetch_history_file
+    monkeypatch.setattr(history_fetch, "fetch_history_file", fetch)
+    results = history_fetch.fetch_history_files(
+        [{"fileId": 1, "fileUrl": "http://files/good"}, {"fileId": 2, "fileUrl": "http://files/bad"}], "secret", 1
+    )
+    assert results[1] is None
+    assert [document["tokens"][0]["token_metadata"]["contract"] for document in results[0]] == ["0x1"]
@@ -0,0 +1,52 @@
+import json
+import random
+
+import pytest
+
+from benchmarks.synthetic import make_submission
+from my_proof.key_extractor import key_document
+
+
+def token_keys(document):
+    return [(token["token_metadata"]["chain"], token["token_metadata"]["contract"]) for token in document["tokens"]]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_matches_full_parse(indent):
+    document = make_submission(random.Random(7), 25)
+    data = json.dumps(document, indent=indent).encode("utf-8")
+    assert token_keys(key_document(data)) == token_keys(document)
+
+
+def test_escaped_strings_are_decoded():
+    data = json.dumps({"tokens": [{"token_metadata": {"chain": "eth", "contract": "0x\"abé"}}]}).encode("utf-8")
+    assert token_keys(key_document(data)) == [("eth", "0x\"abé")]
+
+
+@pytest.mark.parametrize("data", [
+    b"not json",
+    b"",
+    b"   ",
+    b'{"a" 1}',
+    b'{"a": 1,}',
+    b'{"a":}',
+    b"{1: 2}",
+    b"[1 2]",
+    b"[1,]",
+    b'{"a": tru}',
+    b'{"a": 01}',
+    b"{} {}",
+    b'{"tokens": [{"token_metadata": {"chain": "eth"',
+    b'{"tokens": [{"token_metadata": {"chain": "eth" "contract": "0x1"}}]}',
+])
+def test_malformed_input_raises(data):
+    with pytest.raises(ValueError):
+        json.loads(data)
+    with pytest.raises(ValueError):
+        key_document(data)
+
+
+@pytest.mark.parametrize("data", [b"{}", b"[]", b'{"a": [1, -2.5e3, null, true, false, NaN, -Infinity], "b": {"c": "d"}}'])
+def test_well_formed_input_is_accepted(data):
+    json.loads(data)
+    assert key_document(data) == {"tokens": []}
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from benchmarks.standins import StandInRedis
+from my_proof import near_duplicate
+from my_proof.near_duplicate import (
+    RedisNearDuplicateIndex, SqliteNearDuplicateIndex, get_near_duplicate_index, submission_texts
+)
+
+TEXT = " ".join(f"word{i}" for i in range(60))
+OTHER_TEXT = " ".join(f"other{i}" for i in range(60))
+
+
+def texts(wallet_address, text, contract="0x1"):
+    return submission_texts([{
+        "userAddress": wallet_address,
+        "tokens": [{"token_metadata": {"chain": "eth", "contract": contract}, "on_chain_analysis": text}],
+    }])
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def index(request, tmp_path):
+    if request.param == "sqlite":
+        index = SqliteNearDuplicateIndex(str(tmp_path / "index.sqlite3"))
+        yield index
+        index.close()
+    else:
+        yield RedisNearDuplicateIndex(StandInRedis(), ttl=3600)
+
+
+def test_later_copy_is_penalized_not_the_original(index):
+    original, copy = texts("0xa", TEXT), texts("0xb", TEXT)
+    assert index.find(original) == {}
+    index.add(original)
+    time.sleep(0.01)
+    assert index.find(copy) == {("eth", "0x1"): 1.0}
+    index.add(copy)
+    # Rerunning the original author's proof does not count the later copy
+    assert index.find(original) == {}
+
+
+def test_rewritten_text_loses_its_first_seen_time(index):
+    index.add(texts("0xa", TEXT))
+    time.sleep(0.01)
+    index.add(texts("0xb", OTHER_TEXT))
+    time.sleep(0.01)
+    # 0xa replaces its text with a copy of 0xb's, which was recorded first
+    assert index.find(texts("0xa", OTHER_TEXT)) == {("eth", "0x1"): 1.0}
+
+
+def test_unrelated_texts_do_not_match(index):
+    index.add(texts("0xa", TEXT))
+    assert index.find(texts("0xb", OTHER_TEXT)) == {}
+
+
+def test_redis_keys_expire():
+    redis_client = StandInRedis()
+    RedisNearDuplicateIndex(redis_client, ttl=60).add(texts("0xa", TEXT))
+    assert redis_client.set_expiry and all(entry[1] is not None for entry in redis_client.values.values())
+
+
+def test_sqlite_index_is_opened_once_per_process(tmp_path, monkeypatch):
+    monkeypatch.delenv("NEAR_DUPLICATE_INDEX_PATH", raising=False)
+    monkeypatch.setattr(near_duplicate, "_sqlite_indexes", {})
+    index = get_near_duplicate_index(sealed_dir=str(tmp_path))
+    assert get_near_duplicate_index(sealed_dir=str(tmp_path)) is index
+    assert index._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    near_duplicate.close_indexes()
+    assert near_duplicate._sqlite_indexes == {}
+
+
+def test_sqlite_read_errors_find_nothing(tmp_path):
+    index = SqliteNearDuplicateIndex(str(tmp_path / "index.sqlite3"))
+    index.add(texts("0xa", TEXT))
+    index.close()
+    assert index.find(texts("0xb", TEXT)) == {}
@@ -0,0 +1,116 @@
+from types import SimpleNamespace
+
+import pytest
+
+from my_proof import proof_of_ownership
+from my_proof.ownership_cache import OwnershipCache
+from my_proof.proof_of_ownership import batch_rpc_balances, multicall_balances, resolve_ownership
+
+WALLET = "0x" + "a" * 40
+TOKENS = ["0x" + "1" * 40, "0x" + "2" * 40, "0x" + "3" * 40]
+ONE = "0x" + "0" * 63 + "1"
+ZERO = "0x" + "0" * 64
+
+
+class FakeResponse:
+    def __init__(self, body, status_code=200):
+        self.body = body
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            import requests
+
+            raise requests.HTTPError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self.body
+
+
+@pytest.fixture
+def rpc_reply(monkeypatch):
+    """Answer the next JSON-RPC batch with the response the test sets."""
+    holder = {}
+    session = SimpleNamespace(post=lambda url, json, timeout: holder["response"])
+    monkeypatch.setattr(proof_of_ownership, "get_rpc_session", lambda: session)
+    return holder
+
+
+W3 = SimpleNamespace(provider=SimpleNamespace(endpoint_uri="http://rpc"))
+
+
+def test_batch_decodes_results(rpc_reply):
+    rpc_reply["response"] = FakeResponse([
+        {"jsonrpc": "2.0", "id": 2, "result": "0x"},
+        {"jsonrpc": "2.0", "id": 0, "result": ONE},
+        {"jsonrpc": "2.0", "id": 1, "result": ZERO},
+    ])
+    assert batch_rpc_balances(W3, TOKENS, WALLET) == [1, 0, 0]
+
+
+def test_batch_errors_are_unverified(rpc_reply):
+    rpc_reply["response"] = FakeResponse([
+        {"jsonrpc": "2.0", "id": 0, "result": ONE},
+        {"jsonrpc": "2.0", "id": 1, "error": {"code": -32005, "message": "rate limited"}},
+    ])
+    assert batch_rpc_balances(W3, TOKENS, WALLET) == [1, None, None]
+
+
+def test_batch_rejected_as_a_whole_is_unverified(rpc_reply):
+    rpc_reply["response"] = FakeResponse({"jsonrpc": "2.0", "id": None, "error": {"code": 429, "message": "slow down"}})
+    assert batch_rpc_balances(W3, TOKENS, WALLET) == [None, None, None]
+
+
+def test_batch_http_error_raises(rpc_reply):
+    import requests
+
+    rpc_reply["response"] = FakeResponse({"error": "busy"}, status_code=503)
+    with pytest.raises(requests.HTTPError):
+        batch_rpc_balances(W3, TOKENS, WALLET)
+
+
+def test_failed_multicall_subcall_is_unverified():
+    results = [(True, bytes.fromhex(ONE[2:])), (False, b""), (True, bytes.fromhex(ZERO[2:]))]
+    aggregate3 = lambda calls: SimpleNamespace(call=lambda: results)
+    w3 = SimpleNamespace(eth=SimpleNamespace(
+        contract=lambda address, abi: SimpleNamespace(functions=SimpleNamespace(aggregate3=aggregate3))
+    ))
+    assert multicall_balances(w3, TOKENS, WALLET) == [1, None, 0]
+
+
+def test_chain_ownership_keeps_unverified_tokens(monkeypatch):
+    monkeypatch.setattr(proof_of_ownership, "get_web3", lambda chain: W3)
+    monkeypatch.setattr(proof_of_ownership, "has_multicall3", lambda chain, w3: False)
+    monkeypatch.setattr(proof_of_ownership, "batch_rpc_balances", lambda w3, tokens, wallet: [5, 0, None])
+    ownership = proof_of_ownership.check_chain_ownership("ethereum", TOKENS, WALLET)
+    assert [ownership[("ethereum", token)] for token in TOKENS] == [True, False, None]
+
+
+
+class MemoryCache(OwnershipCache):
+    def __init__(self):
+        super().__init__()
+        self.entries = {}
+
+    def _load(self, keys):
+        return {key: self.entries[key] for key in keys if key in self.entries}
+
+    def _store(self, entries):
+        self.entries.update(entries)
+
+
+def test_unverified_tokens_are_not_cached(monkeypatch):
+    monkeypatch.setattr(proof_of_ownership, "get_web3", lambda chain: W3)
+    monkeypatch.setattr(proof_of_ownership, "has_multicall3", lambda chain, w3: False)
+    monkeypatch.setattr(proof_of_ownership, "batch_rpc_balances", lambda w3, tokens, wallet: [5, 0, None])
+    cache = MemoryCache()
+    ownership, chain_stats = resolve_ownership([("ethereum", token) for token in TOKENS], WALLET, cache=cache)
+    assert [ownership[("ethereum", token)] for token in TOKENS] == [True, False, None]
+    assert chain_stats["ethereum"]["status"] == "partial"
+    assert sorted(entry["owned"] for entry in cache.entries.values()) == [False, True]
+
+    monkeypatch.setattr(proof_of_ownership, "batch_rpc_balances", lambda w3, tokens, wallet: [None] * len(tokens))
+    ownership, chain_stats = resolve_ownership([("ethereum", token) for token in TOKENS], WALLET, cache=cache)
+    assert ownership[("ethereum", TOKENS[2])] is None
+    assert chain_stats["ethereum"]["status"] == "error"
+    assert len(cache.entries) == 2
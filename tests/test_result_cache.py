@@ -0,0 +1,59 @@
+import pytest
+
+from my_proof.models.proof_response import ProofResponse
+from my_proof.result_cache import FileResultCache, get_result_cache, is_cacheable, result_key
+
+
+def response(**attributes):
+    return ProofResponse(dlp_id=1, valid=True, attributes=attributes,
+                         metadata={"ownership_chains": {"eth": {"status": "ok"}}})
+
+
+@pytest.mark.parametrize("attributes, cacheable", [
+    ({"history_status": "ok", "history_files_failed": 0}, True),
+    ({"history_status": "none"}, True),
+    ({"history_status": "partial"}, False),
+    ({"history_status": "failed"}, False),
+    ({"history_status": "ok", "history_files_failed": 1}, False),
+    ({"degraded_stages": {"ownership": "timeout"}}, False),
+])
+def test_is_cacheable(attributes, cacheable):
+    assert is_cacheable(response(**attributes)) is cacheable
+
+
+def test_unanswered_ownership_chain_is_not_cacheable():
+    proof = response(history_status="ok")
+    proof.metadata["ownership_chains"]["base"] = {"status": "timeout"}
+    assert not is_cacheable(proof)
+
+
+@pytest.mark.parametrize("setting, expected", [(None, None), ("true", FileResultCache), ("false", None)])
+def test_sealed_dir_cache_needs_opting_in(tmp_path, monkeypatch, setting, expected):
+    if setting is None:
+        monkeypatch.delenv("PROOF_RESULT_CACHE", raising=False)
+    else:
+        monkeypatch.setenv("PROOF_RESULT_CACHE", setting)
+    cache = get_result_cache(sealed_dir=str(tmp_path))
+    assert (type(cache) if cache is not None else None) is expected
+    assert isinstance(get_result_cache(sealed_dir=str(tmp_path), enabled_only=False), FileResultCache)
+
+
+def test_result_key_covers_inputs():
+    documents = [{"tokens": [{"a": 1, "b": 2}]}]
+    key = result_key(documents, "0xABC", ["2", 1], 1, 100, 1)
+    assert key == result_key([{"tokens": [{"b": 2, "a": 1}]}], "0xabc", [1, "2"], 1, 100, 1)
+    assert key == result_key(documents, "0xabc", [1, 2], 1, 100, 1, global_index_version=None)
+    assert key != result_key(documents, "0xabc", [1, 2, 3], 1, 100, 1)
+    assert key != result_key(documents, "0xabc", [1, 2], 1, 100, 1, reference_version=1.0)
+    assert key != result_key(documents, "0xabc", [1, 2], 1, 100, 1, global_index_version=(1, 2))
+    assert (result_key(documents, "0xabc", [1, 2], 1, 100, 1, global_index_version=(1, 2))
+            != result_key(documents, "0xabc", [1, 2], 1, 100, 1, global_index_version=(1, 3)))
+
+
+def test_file_cache_round_trip(tmp_path):
+    cache = FileResultCache(str(tmp_path), ttl=60)
+    proof = response(history_status="ok")
+    cache.put("key", proof)
+    assert ProofResponse(**cache.get("key")) == proof
+    cache.put("failed", response(history_status="failed"))
+    assert cache.get("failed") is None
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from my_proof.scheduler import StageDeadlineExceeded, StageScheduler
+
+
+def test_dependencies_receive_results():
+    scheduler = StageScheduler(deadline=10)
+    scheduler.add("a", lambda: 1)
+    scheduler.add("b", lambda: 2)
+    scheduler.add("sum", lambda a, b: a + b, after=("a", "b"))
+    assert scheduler.run() == {"a": 1, "b": 2, "sum": 3}
+    assert scheduler.degraded == {}
+
+
+def test_unknown_dependency_is_rejected():
+    scheduler = StageScheduler()
+    with pytest.raises(ValueError):
+        scheduler.add("b", lambda a: a, after=("a",))
+
+
+def test_failed_stage_degrades_to_its_fallback():
+    def fail():
+        raise RuntimeError("boom")
+
+    scheduler = StageScheduler(deadline=10)
+    scheduler.add("history", fail, fallback="empty")
+    scheduler.add("uniqueness", lambda history: f"scored against {history}", after=("history",))
+    assert scheduler.run()["uniqueness"] == "scored against empty"
+    assert scheduler.degraded == {"history": "error"}
+
+
+def test_failed_required_stage_ends_the_run():
+    def fail():
+        raise RuntimeError("boom")
+
+    scheduler = StageScheduler(deadline=10)
+    scheduler.add("history", fail)
+    with pytest.raises(RuntimeError):
+        scheduler.run()
+
+
+def test_slow_dependency_degrades_and_dependents_still_run():
+    scheduler = StageScheduler(deadline=0.3)
+    scheduler.add("history", lambda: time.sleep(2) or "full", fallback="empty")
+    scheduler.add("ownership", lambda: "owned", fallback={})
+    scheduler.add("uniqueness", lambda history: f"scored against {history}", after=("history",))
+    scheduler.add("report", lambda uniqueness, ownership: (uniqueness, ownership), after=("uniqueness", "ownership"))
+    started = time.perf_counter()
+    results = scheduler.run()
+    assert time.perf_counter() - started < 1
+    assert results["uniqueness"] == "scored against empty"
+    assert results["report"] == ("scored against empty", "owned")
+    assert scheduler.degraded == {"history": "timeout"}
+
+
+def test_slow_optional_stage_that_has_not_started_degrades():
+    scheduler = StageScheduler(deadline=0.2)
+    scheduler.add("history", lambda: time.sleep(1), fallback=None)
+    scheduler.add("near_duplicates", lambda history: "found", after=("history",), fallback={})
+    assert scheduler.run()["near_duplicates"] == {}
+    assert scheduler.degraded == {"history": "timeout", "near_duplicates": "timeout"}
+
+
+def test_slow_required_stage_misses_the_deadline():
+    scheduler = StageScheduler(deadline=0.2)
+    scheduler.add("history", lambda: time.sleep(1))
+    with pytest.raises(StageDeadlineExceeded):
+        scheduler.run()
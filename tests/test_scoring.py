@@ -0,0 +1,123 @@
+import math
+import random
+
+import pytest
+
+from my_proof.proof_of_quality_n_authenticity import (
+    calculate_columnar_proofs, calculate_individual_proofs, final_scores,
+)
+from my_proof.token_index import TokenKeyIndex
+
+EDGE_VALUES = [0, 0.0, -1, 1, 3, 2.0000001, 100, 100.5, 1e-300, 1e308, -1e308,
+               math.nan, math.inf, -math.inf, True, 2 ** 53 + 1]
+
+
+def token(contract, chain="ethereum", category="Meme Coins", attributes=("high-liquidity",), **metrics):
+    return {
+        "tokenCategory": category,
+        "suggestionAttributes": list(attributes),
+        "token_metadata": {"chain": chain, "contract": contract, "metrics": metrics},
+    }
+
+
+def full_metrics(price=1.0, supply=1000.0, market_cap=1000.0, volatility=5.0, risk=5):
+    return {"price": price, "circulatingSupply": supply, "marketCap": market_cap,
+            "volatility24h": volatility, "riskScore": risk}
+
+
+def per_token(tokens, history=(), text_similarity=None, market_mismatches=None):
+    results = calculate_individual_proofs(tokens, list(history), text_similarity, market_mismatches)
+    if not results:
+        return results, (0, 0, 0)
+    count = len(results)
+    return results, (sum(result["authenticity"] for result in results) / count,
+                     sum(result["quality"] for result in results) / count,
+                     sum(result["uniqueness"] for result in results) / count)
+
+
+def assert_identical(columnar, expected):
+    # repr() compares NaN to NaN and tells 0 from 0.0
+    assert repr(columnar) == repr(expected)
+
+
+EDGE_CASES = {
+    "matching market cap": [token("0x1", **full_metrics())],
+    "market cap off by 5%": [token("0x1", **full_metrics(market_cap=1051.0)),
+                             token("0x2", **full_metrics(market_cap=1050.0))],
+    "zero supply without prices": [token("0x1", circulatingSupply=0, volatility24h=1, riskScore=3)],
+    "negative supply": [token("0x1", **full_metrics(supply=-5.0, market_cap=0))],
+    "nan metrics": [token("0x1", **full_metrics(price=math.nan)),
+                    token("0x2", **full_metrics(supply=math.nan, price=None)),
+                    token("0x3", **full_metrics(volatility=math.nan, risk=math.nan))],
+    "huge values": [token("0x1", **full_metrics(price=1e308, supply=1e10, market_cap=1e308)),
+                    token("0x2", **full_metrics(price=1e200, supply=1e200, market_cap=math.inf)),
+                    token("0x3", **full_metrics(volatility=1e308, risk=1e308))],
+    "infinite values": [token("0x1", **full_metrics(supply=math.inf, market_cap=math.inf)),
+                        token("0x2", **full_metrics(risk=-math.inf))],
+    "volatility boundary": [token("0x1", **full_metrics(volatility=100)),
+                            token("0x2", **full_metrics(volatility=100.0001))],
+    "risk boundaries": [token(f"0x{risk}", **full_metrics(risk=risk)) for risk in (-1, 2, 2.5, 4, 4.5, 7, 7.5, 11)],
+    "no valid attributes": [token("0x1", attributes=("unknown",)),
+                            token("0x2", attributes=(), riskScore=1)],
+    "missing risk score": [token("0x1", price=1, circulatingSupply=1, marketCap=1, volatility24h=0)],
+    "invalid chain and category": [token("0x1", chain="nowhere", **full_metrics()),
+                                   token("0x2", category="Other", **full_metrics()),
+                                   token("0x3", chain="Base", **full_metrics())],
+    "only invalid tokens": [token("0x1", chain="nowhere", **full_metrics())],
+    "no tokens": [],
+}
+
+
+@pytest.mark.parametrize("tokens", EDGE_CASES.values(), ids=EDGE_CASES.keys())
+def test_columnar_matches_per_token(tokens):
+    columnar = calculate_columnar_proofs(tokens, [])
+    assert columnar is not None
+    assert_identical(columnar, per_token(tokens))
+
+
+def test_columnar_matches_history_similarity_and_mismatches():
+    tokens = [token(f"0x{i}", chain=chain, **full_metrics(risk=i))
+              for i, chain in enumerate(["ethereum", "base", "solana", "base", "tron"])]
+    history = [{"tokens": [{"token_metadata": {"chain": "base", "contract": "0x1"}}]}]
+    text_similarity = {("solana", "0x2"): 0.4, ("base", "0x1"): 0.9}
+    market_mismatches = {("base", "0x3"), ("ethereum", "0x9")}
+    expected = per_token(tokens, history, text_similarity, market_mismatches)
+    assert_identical(calculate_columnar_proofs(tokens, history, text_similarity, market_mismatches), expected)
+    assert_identical(calculate_columnar_proofs(tokens, TokenKeyIndex.from_documents(history), text_similarity,
+                                               market_mismatches), expected)
+
+
+@pytest.mark.parametrize("metrics", [
+    {"riskScore": 1},
+    full_metrics(price=None),
+    full_metrics(market_cap="1000"),
+    full_metrics(volatility=None),
+    full_metrics(risk="high"),
+    full_metrics(supply=2 ** 70),
+], ids=["missing metrics", "missing price", "string market cap", "missing volatility", "string risk", "huge int"])
+def test_columnar_defers_non_numeric_metrics(metrics):
+    assert calculate_columnar_proofs([token("0x1", **metrics)], []) is None
+
+
+def final_scores_with(engine, monkeypatch, tokens):
+    monkeypatch.setenv("SCORING_ENGINE", engine)
+    try:
+        return final_scores(tokens, [])
+    except Exception as e:
+        return type(e)
+
+
+def test_final_scores_engines_agree_on_random_tokens(monkeypatch):
+    """Both engines score (or fail on) random mixes of edge-case metrics the same way."""
+    rng = random.Random(1234)
+    values = EDGE_VALUES + [None, "1"]
+    for _ in range(300):
+        tokens = []
+        for i in range(rng.randint(1, 6)):
+            metrics = {name: rng.choice(values if rng.random() < 0.3 else EDGE_VALUES)
+                       for name in ("price", "circulatingSupply", "marketCap", "volatility24h", "riskScore")
+                       if rng.random() < 0.95}
+            metrics = {name: value for name, value in metrics.items() if value is not None}
+            tokens.append(token(f"0x{i}", attributes=rng.choice([("high-liquidity",), ()]), **metrics))
+        assert_identical(final_scores_with("columnar", monkeypatch, tokens),
+                         final_scores_with("python", monkeypatch, tokens))
@@ -0,0 +1,63 @@
+import pytest
+
+from my_proof.token_index import TokenKeyIndex
+from my_proof.wallet_digest import WalletDigest, digest_path, load_digest, save_digest
+
+WALLET = "0xAbC"
+
+
+def digest(file_ids=(), watermark=None):
+    return WalletDigest(WALLET, file_ids, watermark=watermark)
+
+
+@pytest.mark.parametrize("file_ids, watermark, listed, expected, changed", [
+    (["1", "2", "3"], None, [3, 1, 2], 3, True),
+    (["1", "3"], None, [1, 2, 3], 1, True),
+    (["1", "3"], 5, [6, 7], 5, False),
+    (["6", "7"], 5, [7, 6], 7, True),
+    (["1", "2"], None, [2, "x", 1], None, False),
+    (["1", "x"], 4, [1, "x"], None, True),
+    ([], 4, [], 4, False),
+    (["10", "9"], None, ["10", "9"], 10, True),
+])
+def test_advance_watermark(file_ids, watermark, listed, expected, changed):
+    wallet_digest = digest(file_ids, watermark)
+    assert wallet_digest.advance_watermark(listed) is changed
+    assert wallet_digest.watermark == expected
+
+
+def test_unseen_and_fold_in():
+    wallet_digest = digest(["1"])
+    mappings = [{"fileId": 1}, {"fileId": 2}, {"fileId": "3"}]
+    assert wallet_digest.unseen(mappings) == mappings[1:]
+
+    index = TokenKeyIndex()
+    index.add("eth", "0x2")
+    wallet_digest.fold_in(index, [2, "3"])
+    assert wallet_digest.unseen(mappings) == []
+    assert wallet_digest.history_index.contains("eth", "0x2")
+
+
+def test_save_and_load_round_trip(tmp_path):
+    wallet_digest = digest(["1", "2"], watermark=2)
+    wallet_digest.history_index.add("eth", "0x1")
+    save_digest(str(tmp_path), wallet_digest)
+
+    loaded = load_digest(str(tmp_path), WALLET.upper())
+    assert loaded.file_ids == {"1", "2"}
+    assert loaded.watermark == 2
+    assert loaded.history_index.contains("eth", "0x1")
+
+
+def test_tampered_digest_is_ignored(tmp_path):
+    save_digest(str(tmp_path), digest(["1"], watermark=1))
+    path = digest_path(str(tmp_path), WALLET)
+    with open(path, "r+b") as file:
+        file.seek(-1, 2)
+        last = file.read(1)
+        file.seek(-1, 2)
+        file.write(bytes([last[0] ^ 1]))
+
+    loaded = load_digest(str(tmp_path), WALLET)
+    assert loaded.file_ids == set()
+    assert loaded.watermark is None
@@ -0,0 +1,62 @@
+import pytest
+
+from my_proof import proof_of_uniqueness
+from my_proof.proof_of_uniqueness import history_status, wallet_history
+
+
+def document(contract):
+    return {"tokens": [{"token_metadata": {"chain": "eth", "contract": contract}}]}
+
+
+@pytest.mark.parametrize("listing_failed, has_history, failed_files, expected", [
+    (False, True, 0, "ok"),
+    (False, False, 0, "none"),
+    (False, True, 2, "partial"),
+    (False, False, 2, "failed"),
+    (True, True, 0, "partial"),
+    (True, False, 0, "failed"),
+])
+def test_history_status(listing_failed, has_history, failed_files, expected):
+    assert history_status(listing_failed, has_history, failed_files) == expected
+
+
+@pytest.fixture
+def history(monkeypatch):
+    """Serve one page of file mappings whose files 'download' to the documents the test sets (None fails)."""
+    files = {}
+    monkeypatch.setattr(proof_of_uniqueness, "get_redis_client", lambda: None)
+    monkeypatch.setattr(
+        proof_of_uniqueness, "iter_file_mapping_pages",
+        lambda wallet_address, after=None: iter([[{"fileId": file_id, "fileUrl": f"http://files/{file_id}"} for file_id in files]]),
+    )
+    monkeypatch.setattr(
+        proof_of_uniqueness, "fetch_history_files",
+        lambda file_infos, *args, **kwargs: [files[file_info["fileId"]] for file_info in file_infos],
+    )
+    return files
+
+
+def test_all_files_loaded(history):
+    history.update({1: [document("0x1")], 2: [document("0x2")]})
+    result = wallet_history("0xabc")
+    assert result["status"] == "ok"
+    assert (result["cache_stats"]["listed"], result["cache_stats"]["loaded"], result["cache_stats"]["failed"]) == (2, 2, 0)
+
+
+def test_some_files_failed(history):
+    history.update({1: [document("0x1")], 2: None})
+    result = wallet_history("0xabc")
+    assert result["status"] == "partial"
+    assert (result["cache_stats"]["loaded"], result["cache_stats"]["failed"]) == (1, 1)
+    assert result["history_index"].contains("eth", "0x1")
+
+
+def test_every_file_failed(history):
+    history.update({1: None, 2: None})
+    result = wallet_history("0xabc")
+    assert result["status"] == "failed"
+    assert result["cache_stats"]["failed"] == 2
+
+
+def test_no_history(history):
+    assert wallet_history("0xabc")["status"] == "none"